@@ -3,6 +3,7 @@ from tkinter import messagebox
 import subprocess
 import database
 from database import register_driver, is_email_registered_elsewhere
+from tk_async import run_in_background
 import re
 
 
@@ -105,17 +106,35 @@ def signup():
         messagebox.showwarning(
             "Agreement", "Please agree to the Terms of Service.")
 
-    success = register_driver(
+    # bcrypt hashing takes a few hundred ms; keep the window responsive
+    signup_btn.configure(state="disabled")
+    run_in_background(
+        root, register_driver,
         name=name,
         email=email,
         password=password,
-        license_number=license_number
+        license_number=license_number,
+        on_done=lambda success: _signup_finished(name, success),
+        on_error=_signup_failed
     )
 
-    if success:
+
+def _signup_failed(e):
+    signup_btn.configure(state="normal")
+    messagebox.showerror("Error", f"Registration failed: {e}")
+
+
+def _signup_finished(name, success):
+    signup_btn.configure(state="normal")
+
+    if success is True:
         messagebox.showinfo("Success", f"Account created for {name}!")
         root.withdraw()
         subprocess.Popen(["python", "main.py"])
+    elif isinstance(success, str) and success.startswith("email-exists-in-"):
+        messagebox.showerror(
+            "Email Already Used",
+            f"This email is already registered as a {success.rsplit('-', 1)[1]}.")
     else:
         messagebox.showerror(
             "Error", "Email or License Number already exists!")
@@ -2,6 +2,7 @@ import customtkinter as ctk
 from tkinter import messagebox
 import subprocess
 from database import register_passenger, is_email_registered_elsewhere
+from tk_async import run_in_background
 import re
 
 
@@ -97,28 +98,33 @@ def signup():
         )
         return
 
-    # Register passenger
-    success = register_passenger(name, email, password)
-    if success:
+    # Register passenger (bcrypt hashing runs off the Tk thread)
+    signup_btn.configure(state="disabled")
+    run_in_background(root, register_passenger, name, email, password,
+                      on_done=lambda success: _signup_finished(name, success),
+                      on_error=_signup_failed)
+
+
+def _signup_failed(e):
+    signup_btn.configure(state="normal")
+    messagebox.showerror("Error", f"Registration failed: {e}")
+
+
+def _signup_finished(name, success):
+    signup_btn.configure(state="normal")
+
+    if success is True:
         messagebox.showinfo("Success", f"Account created for {name}!")
         root.destroy()
         subprocess.Popen(["python", "main.py"])
+    elif isinstance(success, str) and success.startswith("email-exists-in-"):
+        messagebox.showerror(
+            "Email Already Used",
+            f"This email is already registered as a {success.rsplit('-', 1)[1]}.")
     else:
         messagebox.showerror(
             "Error", "Email already exists in passenger table!")
 
-    # Check if email exists in other roles
-    existing_role = is_email_registered_elsewhere(
-        email, current_role="passenger")
-    if existing_role:
-        proceed = messagebox.askyesno(
-            "Email Exists",
-            f"This email is already registered as a {existing_role}. "
-            "Do you still want to create a passenger account?"
-        )
-        if not proceed:
-            return
-
 
 # Signup button
 signup_btn = ctk.CTkButton(
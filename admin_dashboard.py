@@ -1,17 +1,37 @@
 import customtkinter as ctk
-from tkinter import ttk, messagebox
+import tkintermapview
+from tkinter import ttk, messagebox, filedialog
 import subprocess
 import sys
 from admin_data import (
     get_total_users,
     get_total_bookings,
     get_total_payments,
-    admin_get_all_bookings,
-    admin_get_scheduled_bookings,
-    admin_get_all_users,
-    admin_get_all_payments,
-    admin_get_all_drivers_with_ratings
+    admin_bookings_page,
+    admin_users_page,
+    admin_get_users,
+    admin_payments_page,
+    admin_get_all_drivers_with_ratings,
+    PAGE_SIZE
 )
+from database import create_tables
+from passenger_constants import parse_schedule
+from table_sync import TreeSync, PagedTable
+from analytics import buckets, last_days, revenue_by_vehicle, series, totals
+from constants import KATHMANDU_CENTER, INITIAL_ZOOM
+import heatmap
+import export
+from tk_async import run_in_background
+import changes
+from scheduler import RideScheduler
+from app_logging import get_logger
+
+log = get_logger("admin_dashboard")
+
+create_tables()
+# Release advance bookings to drivers while the app is open; several
+# schedulers can run side by side (see scheduler.py).
+RideScheduler().start()
 
 
 def logout(window=None):
@@ -102,20 +122,23 @@ def activate(btn):
         btn.configure(fg_color=ACCENT, border_width=2, border_color=GLOW)
     except Exception:
         pass
+    active_button = btn
 
 
 def show_drivers():
-    clear_main()
+    show_page("drivers", _build_drivers)
 
-    header = ctk.CTkLabel(main, text="All Drivers", font=(
+
+def _build_drivers(page):
+    header = ctk.CTkLabel(page, text="All Drivers", font=(
         "Arial", 24, "bold"), text_color=HEADER)
     header.pack(pady=(20, 8), anchor="w", padx=24)
 
     wrapper, tree = create_table(
-        main, ("ID", "Name", "Phone", "Rating"), height=14)
+        page, ("ID", "Name", "Phone", "Rating"), height=14)
+    sync = TreeSync(tree)
 
-    try:
-        drivers = admin_get_all_drivers_with_ratings()
+    def items(drivers):
         for d in drivers:
 
             formatted_driver = list(d)
@@ -123,46 +146,49 @@ def show_drivers():
                 formatted_driver[3] = f"{formatted_driver[3]:.2f}"
             else:
                 formatted_driver[3] = "N/A"
-            tree.insert("", "end", values=formatted_driver)
-    except Exception as e:
-        print(f"Error fetching drivers: {e}")
+            yield str(d[0]), (d[1] or "", d[0]), tuple(formatted_driver)
+
+    def refresh(changed):
+        try:
+            if changed is None:
+                sync.sync(items(admin_get_all_drivers_with_ratings()))
+                return
+            ids = {c.driver_id for c in changed if c.driver_id is not None}
+            if ids:
+                sync.apply(items(admin_get_all_drivers_with_ratings(driver_ids=ids)),
+                           [str(i) for i in ids])
+        except Exception as e:
+            print(f"Error fetching drivers: {e}")
+
+    return refresh
 
 
 def show_all_bookings():
-    clear_main()
+    show_page("all_bookings", _build_all_bookings)
+
 
-    header = ctk.CTkLabel(main, text="All Bookings", font=(
+def _build_all_bookings(page):
+    header = ctk.CTkLabel(page, text="All Bookings", font=(
         "Arial", 24, "bold"), text_color=HEADER)
     header.pack(pady=(20, 8), anchor="w", padx=24)
 
-    wrapper, tree = create_table(main, ("ID", "Passenger", "Pickup", "Destination",
-                                 "Status", "Fare", "Scheduled Date", "Scheduled Time"), height=14)
+    filters = _filter_bar(page)
+    wrapper, table = create_table(page, ("ID", "Passenger", "Pickup", "Destination",
+                                  "Status", "Fare", "Scheduled Date", "Scheduled Time"), height=14,
+                                  source=_Listing(admin_bookings_page), sorts=RIDE_SORT_COLUMNS)
+    filters(table)
 
-    try:
-        bookings = admin_get_all_bookings()
-        for b in bookings:
+    def refresh(changed):
+        try:
+            _refresh_rides(table, changed)
+        except Exception as e:
+            print(f"Error fetching all bookings: {e}")
 
-            tree.insert("", "end", values=b)
-    except Exception as e:
-        print(f"Error fetching all bookings: {e}")
+    return refresh
 
 
 def show_all_passengers():
-    clear_main()
-
-    header = ctk.CTkLabel(main, text="All Passengers", font=(
-        "Arial", 24, "bold"), text_color=HEADER)
-    header.pack(pady=(20, 8), anchor="w", padx=24)
-
-    wrapper, tree = create_table(
-        main, ("User ID", "Name", "Email", "Phone"), height=14)
-
-    try:
-        passengers = admin_get_all_users()
-        for p in passengers:
-            tree.insert("", "end", values=p)
-    except Exception as e:
-        print(f"Error fetching all passengers: {e}")
+    show_page("all_passengers", _build_users("All Passengers"))
 
 
 def make_button(text, command):
@@ -186,11 +212,20 @@ btn_bookings = make_button(
     "Bookings", lambda: [activate(btn_bookings), show_bookings()])
 btn_payments = make_button(
     "Payments", lambda: [activate(btn_payments), show_payments()])
+btn_analytics = make_button(
+    "Analytics", lambda: [activate(btn_analytics), show_analytics()])
+btn_demand = make_button(
+    "Demand", lambda: [activate(btn_demand), show_demand()])
 
 btn_dashboard.pack(pady=12)
 btn_users.pack(pady=12)
 btn_bookings.pack(pady=12)
 btn_payments.pack(pady=12)
+btn_analytics.pack(pady=12)
+btn_demand.pack(pady=12)
+
+btn_export = make_button("Export", lambda: export_popup())
+btn_export.pack(pady=12)
 
 btn_drivers = make_button(
     "Drivers", lambda: [activate(btn_drivers), show_drivers()])
@@ -216,12 +251,207 @@ main = ctk.CTkFrame(app, fg_color=BG_MAIN)
 main.pack(side="right", fill="both", expand=True)
 
 
-def clear_main():
-    for widget in main.winfo_children():
-        widget.destroy()
+#  PAGES
+# Each page is built once and kept. Showing it again, or a change feed
+# notification while it is open, re-syncs its tables by row diffs.
+# Listings that grow with the rides table are paged: the tree holds a
+# window of rows and fetches the next or previous page on scroll, and
+# sorting and filtering happen in the query.
+
+_pages = {}          # name -> (frame, refresh)
+_current_page = None
+
+
+def show_page(name, build):
+    """Show page `name`, building it with build(frame) -> refresh the first time.
+
+    refresh(None) re-syncs everything; refresh(changes) only what the
+    change feed reported.
+    """
+    global _current_page
+    for frame, _ in _pages.values():
+        frame.pack_forget()
+    if name not in _pages:
+        frame = ctk.CTkFrame(main, fg_color=BG_MAIN)
+        _pages[name] = (frame, build(frame))
+    frame, refresh = _pages[name]
+    frame.pack(fill="both", expand=True)
+    _current_page = name
+    refresh(None)
+
+
+RIDE_STATUSES = ("All", "Requested", "Scheduled", "Accepted",
+                 "Completed", "Cancelled", "Rejected")
+
+# column heading -> admin_data sort
+RIDE_SORT_COLUMNS = {"ID": "id", "Fare": "fare",
+                     "Scheduled Date": "scheduled", "Scheduled Time": "scheduled"}
+
+
+class _Listing:
+    """One sorted, filtered ride listing (an admin_data *_page function) for PagedTable."""
+
+    def __init__(self, fetch, sort="id", descending=True, **filters):
+        self.fetch = fetch
+        self.sort = sort
+        self.descending = descending
+        self.filters = filters
+
+    def replace(self, **changes):
+        query = dict(self.filters, sort=self.sort, descending=self.descending)
+        query.update(changes)
+        return _Listing(self.fetch, **query)
+
+    def page(self, after, limit, forward):
+        return self.fetch(after=after, limit=limit, sort=self.sort,
+                          descending=self.descending if forward else not self.descending,
+                          **self.filters)
+
+    def lookup(self, iids):
+        ids = [int(i) for i in iids]
+        return self.fetch(ride_ids=ids, limit=max(len(ids), 1), sort=self.sort,
+                          descending=self.descending, **self.filters)
+
+    def order(self, key):
+        # NULL sort values come last when descending, as in SQLite.
+        value, ride_id = key
+        if self.descending:
+            return (value is None, -(value or 0), -ride_id)
+        return (value is not None, value or 0, ride_id)
+
+
+class _UserListing:
+    """Passengers then drivers for PagedTable; iids are "p<id>" / "d<id>"."""
+
+    def page(self, after, limit, forward):
+        return admin_users_page(after=after, limit=limit, descending=not forward)
+
+    def lookup(self, iids):
+        pairs = []
+        for order, role in enumerate(("passenger", "driver")):
+            ids = [int(i[1:]) for i in iids if i[0] == role[0]]
+            if ids:
+                pairs += [((order, u[0]), u) for u in admin_get_users(role, ids)]
+        return pairs
+
+    def order(self, key):
+        return key
+
 
+def _user_iid(key, values):
+    return f"{'pd'[key[0]]}{key[1]}"
 
-def create_table(parent, columns, height=14):
+
+def _refresh_rides(table, changed):
+    """Re-read the whole window, or only the rides in changed."""
+    if changed is None:
+        table.reload()
+        return
+    ids = {c.ride_id for c in changed if c.ride_id is not None}
+    if ids:
+        table.refresh([str(i) for i in ids])
+
+
+def _page_on_scroll(table, vsb):
+    """Fetch a page when the view nears either end of the loaded rows."""
+    tree = table.tree
+    pending = []
+
+    def near_edge(first, last):
+        return ((last > 0.9 and not table.at_end)
+                or (first < 0.1 and not table.at_start))
+
+    def load():
+        pending.clear()
+        first, last = tree.yview()
+        if not near_edge(first, last):
+            return
+        top = round(first * len(table))
+        if last > 0.9 and not table.at_end:
+            top -= table.more()
+        else:
+            top += table.back()
+        # Keep the rows the user was looking at in place.
+        if len(table):
+            tree.yview_moveto(max(top, 0) / len(table))
+
+    def on_scroll(first, last):
+        vsb.set(first, last)
+        if not pending and near_edge(float(first), float(last)):
+            pending.append(tree.after_idle(load))
+
+    tree.configure(yscrollcommand=on_scroll)
+
+
+def _sort_by(table, sorts, column):
+    """Re-query table ordered by column's sort; a second click flips it."""
+    source = table.source
+    sort = sorts[column]
+    descending = not source.descending if source.sort == sort else True
+    for col in sorts:
+        table.tree.heading(col, text=col)
+    table.tree.heading(column, text=f"{column} {'▼' if descending else '▲'}")
+    table.reset(source.replace(sort=sort, descending=descending))
+    table.tree.yview_moveto(0)
+
+
+def _filter_bar(parent, statuses=True):
+    """Status and pickup-date filters, applied by the query.
+
+    Returns attach(table), to be called once the table exists so the bar
+    sits above it.
+    """
+    bar = ctk.CTkFrame(parent, fg_color=BG_MAIN)
+    bar.pack(fill="x", padx=24)
+
+    status_var = ctk.StringVar(value="All")
+    if statuses:
+        ctk.CTkOptionMenu(bar, values=list(RIDE_STATUSES), variable=status_var,
+                          width=140).pack(side="left", padx=(0, 10))
+    date_from = ctk.CTkEntry(bar, placeholder_text="From YYYY-MM-DD", width=150)
+    date_from.pack(side="left", padx=(0, 10))
+    date_to = ctk.CTkEntry(bar, placeholder_text="To YYYY-MM-DD", width=150)
+    date_to.pack(side="left", padx=(0, 10))
+    apply_btn = ctk.CTkButton(bar, text="Apply", width=90, fg_color=ACCENT, hover_color=GLOW)
+    apply_btn.pack(side="left")
+
+    def day(entry, time_text):
+        text = entry.get().strip()
+        if not text:
+            return None
+        at = parse_schedule(text, time_text)
+        if at is None:
+            raise ValueError(text)
+        return at
+
+    def attach(table):
+        def apply():
+            try:
+                start = day(date_from, "00:00")
+                end = day(date_to, "23:59")
+            except ValueError as e:
+                messagebox.showerror("Invalid Format", f"Please enter dates as YYYY-MM-DD, not '{e}'.")
+                return
+            query = {"date_from": start, "date_to": None if end is None else end + 60}
+            if statuses:
+                status = status_var.get()
+                query["status"] = None if status == "All" else status
+            table.reset(table.source.replace(**query))
+            table.tree.yview_moveto(0)
+
+        apply_btn.configure(command=apply)
+
+    return attach
+
+
+def create_table(parent, columns, height=14, source=None, sorts=None, iid=None):
+    """Card-styled Treeview. Returns (wrapper, tree).
+
+    With a source (see _Listing) the table is paged instead, and
+    (wrapper, PagedTable) is returned: rows are fetched PAGE_SIZE at a
+    time as the user scrolls, and clicking a heading in sorts re-sorts
+    in the database.
+    """
     # wrapper with card look
     wrapper = ctk.CTkFrame(parent, fg_color=CARD_BG, corner_radius=12,
                            border_color=GLOW, border_width=2)
@@ -243,121 +473,151 @@ def create_table(parent, columns, height=14):
     tree.pack(side="left", fill="both", expand=True, padx=(12, 0), pady=12)
     vsb.pack(side="right", fill="y", padx=(0, 12), pady=12)
 
-    return wrapper, tree
+    if source is None:
+        return wrapper, tree
+
+    table = PagedTable(tree, source, iid=iid, page=PAGE_SIZE)
+    _page_on_scroll(table, vsb)
+    sorts = sorts or {}
+    for col in sorts:
+        tree.heading(col, command=lambda c=col: _sort_by(table, sorts, c))
+    return wrapper, table
 
 
 #  DASHBOARD PAGE
 
 def show_dashboard():
-    clear_main()
+    show_page("dashboard", _build_dashboard)
+
 
-    header = ctk.CTkLabel(main, text="Dashboard", font=(
+def _build_dashboard(page):
+    header = ctk.CTkLabel(page, text="Dashboard", font=(
         "Arial", 26, "bold"), text_color=HEADER)
     header.pack(pady=(18, 8), anchor="w", padx=24)
 
     # Cards row
-    cards_frame = ctk.CTkFrame(main, fg_color=BG_MAIN)
+    cards_frame = ctk.CTkFrame(page, fg_color=BG_MAIN)
     cards_frame.pack(fill="x", pady=(6, 12), padx=12)
 
-    def glowing_card(parent, title, value, color):
+    def glowing_card(parent, title, color):
         box = ctk.CTkFrame(parent, width=220, height=120,
                            corner_radius=14, fg_color=CARD_BG,
                            border_color=GLOW, border_width=2)
         box.pack(side="left", padx=18, pady=10)
         ctk.CTkLabel(box, text=title, font=("Arial", 13, "bold"),
                      text_color="#9FB0FF").pack(pady=(14, 4))
-        ctk.CTkLabel(box, text=value, font=(
-            "Arial", 26, "bold"), text_color=color).pack()
+        value = ctk.CTkLabel(box, text="", font=(
+            "Arial", 26, "bold"), text_color=color)
+        value.pack()
+        return value
 
-    try:
-        total_users = get_total_users()
-    except Exception:
-        total_users = "—"
-    try:
-        total_bookings = get_total_bookings()
-    except Exception:
-        total_bookings = "—"
-    try:
-        total_pay = get_total_payments()
-        clean_pay = f"{total_pay:.2f}"
-    except Exception:
-        clean_pay = "—"
-
-    glowing_card(cards_frame, "Total Users", f"{total_users}", "#6C9BFF")
-    glowing_card(cards_frame, "Total Bookings", f"{total_bookings}", "#65FFB2")
-    glowing_card(cards_frame, "Total Payments", f"NPR {clean_pay}", "#FFD27F")
+    users_lbl = glowing_card(cards_frame, "Total Users", "#6C9BFF")
+    bookings_lbl = glowing_card(cards_frame, "Total Bookings", "#65FFB2")
+    pay_lbl = glowing_card(cards_frame, "Total Payments", "#FFD27F")
 
-    ctk.CTkLabel(main, text="Recent Bookings", font=("Arial", 20, "bold"),
+    ctk.CTkLabel(page, text="Recent Bookings", font=("Arial", 20, "bold"),
                  text_color=TEXT_MAIN).pack(pady=(10, 6), anchor="w", padx=24)
 
-    wrapper, tree = create_table(
-        main, ("ID", "Passenger", "Pickup", "Destination", "Status", "Fare"), height=12)
-
-    # Fill table
-    try:
-        rows = admin_get_all_bookings()
-        for r in rows:
-            \
-            tree.insert("", "end", values=r)
-    except Exception:
-        pass
+    wrapper, recent = create_table(
+        page, ("ID", "Passenger", "Pickup", "Destination", "Status", "Fare"), height=12,
+        source=_Listing(admin_bookings_page), sorts={"ID": "id", "Fare": "fare"})
 
-    ctk.CTkLabel(main, text="Scheduled Bookings", font=("Arial", 20, "bold"),
+    ctk.CTkLabel(page, text="Scheduled Bookings", font=("Arial", 20, "bold"),
                  text_color=TEXT_MAIN).pack(pady=(20, 6), anchor="w", padx=24)
 
-    wrapper, tree = create_table(main, ("ID", "Passenger", "Pickup", "Destination",
-                                 "Status", "Fare", "Scheduled Date", "Scheduled Time"), height=8)
+    # Latest pickup on top.
+    sched_wrapper, scheduled = create_table(
+        page, ("ID", "Passenger", "Pickup", "Destination", "Status", "Fare",
+               "Scheduled Date", "Scheduled Time"), height=8,
+        source=_Listing(admin_bookings_page, sort="scheduled", scheduled_only=True),
+        sorts={"Scheduled Date": "scheduled", "Scheduled Time": "scheduled"})
+    empty_lbl = ctk.CTkLabel(sched_wrapper, text="No scheduled bookings found",
+                             text_color="#AFC3FF", font=("Arial", 12))
 
-    try:
-        scheduled_rows = admin_get_scheduled_bookings()
-        if not scheduled_rows:
+    def set_text(label, text):
+        if label.cget("text") != text:
+            label.configure(text=text)
 
-            ctk.CTkLabel(wrapper, text="No scheduled bookings found",
-                         text_color="#AFC3FF", font=("Arial", 12)).pack(pady=20)
-        else:
-            for r in scheduled_rows:
+    def refresh(changed):
+        try:
+            total_users = get_total_users()
+        except Exception:
+            total_users = "—"
+        try:
+            total_bookings = get_total_bookings()
+        except Exception:
+            total_bookings = "—"
+        try:
+            total_pay = get_total_payments()
+            clean_pay = f"{total_pay:.2f}"
+        except Exception:
+            clean_pay = "—"
+        set_text(users_lbl, f"{total_users}")
+        set_text(bookings_lbl, f"{total_bookings}")
+        set_text(pay_lbl, f"NPR {clean_pay}")
 
-                tree.insert("", "end", values=r)
-    except Exception as e:
-        print(f"Scheduled bookings error: {e}")
+        try:
+            _refresh_rides(recent, changed)
+        except Exception:
+            pass
+
+        try:
+            _refresh_rides(scheduled, changed)
+            if len(scheduled) and empty_lbl.winfo_ismapped():
+                empty_lbl.pack_forget()
+            elif not len(scheduled) and not empty_lbl.winfo_ismapped():
+                empty_lbl.pack(pady=20)
+        except Exception as e:
+            print(f"Scheduled bookings error: {e}")
+
+    return refresh
 
 
 def show_users():
-    clear_main()
+    show_page("users", _build_users("Users List"))
 
-    header = ctk.CTkLabel(main, text="Users List", font=(
-        "Arial", 24, "bold"), text_color=HEADER)
-    header.pack(pady=(20, 8), anchor="w", padx=24)
 
-    wrapper, tree = create_table(
-        main, ("User ID", "Name", "Email", "Phone"), height=14)
+def _build_users(title):
+    def build(page):
+        header = ctk.CTkLabel(page, text=title, font=(
+            "Arial", 24, "bold"), text_color=HEADER)
+        header.pack(pady=(20, 8), anchor="w", padx=24)
 
-    # Fill users
-    try:
-        users = admin_get_all_users()
-        for u in users:
-            # expected tuple (id, name, email, phone) or similar
-            tree.insert("", "end", values=u)
-    except Exception:
-        pass
+        wrapper, table = create_table(
+            page, ("User ID", "Name", "Email", "Phone"), height=14,
+            source=_UserListing(), iid=_user_iid)
+
+        def refresh(changed):
+            try:
+                if changed is None:
+                    table.reload()
+                    return
+                # New accounts show up as changes without a ride.
+                iids = {f"{role}{getattr(c, attr)}" for c in changed if c.ride_id is None
+                        for role, attr in (("p", "passenger_id"), ("d", "driver_id"))
+                        if getattr(c, attr) is not None}
+                if iids:
+                    table.refresh(iids)
+            except Exception as e:
+                print(f"Error fetching users: {e}")
+
+        return refresh
+    return build
 
 
 def show_bookings():
-    clear_main()
+    show_page("bookings", _build_bookings)
 
-    header = ctk.CTkLabel(main, text="All Bookings", font=(
+
+def _build_bookings(page):
+    header = ctk.CTkLabel(page, text="All Bookings", font=(
         "Arial", 24, "bold"), text_color=HEADER)
     header.pack(pady=(20, 8), anchor="w", padx=24)
 
     # Add driver list fetch for assignment
     def get_all_drivers():
-        import sqlite3
-        conn = sqlite3.connect("taxi_booking.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM driver WHERE is_busy=0")
-        drivers = cursor.fetchall()
-        conn.close()
-        return drivers
+        from database import get_available_drivers
+        return get_available_drivers()
 
     # Assign driver popup
     def assign_driver_popup(ride_id):
@@ -397,28 +657,17 @@ def show_bookings():
         ctk.CTkButton(popup, text="Assign", fg_color=ACCENT,
                       command=confirm_assignment).pack(pady=10, padx=20, fill="x")
 
-    wrapper = ctk.CTkFrame(main, fg_color=CARD_BG,
-                           corner_radius=12, border_color=GLOW, border_width=2)
-    wrapper.pack(fill="both", expand=True, padx=20, pady=12)
-
+    filters = _filter_bar(page)
     columns = ("ID", "Passenger", "Pickup", "Destination", "Status",
                "Fare", "Scheduled Date", "Scheduled Time", "Action")
-    tree = ttk.Treeview(wrapper, columns=columns,
-                        show="headings", height=14, selectmode="browse")
-
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, anchor="center", width=140)
+    # The Action cell is left empty; rides are assigned from the button below.
+    wrapper, table = create_table(page, columns, height=14,
+                                  source=_Listing(admin_bookings_page), sorts=RIDE_SORT_COLUMNS)
+    filters(table)
+    tree = table.tree
     tree.column("Action", width=100)
 
-    vsb = ttk.Scrollbar(wrapper, orient="vertical",
-                        command=tree.yview, style="Vertical.TScrollbar")
-    tree.configure(yscrollcommand=vsb.set)
-
-    tree.pack(side="left", fill="both", expand=True, padx=(12, 0), pady=12)
-    vsb.pack(side="right", fill="y", padx=(0, 12), pady=12)
-
-    assign_selected_btn = ctk.CTkButton(main, text="Assign Driver to Selected Ride", fg_color=ACCENT, hover_color=GLOW,
+    assign_selected_btn = ctk.CTkButton(page, text="Assign Driver to Selected Ride", fg_color=ACCENT, hover_color=GLOW,
                                         command=lambda: assign_driver_for_selected_ride())
     assign_selected_btn.pack(pady=10, padx=20, fill="x")
 
@@ -436,66 +685,339 @@ def show_bookings():
             messagebox.showinfo(
                 "Info", "Please select a ride from the table to assign a driver.")
 
-    try:
-        bookings = admin_get_all_bookings()
-        for b in bookings:
-            ride_id = b[0]
-            status = b[4]
-            # Add empty action cell placeholder
-
-            row_values = list(b) + [""]
-            item_id = tree.insert("", "end", values=row_values)
-
-            if status == "Requested":
-                assign_btn = ctk.CTkButton(wrapper, text="Assign", fg_color=ACCENT, hover_color=GLOW,
-                                           width=80, command=lambda rid=ride_id: assign_driver_popup(rid))
+    def refresh(changed):
+        try:
+            _refresh_rides(table, changed)
+        except Exception:
+            pass
 
-    except Exception:
-        pass
+    return refresh
 
 
 #  PAYMENTS PAGE
 
 def show_payments():
-    clear_main()
+    show_page("payments", _build_payments)
+
 
-    header = ctk.CTkLabel(main, text="Payments History", font=(
+def _build_payments(page):
+    header = ctk.CTkLabel(page, text="Payments History", font=(
         "Arial", 24, "bold"), text_color=HEADER)
     header.pack(pady=(20, 8), anchor="w", padx=24)
 
-    wrapper, tree = create_table(
-        main, ("Payment ID", "Ride ID", "Passenger", "Amount", "Date"), height=14)
+    filters = _filter_bar(page, statuses=False)
+    # Rows are (ride id, passenger, fare, status) of completed rides.
+    wrapper, table = create_table(
+        page, ("Ride ID", "Passenger", "Amount", "Status"), height=14,
+        source=_Listing(admin_payments_page), sorts={"Ride ID": "id", "Amount": "fare"})
+    filters(table)
+
+    def refresh(changed):
+        try:
+            _refresh_rides(table, changed)
+        except Exception:
+            pass
 
+    return refresh
+
+
+#  EXPORT
+# Streams straight from the database to the file in a worker thread
+# (export.py), so any table size exports without freezing the window.
+
+EXPORT_FORMATS = {"CSV": ".csv", "CSV (gzip)": ".csv.gz", "Parquet": ".parquet"}
+
+
+def export_popup():
+    popup = ctk.CTkToplevel(app)
+    popup.title("Export")
+    popup.geometry("340x380")
+    popup.resizable(False, False)
+
+    kind_var = ctk.StringVar(value="Rides")
+    format_var = ctk.StringVar(value="CSV (gzip)")
+    status_var = ctk.StringVar(value="All")
+    for values, var in (([k.title() for k in export.EXPORTS], kind_var),
+                        (list(EXPORT_FORMATS), format_var),
+                        (list(RIDE_STATUSES), status_var)):
+        ctk.CTkOptionMenu(popup, values=values, variable=var).pack(pady=(12, 0), padx=20, fill="x")
+    date_from = ctk.CTkEntry(popup, placeholder_text="From YYYY-MM-DD")
+    date_from.pack(pady=(12, 0), padx=20, fill="x")
+    date_to = ctk.CTkEntry(popup, placeholder_text="To YYYY-MM-DD")
+    date_to.pack(pady=(12, 0), padx=20, fill="x")
+    note = ctk.CTkLabel(popup, text="Payments ignore the status; users ignore both filters.",
+                        text_color=TEXT_MAIN, font=("Arial", 11), wraplength=300)
+    note.pack(pady=(8, 0), padx=20)
+
+    def day(entry, time_text):
+        text = entry.get().strip()
+        if not text:
+            return None
+        at = parse_schedule(text, time_text)
+        if at is None:
+            raise ValueError(text)
+        return at
+
+    def start_export():
+        kind = kind_var.get().lower()
+        spec = export.EXPORTS[kind]
+        try:
+            start, end = day(date_from, "00:00"), day(date_to, "23:59")
+        except ValueError as e:
+            messagebox.showerror("Invalid Format", f"Please enter dates as YYYY-MM-DD, not '{e}'.",
+                                 parent=popup)
+            return
+        suffix = EXPORT_FORMATS[format_var.get()]
+        path = filedialog.asksaveasfilename(parent=popup, initialfile=kind + suffix,
+                                            defaultextension=suffix)
+        if not path:
+            return
+        status = status_var.get()
+        query = {}
+        if spec.when is not None:
+            query = {"date_from": start, "date_to": None if end is None else end + 60}
+        if spec.status is not None and status != "All":
+            query["status"] = status
+
+        # Polled from app: the popup may be closed before the export ends.
+        def done(count):
+            if popup.winfo_exists():
+                popup.destroy()
+            messagebox.showinfo("Export", f"Exported {count:,} {kind} to {path}")
+
+        def failed(e):
+            if popup.winfo_exists():
+                export_btn.configure(state="normal", text="Export")
+            messagebox.showerror("Export", f"Export failed: {e}")
+
+        export_btn.configure(state="disabled", text="Exporting...")
+        run_in_background(app, export.export, kind, path, on_done=done, on_error=failed, **query)
+
+    export_btn = ctk.CTkButton(popup, text="Export", fg_color=ACCENT, hover_color=GLOW,
+                               command=start_export)
+    export_btn.pack(pady=16, padx=20, fill="x")
+
+
+#  ANALYTICS PAGE
+# Charts read the hourly/daily rollups (analytics.py), never the rides
+# table, so a year of history costs a few hundred rollup rows.
+
+ANALYTICS_RANGES = {
+    "Today (hourly)": (1, "hour"),
+    "Last 7 days": (7, "day"),
+    "Last 30 days": (30, "day"),
+    "Last 90 days": (90, "day"),
+    "Last 365 days": (365, "day"),
+}
+
+# metric -> (analytics.Point field, axis format)
+ANALYTICS_METRICS = {
+    "Revenue": ("revenue", lambda v: f"{v:,.0f}"),
+    "Rides": ("rides", lambda v: f"{v:,.0f}"),
+    "Average fare": ("avg_fare", lambda v: f"{v:,.0f}"),
+    "Cancellation rate": ("cancel_rate", lambda v: f"{v * 100:.0f}%"),
+    "Average rating": ("avg_rating", lambda v: f"{v:.1f}"),
+}
+
+VEHICLE_COLORS = {"normal": "#6C9BFF", "comfort": "#FFD27F"}
+
+
+def show_analytics():
+    show_page("analytics", _build_analytics)
+
+
+def _draw_bars(canvas, keys, stacks, fmt):
+    """Bar chart on canvas: stacks is [(name, color, [value per key])], drawn stacked."""
+    canvas.delete("all")
+    width, height = canvas.winfo_width(), canvas.winfo_height()
+    left, right, top, bottom = 70, 20, 30, 36
+    if not keys or width <= left + right or height <= top + bottom:
+        return
+    plot_w, plot_h = width - left - right, height - top - bottom
+    sums = [sum(values[i] or 0 for _, _, values in stacks) for i in range(len(keys))]
+    peak = max(sums) or 1
+
+    for step in range(5):
+        y = top + plot_h * step / 4
+        canvas.create_line(left, y, width - right, y, fill="#1E2745")
+        canvas.create_text(left - 8, y, text=fmt(peak * (4 - step) / 4), anchor="e",
+                           fill=TEXT_MAIN, font=("Arial", 9))
+
+    slot = plot_w / len(keys)
+    for i in range(len(keys)):
+        x0 = left + i * slot + slot * 0.15
+        x1 = max(left + (i + 1) * slot - slot * 0.15, x0 + 1)
+        y = top + plot_h
+        for _, color, values in stacks:
+            dy = plot_h * (values[i] or 0) / peak
+            if dy > 0:
+                canvas.create_rectangle(x0, y - dy, x1, y, fill=color, width=0)
+                y -= dy
+
+    every = max(1, len(keys) // 8)
+    for i in range(0, len(keys), every):
+        key = keys[i]
+        label = f"{key[11:]}:00" if len(key) > 10 else key[5:]
+        canvas.create_text(left + (i + 0.5) * slot, height - bottom + 14, text=label,
+                           fill=TEXT_MAIN, font=("Arial", 9))
+
+    x = width - right
+    for name, color, _ in reversed(stacks):
+        text = canvas.create_text(x, top / 2, text=name, anchor="e", fill=TEXT_MAIN,
+                                  font=("Arial", 10))
+        x = canvas.bbox(text)[0] - 6
+        canvas.create_rectangle(x - 10, top / 2 - 5, x, top / 2 + 5, fill=color, width=0)
+        x -= 18
+
+
+def _build_analytics(page):
+    header = ctk.CTkLabel(page, text="Analytics", font=(
+        "Arial", 24, "bold"), text_color=HEADER)
+    header.pack(pady=(20, 8), anchor="w", padx=24)
+
+    controls = ctk.CTkFrame(page, fg_color=BG_MAIN)
+    controls.pack(fill="x", padx=24)
+    metric_var = ctk.StringVar(value="Revenue")
+    range_var = ctk.StringVar(value="Last 90 days")
+    ctk.CTkOptionMenu(controls, values=list(ANALYTICS_METRICS), variable=metric_var, width=180,
+                      command=lambda _: refresh(None)).pack(side="left", padx=(0, 10))
+    ctk.CTkOptionMenu(controls, values=list(ANALYTICS_RANGES), variable=range_var, width=160,
+                      command=lambda _: refresh(None)).pack(side="left")
+
+    summary = ctk.CTkLabel(page, text="", font=("Arial", 13), text_color=TEXT_MAIN, anchor="w")
+    summary.pack(fill="x", padx=24, pady=(12, 0))
+
+    wrapper = ctk.CTkFrame(page, fg_color=CARD_BG, corner_radius=12,
+                           border_color=GLOW, border_width=2)
+    wrapper.pack(fill="both", expand=True, padx=20, pady=12)
+    canvas = ctk.CTkCanvas(wrapper, bg=CARD_BG, highlightthickness=0)
+    canvas.pack(fill="both", expand=True, padx=12, pady=12)
+
+    chart = {"keys": [], "stacks": [], "fmt": str}
+    canvas.bind("<Configure>", lambda e: _draw_bars(canvas, **chart))
+
+    def refresh(changed):
+        if changed is not None and not any(c.ride_id is not None for c in changed):
+            return
+        try:
+            days, grain = ANALYTICS_RANGES[range_var.get()]
+            start, end = last_days(days)
+            keys = buckets(start, end, grain)
+            metric = metric_var.get()
+            field, fmt = ANALYTICS_METRICS[metric]
+            if metric == "Revenue":
+                by_vehicle = revenue_by_vehicle(start, end, grain)
+                stacks = [(vehicle.title(), VEHICLE_COLORS.get(vehicle, GLOW),
+                           [by_vehicle[vehicle].get(key, 0) for key in keys])
+                          for vehicle in sorted(by_vehicle)]
+            else:
+                points = {p.bucket: p for p in series(start, end, grain)}
+                stacks = [(metric, GLOW, [getattr(points[key], field) if key in points else 0
+                                          for key in keys])]
+
+            t = totals(start, end)
+            summary.configure(text=(
+                f"Rides {t.rides:,}   ·   Revenue NPR {t.revenue:,.2f}   ·   "
+                f"Average fare {'—' if t.avg_fare is None else f'NPR {t.avg_fare:,.2f}'}   ·   "
+                f"Cancelled {'—' if t.cancel_rate is None else f'{t.cancel_rate * 100:.1f}%'}   ·   "
+                f"Rating {'—' if t.avg_rating is None else f'{t.avg_rating:.2f}'}"))
+            chart.update(keys=keys, stacks=stacks, fmt=fmt)
+            _draw_bars(canvas, **chart)
+        except Exception:
+            log.error("Analytics refresh failed", exc_info=True)
+
+    return refresh
+
+
+#  DEMAND PAGE
+# The busiest heatmap cells (heatmap.py) drawn over the map, shaded by
+# how many rides start or end in them.
+
+DEMAND_LAYERS = {"Pickups": "pickup", "Drops": "drop"}
+DEMAND_TOP = ("25", "50", "100", "200")
+HEAT_LOW, HEAT_HIGH = (0xFF, 0xD2, 0x7F), (0xB3, 0x00, 0x00)
+
+
+def show_demand():
+    show_page("demand", _build_demand)
+
+
+def _heat_color(share):
+    """Hex colour from HEAT_LOW (share 0) to HEAT_HIGH (share 1)."""
+    return "#" + "".join(f"{round(lo + (hi - lo) * share):02X}"
+                         for lo, hi in zip(HEAT_LOW, HEAT_HIGH))
+
+
+def _build_demand(page):
+    header = ctk.CTkLabel(page, text="Demand", font=(
+        "Arial", 24, "bold"), text_color=HEADER)
+    header.pack(pady=(20, 8), anchor="w", padx=24)
+
+    controls = ctk.CTkFrame(page, fg_color=BG_MAIN)
+    controls.pack(fill="x", padx=24)
+    layer_var = ctk.StringVar(value="Pickups")
+    top_var = ctk.StringVar(value="50")
+    ctk.CTkSegmentedButton(controls, values=list(DEMAND_LAYERS), variable=layer_var,
+                           command=lambda _: refresh(None)).pack(side="left", padx=(0, 10))
+    ctk.CTkOptionMenu(controls, values=list(DEMAND_TOP), variable=top_var, width=90,
+                      command=lambda _: refresh(None)).pack(side="left")
+    ctk.CTkLabel(controls, text="busiest cells", text_color=TEXT_MAIN).pack(side="left", padx=8)
+
+    summary = ctk.CTkLabel(page, text="", font=("Arial", 13), text_color=TEXT_MAIN, anchor="w")
+    summary.pack(fill="x", padx=24, pady=(12, 0))
+
+    wrapper = ctk.CTkFrame(page, fg_color=CARD_BG, corner_radius=12,
+                           border_color=GLOW, border_width=2)
+    wrapper.pack(fill="both", expand=True, padx=20, pady=12)
+    map_widget = tkintermapview.TkinterMapView(wrapper, corner_radius=10, max_zoom=18)
     try:
-        payments = admin_get_all_payments()
-        for p in payments:
-            tree.insert("", "end", values=p)
+        map_widget.set_tile_server("https://tile.openstreetmap.org/{z}/{x}/{y}.png")
     except Exception:
         pass
+    map_widget.pack(fill="both", expand=True, padx=12, pady=12)
+    map_widget.set_position(KATHMANDU_CENTER[0], KATHMANDU_CENTER[1], zoom=INITIAL_ZOOM)
 
+    drawn = {"cells": None}
 
-def _admin_refresh_status():
-    try:
+    def refresh(changed):
+        if changed is not None and not any(c.ride_id is not None for c in changed):
+            return
+        try:
+            layer = DEMAND_LAYERS[layer_var.get()]
+            cells = heatmap.top(layer, int(top_var.get()))
+            # Most new rides only bump counts outside the top cells.
+            if cells == drawn["cells"]:
+                return
+            map_widget.delete_all_polygon()
+            peak = cells[0].rides if cells else 1
+            for c in cells:
+                color = _heat_color(c.rides / peak)
+                map_widget.set_polygon(
+                    [(c.south, c.west), (c.north, c.west), (c.north, c.east), (c.south, c.east)],
+                    fill_color=color, outline_color=color, border_width=1)
+            drawn["cells"] = cells
+            summary.configure(text=(
+                f"{len(cells)} busiest {heatmap.CELL_DEG}° cells hold "
+                f"{sum(c.rides for c in cells):,} {layer}s"
+                + (f"   ·   busiest {peak:,}" if cells else "")))
+        except Exception:
+            log.error("Demand map refresh failed", exc_info=True)
+
+    return refresh
 
-        if active_button and hasattr(active_button, 'text'):
-            page = active_button.text.lower()
-            if 'dashboard' in page:
-                show_dashboard()
-            elif 'users' in page:
-                show_users()
-            elif 'bookings' in page:
-                show_bookings()
-            elif 'payments' in page:
-                show_payments()
-    except Exception as e:
-        print(f"Polling error: {e}")
 
-    app.after(5000, _admin_refresh_status)
+def _admin_refresh_status(changed=None):
+    """Apply change feed notifications to the open page."""
+    try:
+        if _current_page in _pages:
+            _pages[_current_page][1](changed)
+    except Exception as e:
+        print(f"Refresh error: {e}")
 
 
 activate(btn_dashboard)
 show_dashboard()
 
-_admin_refresh_status()
+changes.get_feed().subscribe(app, _admin_refresh_status)
 
 app.mainloop()
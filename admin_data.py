@@ -1,51 +1,129 @@
 import database as db
-import sqlite3
+import stats
+from analytics import ride_time
+from db_connection import get_connection
 
 DB_NAME = db.DB_NAME
 
+PAGE_SIZE = 100
+
+# Sortable ride columns. Each has an index whose entries are (column,
+# rowid), so "(column, id) after the last row seen" is an index range.
+RIDE_SORTS = {"id": "r.id", "fare": "r.fare", "scheduled": "r.scheduled_at"}
+
+# Rides booked with a schedule. scheduled_at is parsed from these, so
+# this also keeps rides whose schedule text never parsed (NULL pickup time).
+SCHEDULED = "(r.scheduled_date IS NOT NULL OR r.scheduled_time IS NOT NULL)"
+
+
+def _id_filter(column, ids):
+    """(condition, params) limiting column to ids; ids=None means no limit.
+
+    The *_ids arguments below let the admin dashboard re-query only the
+    rows the change feed reported.
+    """
+    if ids is None:
+        return "1", ()
+    ids = tuple(ids)
+    if not ids:
+        return "0", ()
+    return f"{column} IN ({','.join('?' * len(ids))})", ids
+
+
+def _keyset_page(select, conds, params, sort, after, limit, descending,
+                 date_from=None, date_to=None):
+    """Up to limit ((sort value, id), row) pairs strictly after key `after`.
+
+    select must put the sort expression first and r.id second. Rows come
+    in (sort value, id) order; NULL sort values sort last when descending
+    and first otherwise, as SQLite orders them. The NULL and non-NULL
+    parts are read by separate queries so that each is a plain index
+    range: no OR, no sort of the whole table. Dates (epoch seconds)
+    filter on analytics.ride_time, the pickup time or else the booking
+    time.
+    """
+    expr = RIDE_SORTS[sort]
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+    if expr == "r.id":
+        sections = ["value"]
+    else:
+        sections = ["value", "null"] if descending else ["null", "value"]
+    if after is not None:
+        sections = sections[sections.index("null" if after[0] is None else "value"):]
+
+    cursor = get_connection().cursor()
+    pairs = []
+    for section in sections:
+        where, args = list(conds), list(params)
+        if section == "null":
+            where.append(f"{expr} IS NULL")
+            order = f"r.id {direction}"
+        elif expr == "r.id":
+            order = f"r.id {direction}"
+        else:
+            where.append(f"{expr} IS NOT NULL")
+            order = f"{expr} {direction}, r.id {direction}"
+        # In pickup-time order ride_time is known per section, and the
+        # plain column keeps the value section an index range.
+        when = ride_time("r")
+        if expr == "r.scheduled_at":
+            when = "r.created_at" if section == "null" else expr
+        if date_from is not None:
+            where.append(f"{when} >= ?")
+            args.append(date_from)
+        if date_to is not None:
+            where.append(f"{when} < ?")
+            args.append(date_to)
+        if after is not None:
+            if section == "null" or expr == "r.id":
+                where.append(f"r.id {op} ?")
+                args.append(after[1])
+            else:
+                where.append(f"({expr}, r.id) {op} (?, ?)")
+                args.extend(after)
+            after = None
+        cursor.execute(f"{select} WHERE {' AND '.join(where) or '1'} "
+                       f"ORDER BY {order} LIMIT ?", args + [limit - len(pairs)])
+        pairs.extend(((row[0], row[1]), row[1:]) for row in cursor.fetchall())
+        if len(pairs) >= limit:
+            break
+    return pairs
+
+
+def _ride_filter(status=None, ride_ids=None):
+    """(conditions, params) for the listing filters other than dates."""
+    conds, params = [], []
+    if status:
+        conds.append("r.status = ?")
+        params.append(status)
+    if ride_ids is not None:
+        only, ids = _id_filter("r.id", ride_ids)
+        conds.append(only)
+        params.extend(ids)
+    return conds, params
 
-def get_total_users():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(*) FROM passenger")
-    p = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM driver")
-    d = cursor.fetchone()[0]
-
-    total = p + d
-    conn.close()
-    return total
+def get_total_users():
+    # Running totals kept by triggers (stats.py): O(1) at any table size.
+    passengers, drivers = stats.get("passengers", "drivers")
+    return passengers + drivers
 
 
 def get_total_bookings():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(*) FROM rides")
-    total = cursor.fetchone()[0]
-
-    conn.close()
-    return total
+    return stats.get("rides")[0]
 
 
 def get_total_payments():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT SUM(fare) FROM rides WHERE status='Completed'")
-    total = cursor.fetchone()[0]
+    total = stats.get("revenue")[0]
 
-    conn.close()
     return total if total else 0
 
 
-def admin_get_all_bookings():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def admin_get_all_bookings(ride_ids=None):
+    cursor = get_connection().cursor()
 
-    cursor.execute("""
+    only, params = _id_filter("r.id", ride_ids)
+    cursor.execute(f"""
         SELECT r.id, 
                p.name AS passenger_name,
                r.pickup,
@@ -56,18 +134,40 @@ def admin_get_all_bookings():
                r.scheduled_time
         FROM rides r
         JOIN passenger p ON r.passenger_id = p.id
+        WHERE {only}
         ORDER BY r.id DESC
-    """)
-    rows = cursor.fetchall()
-
-    conn.close()
-    return rows
+    """, params)
+    return cursor.fetchall()
+
+
+def admin_bookings_page(after=None, limit=PAGE_SIZE, sort="id", descending=True,
+                        status=None, date_from=None, date_to=None,
+                        scheduled_only=False, ride_ids=None):
+    """One page of admin_get_all_bookings() rows, as (key, row) pairs.
+
+    Pass the key of the last row shown as `after` for the next page, or
+    the key of the first row with descending flipped for the previous
+    one. Dates filter on analytics.ride_time, so rides without a pickup
+    time match by booking time. scheduled_only keeps the rows of
+    admin_get_scheduled_bookings(). Every sort reads its pages in index
+    order; a date range sorted by id or fare skips the rides outside it
+    as it goes, so a narrow range costs more than LIMIT rows.
+    """
+    conds, params = _ride_filter(status, ride_ids)
+    if scheduled_only:
+        conds.append(SCHEDULED)
+    return _keyset_page(f"""
+        SELECT {RIDE_SORTS[sort]}, r.id, p.name, r.pickup, r.destination,
+               r.status, r.fare, r.scheduled_date, r.scheduled_time
+        FROM rides r
+        JOIN passenger p ON r.passenger_id = p.id
+    """, conds, params, sort, after, limit, descending, date_from, date_to)
 
 
-def admin_get_all_drivers_with_ratings():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
+def admin_get_all_drivers_with_ratings(driver_ids=None):
+    cursor = get_connection().cursor()
+    only, params = _id_filter("d.id", driver_ids)
+    cursor.execute(f"""
         SELECT 
             d.id, 
             d.name, 
@@ -75,19 +175,18 @@ def admin_get_all_drivers_with_ratings():
             AVG(dr.rating) AS average_rating
         FROM driver d
         LEFT JOIN driver_ratings dr ON d.id = dr.driver_id
+        WHERE {only}
         GROUP BY d.id, d.name, d.phone
         ORDER BY d.name
-    """)
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    """, params)
+    return cursor.fetchall()
 
 
-def admin_get_scheduled_bookings():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def admin_get_scheduled_bookings(ride_ids=None):
+    cursor = get_connection().cursor()
 
-    cursor.execute("""
+    only, params = _id_filter("r.id", ride_ids)
+    cursor.execute(f"""
         SELECT r.id, 
                p.name AS passenger_name,
                r.pickup,
@@ -98,50 +197,61 @@ def admin_get_scheduled_bookings():
                r.scheduled_time
         FROM rides r
         JOIN passenger p ON r.passenger_id = p.id
-        WHERE r.scheduled_date IS NOT NULL OR r.scheduled_time IS NOT NULL
-        ORDER BY r.scheduled_date DESC, r.scheduled_time DESC
-    """)
-    rows = cursor.fetchall()
+        WHERE {SCHEDULED} AND {only}
+        ORDER BY r.scheduled_at DESC, r.id DESC
+    """, params)
+    return cursor.fetchall()
 
-    conn.close()
-    return rows
+
+def admin_get_users(role, ids=None):
+    """(id, name, email, phone) rows of one account table ('passenger' or 'driver')."""
+    table = {"passenger": "passenger", "driver": "driver"}[role]
+    only, params = _id_filter("id", ids)
+    cursor = get_connection().cursor()
+    cursor.execute(f"SELECT id, name, email FROM {table} WHERE {only}", params)
+    return [(row[0], row[1], row[2], "Null") for row in cursor.fetchall()]
 
 
 def admin_get_all_users():
     """Fetch all passengers and drivers from the database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT id, name, email
-        FROM passenger
-    """)
-    passengers = cursor.fetchall()
-
-    cursor.execute("""
-        SELECT id, name, email
-        FROM driver
-    """)
-    drivers = cursor.fetchall()
-
-    conn.close()
-
-    users = []
-
-    for p in passengers:
-        users.append((p[0], p[1], p[2], "Null"))
-
-    for d in drivers:
-        users.append((d[0], d[1], d[2], "Null"))
-
-    return users
-
-
-def admin_get_all_payments():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("""
+    return admin_get_users("passenger") + admin_get_users("driver")
+
+
+def admin_users_page(after=None, limit=PAGE_SIZE, descending=False):
+    """One page of admin_get_all_users() rows as (key, row) pairs.
+
+    Passengers come before drivers; the key is (0 for a passenger or 1
+    for a driver, id).
+    """
+    roles = [(0, "passenger"), (1, "driver")]
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+    if descending:
+        roles.reverse()
+    cursor = get_connection().cursor()
+    pairs = []
+    for order, table in roles:
+        bound = ""
+        params = []
+        if after is not None:
+            if after[0] == order:
+                bound = f"WHERE id {op} ?"
+                params.append(after[1])
+            elif (after[0] > order) != descending:
+                continue
+        cursor.execute(f"SELECT id, name, email FROM {table} {bound} "
+                       f"ORDER BY id {direction} LIMIT ?", params + [limit - len(pairs)])
+        pairs.extend(((order, row[0]), (row[0], row[1], row[2], "Null"))
+                     for row in cursor.fetchall())
+        if len(pairs) >= limit:
+            break
+    return pairs
+
+
+def admin_get_all_payments(ride_ids=None):
+    cursor = get_connection().cursor()
+
+    only, params = _id_filter("r.id", ride_ids)
+    cursor.execute(f"""
         SELECT
             r.id,
             p.name AS passenger_name,
@@ -149,10 +259,19 @@ def admin_get_all_payments():
             r.status
         FROM rides r
         JOIN passenger p ON r.passenger_id = p.id
-        WHERE r.status = 'Completed'
+        WHERE r.status = 'Completed' AND {only}
         ORDER BY r.id DESC
-    """)
+    """, params)
+
+    return cursor.fetchall()
 
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+
+def admin_payments_page(after=None, limit=PAGE_SIZE, sort="id", descending=True,
+                        date_from=None, date_to=None, ride_ids=None):
+    """One page of admin_get_all_payments() rows, as (key, row) pairs."""
+    conds, params = _ride_filter("Completed", ride_ids)
+    return _keyset_page(f"""
+        SELECT {RIDE_SORTS[sort]}, r.id, p.name, r.fare, r.status
+        FROM rides r
+        JOIN passenger p ON r.passenger_id = p.id
+    """, conds, params, sort, after, limit, descending, date_from, date_to)
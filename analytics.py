@@ -0,0 +1,207 @@
+# analytics.py
+"""Hourly and daily ride rollups for the admin analytics page.
+
+Triggers (migration 13) keep rollup_hourly and rollup_daily current as
+rides are created and change state. Each row holds the rides of one
+local hour or day, vehicle class and status:
+
+    rides        how many
+    fare_sum     their fares
+    rating_sum   their driver ratings, over rating_n rated rides
+
+A ride is bucketed by its pickup time (scheduled_at, or created_at for
+rides booked without one); rides with neither are left out. Buckets
+are local-time "YYYY-MM-DD HH" / "YYYY-MM-DD" strings, so ranges are
+plain key ranges and every query here reads only the rollups, never
+rides:
+
+    analytics.series("2026-07-01", "2026-10-01")          # per day
+    analytics.revenue_by_vehicle(*analytics.last_days(90))
+
+check() and rebuild() compare with / recompute from the rides table.
+
+    python analytics.py [--days 90] [--check | --rebuild]
+"""
+import argparse
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from db_connection import get_connection, transaction
+from app_logging import get_logger
+
+log = get_logger("analytics")
+
+# table -> SQL bucket of epoch seconds {t}
+ROLLUPS = {
+    "rollup_hourly": "strftime('%Y-%m-%d %H', {t}, 'unixepoch', 'localtime')",
+    "rollup_daily": "date({t}, 'unixepoch', 'localtime')",
+}
+GRAINS = {"hour": "rollup_hourly", "day": "rollup_daily"}
+
+FARE_TOLERANCE = 0.005      # fare_sum is a running float sum
+
+Point = namedtuple("Point", "bucket rides completed cancelled revenue avg_fare cancel_rate avg_rating")
+
+
+def ride_time(row):
+    """SQL for the time a ride (NEW, OLD or a table alias) is bucketed by."""
+    return f"COALESCE({row}.scheduled_at, {row}.created_at)"
+
+
+def last_days(days, today=None):
+    """(start, end) keys covering the last `days` local days, today included."""
+    today = today or date.today()
+    return (today - timedelta(days=days - 1)).isoformat(), (today + timedelta(days=1)).isoformat()
+
+
+def buckets(start, end, grain="day"):
+    """Every bucket key from start up to end (exclusive), for gap-free charts."""
+    step, fmt = (timedelta(hours=1), "%Y-%m-%d %H") if grain == "hour" else (timedelta(days=1), "%Y-%m-%d")
+    at = datetime.strptime(start[:10], "%Y-%m-%d")
+    stop = datetime.strptime(end[:10], "%Y-%m-%d")
+    keys = []
+    while at < stop:
+        keys.append(at.strftime(fmt))
+        at += step
+    return keys
+
+
+def _point(bucket, rides, completed, cancelled, revenue, rating_sum, rating_n):
+    return Point(
+        bucket, rides, completed, cancelled, revenue,
+        revenue / completed if completed else None,
+        cancelled / rides if rides else None,
+        rating_sum / rating_n if rating_n else None,
+    )
+
+
+_AGGREGATES = """
+    COALESCE(SUM(rides), 0),
+    COALESCE(SUM(CASE WHEN status = 'Completed' THEN rides END), 0),
+    COALESCE(SUM(CASE WHEN status = 'Cancelled' THEN rides END), 0),
+    COALESCE(SUM(CASE WHEN status = 'Completed' THEN fare_sum END), 0),
+    COALESCE(SUM(rating_sum), 0),
+    COALESCE(SUM(rating_n), 0)
+"""
+
+
+def series(start, end, grain="day", vehicle=None):
+    """One Point per bucket with rides in [start, end), oldest first."""
+    where, params = "bucket >= ? AND bucket < ?", [start, end]
+    if vehicle:
+        where += " AND vehicle = ?"
+        params.append(vehicle)
+    rows = get_connection().execute(f"""
+        SELECT bucket, {_AGGREGATES} FROM {GRAINS[grain]}
+        WHERE {where} GROUP BY bucket ORDER BY bucket
+    """, params).fetchall()
+    return [_point(*row) for row in rows]
+
+
+def totals(start, end, vehicle=None):
+    """A single Point (bucket None) for the whole range, from the daily rollup."""
+    where, params = "bucket >= ? AND bucket < ?", [start[:10], end[:10]]
+    if vehicle:
+        where += " AND vehicle = ?"
+        params.append(vehicle)
+    row = get_connection().execute(
+        f"SELECT {_AGGREGATES} FROM rollup_daily WHERE {where}", params).fetchone()
+    return _point(None, *row)
+
+
+def revenue_by_vehicle(start, end, grain="day"):
+    """{vehicle: {bucket: revenue of completed rides}}."""
+    out = {}
+    for bucket, vehicle, revenue in get_connection().execute(f"""
+        SELECT bucket, vehicle, fare_sum FROM {GRAINS[grain]}
+        WHERE bucket >= ? AND bucket < ? AND status = 'Completed'
+    """, (start, end)):
+        out.setdefault(vehicle, {})[bucket] = revenue
+    return out
+
+
+def _recount_sql(table, where="1"):
+    bucket = ROLLUPS[table].format(t=ride_time("r"))
+    return f"""
+        SELECT {bucket}, COALESCE(r.vehicle, 'normal'), COALESCE(r.status, ''),
+               COUNT(*), SUM(COALESCE(r.fare, 0)), SUM(COALESCE(r.rating, 0)), COUNT(r.rating)
+        FROM rides r WHERE {ride_time("r")} IS NOT NULL AND {where}
+        GROUP BY 1, 2, 3
+    """
+
+
+def fill(conn):
+    """Recompute both rollups from rides. Call inside a write transaction."""
+    for table in ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {table} (bucket, vehicle, status, rides, fare_sum, rating_sum, rating_n)
+            {_recount_sql(table)}
+        """)
+
+
+def add_rides(conn, first_id, last_id):
+    """Add rides first_id..last_id to both rollups. Call inside a write transaction."""
+    for table in ROLLUPS:
+        conn.execute(f"""
+            INSERT INTO {table} (bucket, vehicle, status, rides, fare_sum, rating_sum, rating_n)
+            {_recount_sql(table, "r.id BETWEEN ? AND ?")}
+            ON CONFLICT(bucket, vehicle, status) DO UPDATE SET
+                rides = rides + excluded.rides,
+                fare_sum = fare_sum + excluded.fare_sum,
+                rating_sum = rating_sum + excluded.rating_sum,
+                rating_n = rating_n + excluded.rating_n
+        """, (first_id, last_id))
+
+
+def check():
+    """{(table, bucket, vehicle, status): (stored, recounted)} for rows that differ."""
+    drift = {}
+    with transaction() as conn:
+        for table in ROLLUPS:
+            stored = {row[:3]: row[3:] for row in conn.execute(
+                f"SELECT bucket, vehicle, status, rides, fare_sum, rating_sum, rating_n FROM {table}")}
+            actual = {row[:3]: row[3:] for row in conn.execute(_recount_sql(table))}
+            zero = (0, 0, 0, 0)
+            for key in stored.keys() | actual.keys():
+                have, want = stored.get(key, zero), actual.get(key, zero)
+                if (have[0] != want[0] or have[2:] != want[2:]
+                        or abs(have[1] - want[1]) > FARE_TOLERANCE):
+                    drift[(table,) + key] = (have, want)
+    return drift
+
+
+def rebuild():
+    """Recompute the rollups. Writers wait until it is done."""
+    with transaction(immediate=True) as conn:
+        fill(conn)
+    log.info("Rebuilt ride rollups")
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Ride rollups: summary, check or rebuild.")
+    parser.add_argument("--days", type=int, default=30)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true")
+    group.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    database.create_tables()
+    if args.rebuild:
+        rebuild()
+    elif args.check:
+        drift = check()
+        for key, (have, want) in sorted(drift.items()):
+            print(f"{key}: stored {have}, actual {want}")
+        print("Rollups match the rides table." if not drift else
+              f"{len(drift)} rollup row(s) drifted; run with --rebuild.")
+        raise SystemExit(1 if drift else 0)
+    else:
+        print(f"{'day':10s} {'rides':>7s} {'done':>6s} {'cancel%':>7s} {'revenue':>11s} "
+              f"{'avg fare':>9s} {'rating':>6s}")
+        for p in series(*last_days(args.days)):
+            print(f"{p.bucket:10s} {p.rides:7d} {p.completed:6d} "
+                  f"{(p.cancel_rate or 0) * 100:6.1f}% {p.revenue:11.2f} "
+                  f"{p.avg_fare or 0:9.2f} {p.avg_rating or 0:6.2f}")
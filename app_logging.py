@@ -0,0 +1,172 @@
+# app_logging.py
+"""Application logging: callers enqueue, one background thread writes.
+
+    from app_logging import get_logger
+    log = get_logger(__name__)
+    log.debug("get_active_ride user_id=%s", user_id)
+
+Records go through a bounded in-memory queue to a writer thread that
+drains it in batches and flushes once per batch into a size-rotated
+file. If the queue is full, records are dropped instead of blocking the
+caller (the Tk loop must never wait on disk).
+
+Per-module levels come from LOG_LEVELS below and can be overridden with
+TAXI_LOG_LEVELS="database=DEBUG,geo_routing=WARNING".
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+LOG_FILE = "taxi_booking.log"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0  # seconds a partial batch may wait
+
+ROOT = "taxi"
+DEFAULT_LEVEL = "INFO"
+LOG_LEVELS = {
+    "database": "INFO",
+    "booking_management": "INFO",
+}
+
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+_lock = threading.Lock()
+_writer = None
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # The stock prepare() formats and copies the record on the calling
+        # thread; the writer formats it instead. Records are never shared.
+        return record
+
+
+class _BatchFileHandler(RotatingFileHandler):
+    # StreamHandler.emit() flushes after every record; the writer thread
+    # flushes once per batch instead.
+    def flush(self):
+        pass
+
+    def shouldRollover(self, record):
+        # The stock check formats every record a second time to measure it.
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _Writer(threading.Thread):
+    def __init__(self, q, handler):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = q
+        self.handler = handler
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            try:
+                first = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                self.handler.handle(record)
+            self.handler.flush_batch()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
+        self.handler.flush_batch()
+        self.handler.close()
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(log_file=LOG_FILE, levels=None):
+    """Start the writer thread (idempotent). Called lazily by get_logger."""
+    global _writer
+    with _lock:
+        if _writer is not None:
+            return
+
+        # FORMAT uses none of these; skipping them roughly halves the cost
+        # of building a LogRecord (see "Optimization" in the logging docs).
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        file_handler = _BatchFileHandler(
+            log_file, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+            encoding="utf-8", delay=True)
+        file_handler.setFormatter(logging.Formatter(FORMAT))
+
+        root = logging.getLogger(ROOT)
+        root.setLevel(DEFAULT_LEVEL)
+        root.propagate = False
+        root.addHandler(_DroppingQueueHandler(q))
+
+        merged = dict(LOG_LEVELS)
+        merged.update(levels or {})
+        merged.update(_parse_levels(os.environ.get("TAXI_LOG_LEVELS", "")))
+        for name, level in merged.items():
+            logging.getLogger(f"{ROOT}.{name}").setLevel(level)
+
+        _writer = _Writer(q, file_handler)
+        _writer.start()
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """Drain the queue and close the file."""
+    global _writer
+    with _lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def dropped_records():
+    for handler in logging.getLogger(ROOT).handlers:
+        if isinstance(handler, _DroppingQueueHandler):
+            return handler.dropped
+    return 0
+
+
+def get_logger(name):
+    configure()
+    return logging.getLogger(f"{ROOT}.{name}")
@@ -0,0 +1,115 @@
+# benchmarks/bench_admin_kpis.py
+"""Admin KPI cards: counting the tables vs the stats counters.
+
+With --rides rides, compares one dashboard card refresh done the old
+way (COUNT(*) over passenger, driver and rides, SUM(fare) over the
+completed rides) with get_total_users/bookings/payments reading the
+stats rows, and measures what the counter triggers add to create_ride
+and complete_ride, and how long stats.check() takes.
+
+    python benchmarks/bench_admin_kpis.py [--rides 1000000] [--writes 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+import stats
+
+OLD_KPIS = (
+    "SELECT COUNT(*) FROM passenger",
+    "SELECT COUNT(*) FROM driver",
+    "SELECT COUNT(*) FROM rides",
+    "SELECT SUM(fare) FROM rides WHERE status='Completed'",
+)
+
+
+def seed(conn, n, rnd, batch=50000):
+    with db_connection.transaction():
+        conn.executemany("INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+                         ((f"P{i}", f"p{i}@x.com") for i in range(50000)))
+        conn.executemany("INSERT INTO driver (name, email, password, license_number) "
+                         "VALUES (?, ?, 'x', ?)",
+                         ((f"D{i}", f"d{i}@x.com", f"L{i}") for i in range(5000)))
+    statuses = ["Completed"] * 85 + ["Cancelled"] * 10 + ["Requested"] * 5
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status) "
+                "VALUES (?, 'a', 'b', ?, ?)",
+                ((rnd.randint(1, 50000), round(rnd.uniform(100, 1500), 2), rnd.choice(statuses))
+                 for _ in range(lo, min(lo + batch, n))))
+
+
+def best(fn, rounds=5):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples) * 1000
+
+
+def writes(n, rnd):
+    """ms per create_ride + complete_ride pair."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        ride_id = database.create_ride(rnd.randint(1, 50000), "a", "b", 300.0, "Requested")
+        database.driver_accept_ride(1, ride_id)
+        database.complete_ride(ride_id, 1)
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(20)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        seed(conn, args.rides, rnd)
+
+        old_ms = best(lambda: [conn.execute(sql).fetchone() for sql in OLD_KPIS])
+        new_ms = best(lambda: (admin_data.get_total_users(), admin_data.get_total_bookings(),
+                               admin_data.get_total_payments()), rounds=200)
+        print(f"{args.rides} rides")
+        print(f"  KPI cards, COUNT/SUM: {old_ms:8.2f} ms")
+        print(f"  KPI cards, stats:     {new_ms:8.3f} ms ({old_ms / new_ms:.0f}x faster)")
+
+        with_ms = writes(args.writes, rnd)
+        triggers = [row for row in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'stats_%'")]
+        with db_connection.transaction():
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        without_ms = writes(args.writes, rnd)
+        with db_connection.transaction():
+            for _, sql in triggers:
+                conn.execute(sql)
+        print(f"  create+accept+complete: {with_ms:.3f} ms with counters, "
+              f"{without_ms:.3f} ms without")
+
+        stats.rebuild()
+        t0 = time.perf_counter()
+        drift = stats.check()
+        print(f"  stats.check(): {(time.perf_counter() - t0) * 1000:.0f} ms, "
+              f"{len(drift)} counter(s) off")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_admin_pages.py
+"""Admin listings: fetching everything vs keyset pages.
+
+With --rides rides, compares what opening the bookings page used to
+read, admin_get_all_bookings() in full, with admin_bookings_page():
+
+  * time and peak Python memory to open the page;
+  * the cost of a page deep in the listing, keyset vs OFFSET;
+  * sorted and filtered first pages (fare, pickup time, status).
+
+    python benchmarks/bench_admin_pages.py [--rides 1000000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+
+DAY = 86400.0
+
+
+def seed(conn, n, rnd, start, batch=50000):
+    with db_connection.transaction():
+        conn.executemany("INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+                         ((f"P{i}", f"p{i}@x.com") for i in range(5000)))
+    statuses = ["Completed"] * 85 + ["Cancelled"] * 10 + ["Requested"] * 3 + ["Scheduled"] * 2
+    step = 365 * DAY / n
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status, "
+                "scheduled_date, scheduled_time, scheduled_at) "
+                "VALUES (?, 'Thamel, Kathmandu', 'Patan, Lalitpur', ?, ?, '2025-01-01', '10:00', ?)",
+                ((rnd.randint(1, 5000), round(rnd.uniform(100, 1500), 2), rnd.choice(statuses),
+                  start + i * step) for i in range(lo, min(lo + batch, n))))
+
+
+def measure(fn, memory=False):
+    """(result, ms, peak MB); memory is traced in a second, untimed run."""
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - t0) * 1000
+    peak = 0.0
+    if memory:
+        del result
+        tracemalloc.start()
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    args = parser.parse_args()
+
+    rnd = random.Random(19)
+    start = time.time() - 365 * DAY
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        seed(conn, args.rides, rnd, start)
+        size = admin_data.PAGE_SIZE
+
+        rows, full_ms, full_mb = measure(admin_data.admin_get_all_bookings, memory=True)
+        print(f"{args.rides} rides, pages of {size}")
+        print(f"  open, fetch all:   {full_ms:8.1f} ms, peak {full_mb:7.1f} MB ({len(rows)} rows)")
+        del rows
+        pairs, page_ms, page_mb = measure(admin_data.admin_bookings_page, memory=True)
+        print(f"  open, first page:  {page_ms:8.1f} ms, peak {page_mb:7.1f} MB "
+              f"({full_ms / page_ms:.0f}x faster)")
+
+        # A page three quarters of the way down.
+        depth = args.rides * 3 // 4
+        after_id = conn.execute("SELECT id FROM rides ORDER BY id DESC LIMIT 1 OFFSET ?",
+                                (depth - 1,)).fetchone()[0]
+        _, keyset_ms, _ = measure(lambda: admin_data.admin_bookings_page(after=(after_id, after_id)))
+        _, offset_ms, _ = measure(lambda: conn.execute("""
+            SELECT r.id, p.name, r.pickup, r.destination, r.status, r.fare,
+                   r.scheduled_date, r.scheduled_time
+            FROM rides r JOIN passenger p ON r.passenger_id = p.id
+            ORDER BY r.id DESC LIMIT ? OFFSET ?
+        """, (size, depth)).fetchall())
+        print(f"  page at row {depth}: keyset {keyset_ms:.2f} ms, OFFSET {offset_ms:.1f} ms")
+
+        week = start + 200 * DAY
+        for label, query in (
+            ("fare, descending", dict(sort="fare")),
+            ("pickup time, ascending", dict(sort="scheduled", descending=False)),
+            ("status=Cancelled", dict(status="Cancelled")),
+            ("status=Cancelled by fare", dict(status="Cancelled", sort="fare")),
+            ("one week, by pickup time", dict(sort="scheduled", date_from=week, date_to=week + 7 * DAY)),
+            ("one week, by id", dict(date_from=week, date_to=week + 7 * DAY)),
+        ):
+            first, ms, _ = measure(lambda: admin_data.admin_bookings_page(**query))
+            _, next_ms, _ = measure(lambda: admin_data.admin_bookings_page(after=first[-1][0], **query))
+            print(f"  {label:26s} first page {ms:6.2f} ms, next page {next_ms:6.2f} ms")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/bench_admin_refresh.py
+"""Admin bookings table refresh: rebuild-everything vs row diffs.
+
+With --rides rides in the database, compares:
+
+  * before: what each 5 s refresh did, i.e. destroy the table, build a
+    new ttk.Treeview and insert every row of admin_get_all_bookings();
+  * after: a TreeSync-backed table kept across refreshes, refreshed by
+    the change feed (nothing committed -> no query, no widget calls),
+    re-synced in full (page shown again), or patched for a few rides.
+
+Reports time per refresh, Tk calls made and process RSS. Needs a
+display (use xvfb-run on a headless machine).
+
+    python benchmarks/bench_admin_refresh.py [--rides 100000] [--rounds 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+import changes
+from table_sync import TreeSync
+
+COLUMNS = ("ID", "Passenger", "Pickup", "Destination", "Status", "Fare",
+           "Scheduled Date", "Scheduled Time")
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def seed(conn, n, rnd, batch=50000):
+    with db_connection.transaction():
+        conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+    statuses = ["Completed"] * 90 + ["Cancelled"] * 8 + ["Requested"] * 2
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status) "
+                "VALUES (1, 'Thamel, Kathmandu', 'Patan, Lalitpur', ?, ?)",
+                ((round(rnd.uniform(100, 900), 2), rnd.choice(statuses))
+                 for _ in range(lo, min(lo + batch, n))))
+
+
+def new_tree(root):
+    tree = ttk.Treeview(root, columns=COLUMNS, show="headings", height=14)
+    for col in COLUMNS:
+        tree.heading(col, text=col)
+    tree.pack()
+    return tree
+
+
+def items(rows):
+    return [(str(r[0]), -r[0], tuple(r)) for r in rows]
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return sorted(samples)[len(samples) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"needs a display ({e}); try xvfb-run")
+    root.withdraw()
+
+    rnd = random.Random(8)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        seed(conn, args.rides, rnd)
+        base = rss_mb()
+
+        # Before: clear_main() + a fresh table with every row.
+        state = {"tree": None}
+
+        def rebuild():
+            if state["tree"] is not None:
+                state["tree"].destroy()
+            state["tree"] = new_tree(root)
+            for row in admin_data.admin_get_all_bookings():
+                state["tree"].insert("", "end", values=row)
+            root.update_idletasks()
+
+        before_ms = timed(rebuild, args.rounds)
+        before_rss = rss_mb()
+        state["tree"].destroy()
+        root.update_idletasks()
+        print(f"{args.rides} rides")
+        print(f"  before, full rebuild: {before_ms:.0f} ms per refresh, "
+              f"{args.rides + 1} Tk calls, RSS +{before_rss - base:.0f} MB after {args.rounds}")
+
+        # After: one kept table, synced by diffs.
+        tree = new_tree(root)
+        sync = TreeSync(tree)
+        t0 = time.perf_counter()
+        sync.sync(items(admin_data.admin_get_all_bookings()))
+        root.update_idletasks()
+        first_ms = (time.perf_counter() - t0) * 1000
+        feed = changes.ChangeFeed()
+        feed.poll()
+
+        def idle_refresh():
+            changed = feed.poll()
+            if changed:
+                ids = {c.ride_id for c in changed}
+                sync.apply(items(admin_data.admin_get_all_bookings(ride_ids=ids)),
+                           [str(i) for i in ids])
+
+        touched = sync.touched
+        idle_ms = timed(idle_refresh, args.rounds)
+        idle_calls = sync.touched - touched
+
+        touched = sync.touched
+        full_ms = timed(lambda: sync.sync(items(admin_data.admin_get_all_bookings())), args.rounds)
+        full_calls = sync.touched - touched
+
+        def few_changes():
+            for _ in range(10):
+                database.create_ride(1, "Thamel, Kathmandu", "Patan, Lalitpur", 300.0, "Requested")
+            database.cancel_ride(rnd.randint(1, args.rides))
+            idle_refresh()
+            root.update_idletasks()
+
+        touched = sync.touched
+        patch_ms = timed(few_changes, args.rounds)
+        patch_calls = (sync.touched - touched) / args.rounds
+        after_rss = rss_mb()
+
+        print(f"  after, first fill: {first_ms:.0f} ms")
+        print(f"  after, feed refresh with nothing committed: {idle_ms:.3f} ms, "
+              f"{idle_calls} Tk calls")
+        print(f"  after, full re-sync of an unchanged table: {full_ms:.0f} ms, "
+              f"{full_calls} Tk calls")
+        print(f"  after, 11 rides changed: {patch_ms:.1f} ms including the writes, "
+              f"{patch_calls:.0f} Tk calls")
+        print(f"  RSS +{after_rss - before_rss:.0f} MB over the rebuild runs")
+        db_connection.close_all()
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_analytics.py
+"""Analytics rollups: chart queries and their cost on the write path.
+
+Seeds --rides rides spread over the last year, then:
+
+  * times the 90-day revenue chart (revenue per vehicle per day) read
+    from rollup_daily against the same GROUP BY over rides, and checks
+    that the chart's statements never read the rides table;
+  * times a full rollup rebuild (what migration 13 does once);
+  * measures what the rollup triggers add to create + accept +
+    complete + rate.
+
+    python benchmarks/bench_analytics.py [--rides 1000000] [--writes 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import analytics
+
+DAY = 86400.0
+
+
+def seed(conn, n, rnd, now, batch=50000):
+    with db_connection.transaction():
+        conn.executemany("INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+                         ((f"P{i}", f"p{i}@x.com") for i in range(20000)))
+        conn.executemany("INSERT INTO driver (name, email, password, license_number) "
+                         "VALUES (?, ?, 'x', ?)",
+                         ((f"D{i}", f"d{i}@x.com", f"L{i}") for i in range(2000)))
+    statuses = ["Completed"] * 85 + ["Cancelled"] * 10 + ["Requested"] * 5
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status, "
+                "vehicle, created_at, rating) VALUES (?, 'a', 'b', ?, ?, ?, ?, ?)",
+                ((rnd.randint(1, 20000), round(rnd.uniform(100, 1500), 2), rnd.choice(statuses),
+                  "comfort" if rnd.random() < 0.25 else "normal",
+                  now - 365 * DAY * (n - i) / n, rnd.choice([None, 3, 4, 5]))
+                 for i in range(lo, min(lo + batch, n))))
+
+
+def best(fn, rounds=5):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples) * 1000
+
+
+def tables_read(conn, fn):
+    """Tables named in the query plans of the statements fn runs."""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    names = set()
+    for sql in statements:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            names.add(row[3].split()[1])
+    return names
+
+
+def writes(n, rnd):
+    """ms per create + accept + complete + rate."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        ride_id = database.create_ride(rnd.randint(1, 20000), "a", "b", 300.0, "Requested",
+                                       vehicle=rnd.choice(["normal", "comfort"]))
+        database.driver_accept_ride(1, ride_id)
+        database.complete_ride(ride_id, 1)
+        database.submit_driver_rating(ride_id, 5)
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(21)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        t0 = time.perf_counter()
+        seed(conn, args.rides, rnd, time.time())
+        seed_s = time.perf_counter() - t0
+
+        start, end = analytics.last_days(90)
+        chart = lambda: analytics.revenue_by_vehicle(start, end)
+        rollup_ms = best(chart, rounds=50)
+        raw_ms = best(lambda: conn.execute("""
+            SELECT date(created_at, 'unixepoch', 'localtime') AS day, vehicle, SUM(fare)
+            FROM rides
+            WHERE status = 'Completed' AND created_at >= strftime('%s', ?, 'utc')
+              AND created_at < strftime('%s', ?, 'utc')
+            GROUP BY day, vehicle
+        """, (start, end)).fetchall(), rounds=3)
+        print(f"{args.rides} rides over 365 days (seeded with rollup triggers in {seed_s:.1f} s)")
+        print(f"  90-day revenue chart: rollups {rollup_ms:.2f} ms, "
+              f"GROUP BY over rides {raw_ms:.0f} ms ({raw_ms / rollup_ms:.0f}x)")
+        print(f"  tables read by the chart: {', '.join(sorted(tables_read(conn, chart)))}")
+        page_ms = best(lambda: (analytics.revenue_by_vehicle(start, end), analytics.totals(start, end),
+                                analytics.series(*analytics.last_days(365))), rounds=20)
+        print(f"  analytics page refresh (chart + totals + 365-day series): {page_ms:.2f} ms")
+
+        rebuild_ms = best(analytics.rebuild, rounds=1)
+        print(f"  full rollup rebuild: {rebuild_ms:.0f} ms")
+
+        with_ms = writes(args.writes, rnd)
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'rollup_%'"
+        ).fetchall()
+        with db_connection.transaction():
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        without_ms = writes(args.writes, rnd)
+        with db_connection.transaction():
+            for _, sql in triggers:
+                conn.execute(sql)
+        print(f"  create+accept+complete+rate: {with_ms:.3f} ms with rollups, "
+              f"{without_ms:.3f} ms without")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_change_feed.py
+"""Dashboard refresh cost: change feed vs the old 5-second polling.
+
+Opens --windows change feeds (one connection each, as separate
+dashboard processes would have) on a database with --rides rides and
+measures:
+
+  * idle: CPU per second for every feed checking PRAGMA data_version
+    each WATCH_MS, against every window re-running its dashboard
+    queries every 5 s as before;
+  * busy: rides created at --rate per second, how long each feed takes
+    to see a commit and how many change_log rows it reads.
+
+    python benchmarks/bench_change_feed.py [--windows 300] [--rides 200000] [--rate 20]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import changes
+
+OLD_POLL_S = 5.0
+
+
+def pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+
+def seed(conn, n_rides, n_drivers, rnd, batch=50000):
+    with db_connection.transaction():
+        conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+        conn.executemany(
+            "INSERT INTO driver (id, name, email, password, license_number) "
+            "VALUES (?, ?, ?, 'x', ?)",
+            ((d, f"D{d}", f"d{d}@x.com", f"L{d}") for d in range(1, n_drivers + 1)))
+    statuses = ["Completed"] * 95 + ["Cancelled"] * 4 + ["Requested"]
+    for lo in range(0, n_rides, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status) "
+                "VALUES (1, '27.7, 85.3', '27.6, 85.4', 100, ?)",
+                ((rnd.choice(statuses),) for _ in range(lo, min(lo + batch, n_rides))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--windows", type=int, default=300)
+    parser.add_argument("--rides", type=int, default=200000)
+    parser.add_argument("--rate", type=float, default=20.0)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    rnd = random.Random(4)
+    tick = changes.WATCH_MS / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        seed(conn, args.rides, args.windows, rnd)
+        open_rides = conn.execute("SELECT COUNT(*) FROM rides WHERE status='Requested'").fetchone()[0]
+
+        # Old: every driver window re-ran its queries every 5 s.
+        t0 = time.process_time()
+        for d in range(1, args.windows + 1):
+            database.get_driver_active_ride(d)
+            database.get_pending_rides_for_driver(d)
+        per_refresh = (time.process_time() - t0) / args.windows
+        old_cpu = per_refresh * args.windows / OLD_POLL_S
+        print(f"{args.windows} driver windows, {args.rides} rides ({open_rides} open)")
+        print(f"  5 s polling: {per_refresh * 1000:.2f} ms CPU per window refresh, "
+              f"{old_cpu * 1000:.0f} ms CPU/s total")
+
+        feeds = [changes.ChangeFeed() for _ in range(args.windows)]
+        for feed in feeds:
+            feed.poll()
+        reads_before = sum(f.reads for f in feeds)
+        rounds = int(args.seconds / tick)
+        t0 = time.process_time()
+        for _ in range(rounds):
+            for feed in feeds:
+                feed.poll()
+        cpu = (time.process_time() - t0) / (rounds * tick)
+        reads = sum(f.reads for f in feeds) - reads_before
+        print(f"  change feed, idle: {cpu * 1000:.1f} ms CPU/s total "
+              f"({old_cpu / max(cpu, 1e-9):.0f}x less), change_log reads: {reads}")
+
+        # Busy: a writer commits rides while the feeds watch.
+        committed = {}
+        stop = threading.Event()
+
+        def writer():
+            interval = 1.0 / args.rate
+            while not stop.is_set():
+                ride_id = database.create_ride(1, "27.7, 85.3", "27.6, 85.4", 100.0, "Requested")
+                committed[ride_id] = time.perf_counter()
+                time.sleep(interval)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        delays, rows = [], 0
+        end = time.perf_counter() + args.seconds
+        while time.perf_counter() < end:
+            started = time.perf_counter()
+            for feed in feeds:
+                for change in feed.poll():
+                    rows += 1
+                    if change.ride_id in committed:
+                        delays.append(time.perf_counter() - committed[change.ride_id])
+            time.sleep(max(0.0, tick - (time.perf_counter() - started)))
+        stop.set()
+        thread.join()
+        print(f"  change feed, {args.rate:g} rides/s: {len(committed)} rides seen by "
+              f"{args.windows} feeds, {rows / max(len(committed), 1) / args.windows:.2f} "
+              f"change rows read per ride per feed; commit-to-notice p50 "
+              f"{pct(delays, 0.5):.0f} ms, p99 {pct(delays, 0.99):.0f} ms")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
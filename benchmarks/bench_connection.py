@@ -0,0 +1,105 @@
+# benchmarks/bench_connection.py
+"""Per-call latency of the polling queries: connect-per-call vs pooled.
+
+    python benchmarks/bench_connection.py [--calls 5000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+
+
+def seed(n_rides=10000):
+    conn = db_connection.get_connection()
+    with db_connection.transaction():
+        conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+        conn.execute("INSERT INTO driver (name, email, password, license_number) VALUES ('d', 'd@x.com', 'x', 'L1')")
+        conn.executemany(
+            "INSERT INTO rides (passenger_id, pickup, destination, fare, status) VALUES (1, 'a', 'b', 100, ?)",
+            [("Completed",) if i % 10 else ("Requested",) for i in range(n_rides)]
+        )
+
+
+def old_get_active_ride(path, user_id):
+    # The pre-pool implementation: one connection per call.
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, pickup, destination, status, fare, driver_id, rating,
+               scheduled_date, scheduled_time
+        FROM rides
+        WHERE passenger_id=? AND status IN ('Requested','Accepted','Completed')
+        ORDER BY id DESC
+        LIMIT 1
+    """, (user_id,))
+    ride = cursor.fetchone()
+    conn.close()
+    return ride
+
+
+def old_get_pending(path, driver_id):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT is_busy FROM driver WHERE id=?", (driver_id,))
+    cursor.fetchone()
+    cursor.execute("""
+        SELECT id, passenger_id, pickup, destination, fare, status,
+               driver_id, scheduled_date, scheduled_time
+        FROM rides
+        WHERE status IN ('Requested', 'Scheduled')
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def timed(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--rides", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db_connection.set_database(path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        seed(args.rides)
+
+        cases = [
+            ("get_active_ride",
+             lambda: old_get_active_ride(path, 1),
+             lambda: database.get_active_ride(1)),
+            ("get_pending_rides_for_driver",
+             lambda: old_get_pending(path, 1),
+             lambda: database.get_pending_rides_for_driver(1)),
+        ]
+
+        print(f"{'query':32} {'before us/call':>15} {'after us/call':>15} {'speedup':>8}")
+        for name, before, after in cases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                b = timed(before, args.calls)
+                a = timed(after, args.calls)
+            print(f"{name:32} {b:15.1f} {a:15.1f} {b / a:7.1f}x")
+
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
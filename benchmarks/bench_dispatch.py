@@ -0,0 +1,138 @@
+# benchmarks/bench_dispatch.py
+"""Nearest-driver lookup and ride dispatch with many located drivers.
+
+Places --drivers drivers around the Kathmandu valley (a share of them
+busy), then measures DriverIndex.nearest, location update throughput,
+and create_ride with offers at --rate rides/sec. The offered drivers
+are checked against a brute-force scan.
+
+    python benchmarks/bench_dispatch.py [--drivers 10000] [--rate 1000] [--seconds 3]
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import dispatch
+
+VALLEY = (27.62, 27.78, 85.24, 85.44)
+
+
+def random_point(rnd):
+    return rnd.uniform(VALLEY[0], VALLEY[1]), rnd.uniform(VALLEY[2], VALLEY[3])
+
+
+def pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+
+def brute_force(points, busy, lat, lon, k, max_km):
+    kx = math.cos(math.radians(lat))
+    found = sorted(
+        (dispatch.KM_PER_DEG * math.hypot(p[0] - lat, (p[1] - lon) * kx), d)
+        for d, p in points.items() if d not in busy)
+    return [d for km, d in found if km <= max_km][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=10000)
+    parser.add_argument("--busy", type=float, default=0.3)
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    rnd = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+
+        points = {d: random_point(rnd) for d in range(1, args.drivers + 1)}
+        busy = set(rnd.sample(sorted(points), int(args.drivers * args.busy)))
+        now = time.time()
+        with db_connection.transaction():
+            conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+            conn.executemany(
+                "INSERT INTO driver (id, name, email, password, license_number, is_busy) "
+                "VALUES (?, ?, ?, 'x', ?, ?)",
+                ((d, f"D{d}", f"d{d}@x.com", f"L{d}", int(d in busy)) for d in points))
+            conn.executemany(
+                "INSERT INTO driver_location (driver_id, lat, lon, updated_at, seq) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((d, lat, lon, now, d) for d, (lat, lon) in points.items()))
+
+        dispatcher = dispatch.get_dispatcher()
+        t0 = time.perf_counter()
+        dispatcher.sync()
+        print(f"{args.drivers} drivers ({len(busy)} busy), index sync "
+              f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        # Index lookups alone
+        samples = []
+        for _ in range(10000):
+            lat, lon = random_point(rnd)
+            q0 = time.perf_counter()
+            dispatcher.index.nearest(lat, lon, dispatch.OFFER_COUNT)
+            samples.append(time.perf_counter() - q0)
+        print(f"DriverIndex.nearest k={dispatch.OFFER_COUNT}: p50 {pct(samples, 0.5):.3f} ms, "
+              f"p99 {pct(samples, 0.99):.3f} ms")
+
+        # Drivers moving: one update each
+        movers = list(points)[: min(args.drivers, 5000)]
+        t0 = time.perf_counter()
+        for d in movers:
+            lat, lon = points[d]
+            database.update_driver_location(d, lat + rnd.uniform(-1e-3, 1e-3),
+                                            lon + rnd.uniform(-1e-3, 1e-3))
+        elapsed = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        moved = dispatcher.sync()
+        print(f"location updates: {len(movers) / elapsed:.0f}/s; "
+              f"incremental sync of {moved} moves {(time.perf_counter() - t0) * 1000:.1f} ms")
+        points.update({d: (lat, lon) for d, lat, lon in conn.execute(
+            "SELECT driver_id, lat, lon FROM driver_location")})
+
+        # Rides arriving at --rate per second
+        total = int(args.rate * args.seconds)
+        interval = 1.0 / args.rate
+        latencies, checks, mismatches = [], 0, 0
+        start = time.perf_counter()
+        for i in range(total):
+            due = start + i * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            plat, plon = random_point(rnd)
+            q0 = time.perf_counter()
+            ride_id = database.create_ride(
+                1, f"{plat:.5f}, {plon:.5f}", "27.70000, 85.30000", 150.0, "Requested",
+                pickup_coords=(plat, plon))
+            latencies.append(time.perf_counter() - q0)
+            if i % 50 == 0:
+                checks += 1
+                offered = [d for d, _ in database.get_ride_offers(ride_id)]
+                expected = brute_force(points, busy, plat, plon,
+                                       dispatch.OFFER_COUNT, dispatch.MAX_OFFER_KM)
+                mismatches += offered != expected
+        elapsed = time.perf_counter() - start
+        print(f"create_ride + dispatch: {total} rides in {elapsed:.2f} s "
+              f"({total / elapsed:.0f}/s of {args.rate}/s target), "
+              f"p50 {pct(latencies, 0.5):.2f} ms, p99 {pct(latencies, 0.99):.2f} ms")
+        print(f"offers match brute force: {checks - mismatches}/{checks}")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_export.py
+"""Exports: streaming batches vs fetching everything.
+
+Seeds --rides rides over the last year, then compares
+admin_get_all_payments() / get_all_rides() (one fetchall) with
+export.export() writing the same rows to CSV, gzipped CSV and Parquet:
+time, rows per second and peak Python memory. A tenth of the rides
+(a date range) is exported too: the streaming peak should not change
+with the number of rows.
+
+    python benchmarks/bench_export.py [--rides 1000000] [--parquet]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+import export
+
+DAY = 86400.0
+
+
+def seed(conn, n, rnd, now, batch=50000):
+    with db_connection.transaction():
+        conn.executemany("INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+                         ((f"P{i}", f"p{i}@x.com") for i in range(20000)))
+        conn.executemany("INSERT INTO driver (name, email, password, license_number) "
+                         "VALUES (?, ?, 'x', ?)",
+                         ((f"D{i}", f"d{i}@x.com", f"L{i}") for i in range(2000)))
+    statuses = ["Completed"] * 85 + ["Cancelled"] * 10 + ["Requested"] * 5
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, driver_id, pickup, destination, fare, status, "
+                "pickup_address, drop_address, pickup_lat, pickup_lon, drop_lat, drop_lon, "
+                "created_at) VALUES (?, ?, '27.7, 85.3', '27.6, 85.4', ?, ?, "
+                "'Thamel, Kathmandu', 'Patan, Lalitpur', 27.7, 85.3, 27.6, 85.4, ?)",
+                ((rnd.randint(1, 20000), rnd.randint(1, 2000), round(rnd.uniform(100, 1500), 2),
+                  rnd.choice(statuses), now - 365 * DAY * (n - i) / n)
+                 for i in range(lo, min(lo + batch, n))))
+
+
+def measure(fn):
+    """(result, seconds, peak MB); memory is traced in a second, untimed run."""
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    del result
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--parquet", action="store_true", help="also write Parquet (needs pyarrow)")
+    args = parser.parse_args()
+
+    rnd = random.Random(23)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        seed(conn, args.rides, rnd, now)
+        print(f"{args.rides} rides, batches of {export.BATCH_SIZE}")
+
+        for label, fn in (("admin_get_all_payments()", admin_data.admin_get_all_payments),
+                          ("get_all_rides()", database.get_all_rides)):
+            rows, s, mb = measure(fn)
+            print(f"  {label:34s} {s:6.1f} s, peak {mb:7.1f} MB ({len(rows)} rows)")
+            del rows
+
+        out = os.path.join(tmp, "out")
+        runs = [("payments", ".csv", {}), ("payments", ".csv.gz", {}),
+                ("rides", ".csv.gz", {}),
+                ("rides", ".csv.gz", {"date_from": now - 365 * DAY, "date_to": now - 365 * DAY * 0.9})]
+        if args.parquet:
+            runs += [("payments", ".parquet", {}), ("rides", ".parquet", {})]
+        for kind, suffix, query in runs:
+            count, s, mb = measure(lambda: export.export(kind, out + suffix, **query))
+            label = f"export {kind} to {suffix[1:]}" + (", a tenth" if query else "")
+            print(f"  {label:34s} {s:6.1f} s, peak {mb:7.1f} MB ({count} rows, "
+                  f"{count / s:,.0f} rows/s, {os.path.getsize(out + suffix) / 1e6:.0f} MB file)")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_fares.py
+"""Fare quote throughput and accuracy with the zone matrix.
+
+Builds a synthetic valley road graph (see bench_road_graph.py) and a
+zone matrix from it in a temp directory, then quotes random valley
+trips. A sample is also priced from a full route to show the error of
+the zone estimate, and against the old straight-line haversine x rate.
+
+    python benchmarks/bench_fares.py [--trips 100000] [--grid 80] [--cell 0.02]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fares
+import routing
+from passenger_constants import haversine_km, PRICE_NORMAL
+from road_graph import GraphBackend
+from bench_road_graph import synthetic_valley, VALLEY
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trips", type=int, default=100000)
+    parser.add_argument("--grid", type=int, default=80)
+    parser.add_argument("--cell", type=float, default=0.02)
+    parser.add_argument("--sample", type=int, default=1000)
+    args = parser.parse_args()
+
+    graph = synthetic_valley(args.grid)
+    t0 = time.perf_counter()
+    graph.contract()
+    backend = GraphBackend(graph)
+    routing.set_backend(backend)
+    print(f"graph: {graph.node_count} nodes, CH in {time.perf_counter() - t0:.1f} s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fares.ZONE_FILE = os.path.join(tmp, "fare_zones.bin")
+        t0 = time.perf_counter()
+        rows, cols = fares.build_matrix(fares.ZONE_FILE, bbox=VALLEY,
+                                        cell=args.cell, backend=backend)
+        print(f"zone matrix: {rows}x{cols} zones, "
+              f"{os.path.getsize(fares.ZONE_FILE) / 1024:.0f} KiB, "
+              f"built in {time.perf_counter() - t0:.1f} s")
+
+        rnd = random.Random(11)
+        min_lat, max_lat, min_lon, max_lon = VALLEY
+        trips = [((rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon)),
+                  (rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon)))
+                 for _ in range(args.trips)]
+
+        sources = Counter()
+        t0 = time.perf_counter()
+        for start, end in trips:
+            sources[fares.quote(start, end).source] += 1
+        elapsed = time.perf_counter() - t0
+        print(f"{args.trips} quotes in {elapsed:.2f} s "
+              f"({args.trips / elapsed:.0f}/s, {elapsed / args.trips * 1e6:.1f} us each)")
+        print(f"sources: {dict(sources)}")
+
+        errors, old_errors = [], []
+        t0 = time.perf_counter()
+        for start, end in trips[:args.sample]:
+            route = backend.fetch(start, end)
+            if route is None:
+                continue
+            exact = fares.price(route.distance_km, route.duration_min)
+            zone = fares.quote(start, end)
+            errors.append(abs(zone.fare - exact) / exact)
+            old = haversine_km(*start, *end) * PRICE_NORMAL
+            old_errors.append((old - exact) / exact)
+        routed = (time.perf_counter() - t0) / args.sample
+        errors.sort()
+        print(f"routed quote: {routed * 1000:.2f} ms each")
+        print(f"zone vs routed fare error: median {errors[len(errors) // 2]:.1%}, "
+              f"p95 {errors[int(len(errors) * 0.95)]:.1%}")
+        print(f"old haversine x rate vs routed fare: "
+              f"mean {sum(old_errors) / len(old_errors):+.1%}")
+        fares.get_matrix().close()
+
+
+if __name__ == "__main__":
+    main()
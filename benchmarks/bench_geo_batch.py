@@ -0,0 +1,66 @@
+# benchmarks/bench_geo_batch.py
+"""Batch haversine throughput: geo_batch (NumPy) vs the scalar loop.
+
+    python benchmarks/bench_geo_batch.py [--pairs 1000000] [--matrix 2000x5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo_batch
+import passenger_constants as pc
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=1_000_000)
+    parser.add_argument("--matrix", default="2000x5000")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    n = args.pairs
+    lat1, lat2 = rng.uniform(26.4, 30.4, (2, n))
+    lon1, lon2 = rng.uniform(80.1, 88.2, (2, n))
+
+    scalar, t_scalar = timed(lambda: [
+        pc.haversine_km(a, b, c, d)
+        for a, b, c, d in zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist())])
+    batch, t_batch = timed(lambda: geo_batch.haversine_km(lat1, lon1, lat2, lon2))
+    err = np.max(np.abs(np.asarray(scalar) - batch))
+    print(f"{n} pairs")
+    print(f"  scalar loop: {t_scalar:.3f} s ({n / t_scalar / 1e6:.2f} M pairs/s)")
+    print(f"  geo_batch:   {t_batch:.3f} s ({n / t_batch / 1e6:.2f} M pairs/s), "
+          f"{t_scalar / t_batch:.0f}x, max abs diff {err:.2e} km")
+
+    lats = rng.uniform(25.0, 31.0, n)
+    lons = rng.uniform(79.0, 89.0, n)
+    scalar_mask, t_scalar = timed(lambda: [
+        pc.is_inside_nepal(a, b) for a, b in zip(lats.tolist(), lons.tolist())])
+    mask, t_batch = timed(lambda: geo_batch.is_inside_nepal(lats, lons))
+    assert scalar_mask == mask.tolist()
+    print(f"is_inside_nepal over {n} points: scalar {t_scalar:.3f} s, "
+          f"mask {t_batch:.4f} s ({t_scalar / t_batch:.0f}x)")
+
+    rows, cols = (int(x) for x in args.matrix.split("x"))
+    a = np.column_stack([rng.uniform(27.6, 27.8, rows), rng.uniform(85.2, 85.45, rows)])
+    b = np.column_stack([rng.uniform(27.6, 27.8, cols), rng.uniform(85.2, 85.45, cols)])
+    matrix, t_matrix = timed(lambda: geo_batch.distance_matrix(a, b))
+    spot = pc.haversine_km(*a[17], *b[42])
+    assert abs(matrix[17, 42] - spot) < 1e-9
+    print(f"distance_matrix {rows}x{cols}: {t_matrix:.3f} s "
+          f"({rows * cols / t_matrix / 1e6:.1f} M pairs/s)")
+
+
+if __name__ == "__main__":
+    main()
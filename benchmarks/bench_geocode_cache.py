@@ -0,0 +1,95 @@
+# benchmarks/bench_geocode_cache.py
+"""Driver-dashboard refresh cost with and without the geocode cache.
+
+A stand-in geolocator sleeps for --latency-ms per call so the numbers do
+not depend on (or hammer) the public Nominatim server.
+
+    python benchmarks/bench_geocode_cache.py [--rides 20] [--refreshes 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import migrations
+import geocode_cache
+
+
+class SlowGeolocator:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def reverse(self, query, language=False, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        lat, lon = query
+        return SimpleNamespace(
+            address=f"Road {lat:.3f}, Kathmandu", latitude=lat, longitude=lon,
+            raw={"address": {"road": f"Road {lat:.3f}", "city": "Kathmandu"}})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=20)
+    parser.add_argument("--refreshes", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    # Two reverse lookups (pickup + destination) per ride card.
+    coords = [(27.7 + rnd.random() * 0.1, 85.3 + rnd.random() * 0.1)
+              for _ in range(args.rides * 2)]
+
+    geo = SlowGeolocator(args.latency_ms / 1000)
+    t0 = time.perf_counter()
+    for _ in range(args.refreshes):
+        for lat, lon in coords:
+            geo.reverse((lat, lon), language="en", timeout=10)
+    uncached = (time.perf_counter() - t0) / args.refreshes
+    uncached_calls = geo.calls / args.refreshes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "geo.db"))
+        migrations.migrate()
+
+        geo = SlowGeolocator(args.latency_ms / 1000)
+        timings = []
+        calls = []
+        for _ in range(args.refreshes):
+            before = geo.calls
+            t0 = time.perf_counter()
+            for lat, lon in coords:
+                geocode_cache.reverse(lat, lon, geo, language="en")
+            timings.append(time.perf_counter() - t0)
+            calls.append(geo.calls - before)
+
+        # New process: LRU empty, SQLite tier still warm.
+        geocode_cache.clear_memory()
+        before = geo.calls
+        t0 = time.perf_counter()
+        for lat, lon in coords:
+            geocode_cache.reverse(lat, lon, geo, language="en")
+        restart = time.perf_counter() - t0
+        restart_calls = geo.calls - before
+
+        db_connection.close_all()
+
+    print(f"{args.rides} ride cards, {len(coords)} reverse lookups per refresh, "
+          f"{args.latency_ms:.0f} ms simulated latency")
+    print(f"no cache:            {uncached * 1000:9.1f} ms/refresh, {uncached_calls:.0f} network calls")
+    print(f"cache, cold refresh: {timings[0] * 1000:9.1f} ms/refresh, {calls[0]} network calls")
+    warm = sum(timings[1:]) / max(1, len(timings) - 1)
+    print(f"cache, warm refresh: {warm * 1000:9.3f} ms/refresh, {sum(calls[1:])} network calls")
+    print(f"after restart (db):  {restart * 1000:9.3f} ms/refresh, {restart_calls} network calls")
+    print(f"hit rate {geocode_cache.hit_rate():.1%}  stats {geocode_cache.stats}")
+
+
+if __name__ == "__main__":
+    main()
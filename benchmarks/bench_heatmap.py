@@ -0,0 +1,146 @@
+# benchmarks/bench_heatmap.py
+"""Demand heatmap: binning cost, reads, and cost on the write path.
+
+Seeds --rides rides with pickups and drops clustered around a few
+cities, then:
+
+  * bins every pickup in memory with heatmap.bin_counts() against
+    a plain Python loop over the same points;
+  * times heatmap.recount() (read + bin every ride, what a rebuild and
+    migration 14 do) against the same count as a SQL GROUP BY;
+  * times the admin overlay's reads, top() and grid();
+  * measures what the heatmap triggers add to create_ride.
+
+    python benchmarks/bench_heatmap.py [--rides 1000000] [--writes 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import db_connection
+import database
+import heatmap
+
+CITIES = [(27.7172, 85.3240, 0.05), (28.2096, 83.9856, 0.03), (26.4525, 87.2718, 0.03),
+          (27.6710, 85.4298, 0.02), (27.0104, 84.8770, 0.02)]
+
+
+def point(rnd):
+    if rnd.random() < 0.1:
+        return (rnd.uniform(heatmap.NEPAL_MIN_LAT, heatmap.NEPAL_MAX_LAT),
+                rnd.uniform(heatmap.NEPAL_MIN_LON, heatmap.NEPAL_MAX_LON))
+    lat, lon, spread = rnd.choice(CITIES)
+    return rnd.gauss(lat, spread), rnd.gauss(lon, spread)
+
+
+def seed(conn, n, rnd, batch=50000):
+    with db_connection.transaction():
+        conn.executemany("INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+                         ((f"P{i}", f"p{i}@x.com") for i in range(20000)))
+    for lo in range(0, n, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status, "
+                "pickup_lat, pickup_lon, drop_lat, drop_lon) "
+                "VALUES (?, 'a', 'b', 300.0, 'Completed', ?, ?, ?, ?)",
+                ((rnd.randint(1, 20000), *point(rnd), *point(rnd))
+                 for _ in range(lo, min(lo + batch, n))))
+
+
+def python_bins(lats, lons):
+    counts = {}
+    for lat, lon in zip(lats, lons):
+        if (heatmap.NEPAL_MIN_LAT <= lat <= heatmap.NEPAL_MAX_LAT
+                and heatmap.NEPAL_MIN_LON <= lon <= heatmap.NEPAL_MAX_LON):
+            row = min(int((lat - heatmap.NEPAL_MIN_LAT) / heatmap.CELL_DEG), heatmap.ROWS - 1)
+            col = min(int((lon - heatmap.NEPAL_MIN_LON) / heatmap.CELL_DEG), heatmap.COLS - 1)
+            cell = row * heatmap.COLS + col
+            counts[cell] = counts.get(cell, 0) + 1
+    return counts
+
+
+def best(fn, rounds=5):
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return min(samples) * 1000
+
+
+def writes(n, rnd):
+    """ms per create_ride with coordinates."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pickup, drop = point(rnd), point(rnd)
+        database.create_ride(rnd.randint(1, 20000), "a", "b", 300.0, "Completed",
+                             pickup_coords=pickup, drop_coords=drop)
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(22)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        t0 = time.perf_counter()
+        seed(conn, args.rides, rnd)
+        print(f"{args.rides} rides (seeded with heatmap triggers in {time.perf_counter() - t0:.1f} s), "
+              f"{heatmap.ROWS}x{heatmap.COLS} cells of {heatmap.CELL_DEG} deg")
+
+        points = np.array(conn.execute("SELECT pickup_lat, pickup_lon FROM rides").fetchall())
+        lats, lons = points[:, 0], points[:, 1]
+        numpy_ms = best(lambda: heatmap.bin_counts(lats, lons))
+        python_ms = best(lambda: python_bins(lats.tolist(), lons.tolist()), rounds=1)
+        print(f"  bin {len(lats)} pickups: numpy {numpy_ms:.1f} ms, "
+              f"Python loop {python_ms:.0f} ms ({python_ms / numpy_ms:.0f}x)")
+
+        recount_ms = best(lambda: heatmap.recount(conn), rounds=3)
+        cell = heatmap.cell_sql("pickup_lat", "pickup_lon")
+        sql_ms = best(lambda: conn.execute(
+            f"SELECT {cell} AS c, COUNT(*) FROM rides WHERE c IS NOT NULL GROUP BY c").fetchall(),
+            rounds=1)
+        print(f"  recount both layers from rides: {recount_ms:.0f} ms "
+              f"(SQL GROUP BY, pickups only: {sql_ms:.0f} ms)")
+        rebuild_ms = best(heatmap.rebuild, rounds=1)
+        print(f"  full rebuild (recount + rewrite the table): {rebuild_ms:.0f} ms")
+
+        top_ms = best(lambda: heatmap.top("pickup", 200), rounds=50)
+        grid_ms = best(lambda: heatmap.grid("pickup"), rounds=10)
+        busy = conn.execute("SELECT COUNT(*) FROM heatmap WHERE layer = 'pickup'").fetchone()[0]
+        print(f"  overlay reads: top(200) {top_ms:.2f} ms, grid() {grid_ms:.1f} ms "
+              f"({busy} non-empty pickup cells)")
+
+        with_ms = writes(args.writes, rnd)
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'heatmap_%'"
+        ).fetchall()
+        with db_connection.transaction():
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        without_ms = writes(args.writes, rnd)
+        with db_connection.transaction():
+            for _, sql in triggers:
+                conn.execute(sql)
+        print(f"  create_ride: {with_ms:.3f} ms with heatmap triggers, {without_ms:.3f} ms without")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
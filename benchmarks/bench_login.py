@@ -0,0 +1,112 @@
+# benchmarks/bench_login.py
+"""Login throughput: identity lookup plus bcrypt in a worker pool.
+
+    python benchmarks/bench_login.py [--logins 64] [--workers 1 2 4 8]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+
+import db_connection
+import database
+
+
+def seed(n_users, hashed):
+    conn = db_connection.get_connection()
+    with db_connection.transaction():
+        conn.execute("INSERT INTO admin (id, username, password) VALUES (1, 'admin', ?)", (hashed,))
+        conn.executemany(
+            "INSERT INTO driver (name, email, password, license_number) VALUES (?, ?, ?, ?)",
+            ((f"D{i}", f"d{i}@x.com", hashed, f"L{i}") for i in range(n_users))
+        )
+        conn.executemany(
+            "INSERT INTO passenger (name, email, password) VALUES (?, ?, ?)",
+            ((f"P{i}", f"p{i}@x.com", hashed) for i in range(n_users))
+        )
+        conn.execute("INSERT INTO identity (email, role, user_id) VALUES ('admin', 'admin', 1)")
+        conn.executemany(
+            "INSERT INTO identity (email, role, user_id) VALUES (?, ?, ?)",
+            ((f"{prefix}{i}@x.com", role, i + 1)
+             for prefix, role in (("d", "driver"), ("p", "passenger"))
+             for i in range(n_users))
+        )
+
+
+def old_lookup(login):
+    # Role resolution as it was before: up to three sequential queries.
+    cursor = db_connection.get_connection().cursor()
+    cursor.execute("SELECT id, username, password FROM admin WHERE username=?", (login,))
+    row = cursor.fetchone()
+    if row:
+        return row
+    cursor.execute("SELECT id, name, email, phone, password FROM driver WHERE email=?", (login,))
+    row = cursor.fetchone()
+    if row:
+        return row
+    cursor.execute("SELECT id, name, email, password FROM passenger WHERE email=?", (login,))
+    return cursor.fetchone()
+
+
+def new_lookup(login):
+    cursor = db_connection.get_connection().cursor()
+    cursor.execute("""
+        SELECT i.role, i.user_id, COALESCE(a.password, d.password, p.password)
+        FROM identity i
+        LEFT JOIN admin a ON i.role='admin' AND a.id=i.user_id
+        LEFT JOIN driver d ON i.role='driver' AND d.id=i.user_id
+        LEFT JOIN passenger p ON i.role='passenger' AND p.id=i.user_id
+        WHERE i.email=?
+    """, (login,))
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(args.rounds)).decode("utf-8")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "login.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        seed(args.users, hashed)
+
+        # Passengers are the worst case for the old sequential lookup.
+        emails = [f"p{i % args.users}@x.com" for i in range(args.logins)]
+
+        for name, fn in (("3-query lookup", old_lookup), ("identity lookup", new_lookup)):
+            t0 = time.perf_counter()
+            for _ in range(20):
+                for e in emails:
+                    fn(e)
+            us = (time.perf_counter() - t0) / (20 * len(emails)) * 1e6
+            print(f"{name:17} {us:8.1f} us/lookup")
+
+        print(f"\nbcrypt cost {args.rounds}, {args.logins} logins, {os.cpu_count()} CPU(s)")
+        for workers in args.workers:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                t0 = time.perf_counter()
+                results = list(pool.map(lambda e: database.login_user(e, "secret"), emails))
+                elapsed = time.perf_counter() - t0
+            assert all(r and r[0] == "Passenger" for r in results)
+            print(f"workers={workers:<3} {len(emails) / elapsed:8.1f} logins/sec")
+
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
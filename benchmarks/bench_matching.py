@@ -0,0 +1,209 @@
+# benchmarks/bench_matching.py
+"""Batch matcher: assignment solve time and pickup km against greedy.
+
+Scatters --size open rides and --size idle drivers over the Kathmandu
+valley and times matching.solve (candidate search + assignment), repeated
+over a few seeds. Tiny instances are checked against exhaustive search
+and small ones against an exact Hungarian solve on the same sparse
+costs (most rides matched first, then least pickup ETA); finally one
+run_once writes a batch through admin_assign_driver on a temporary
+database.
+
+    python benchmarks/bench_matching.py [--size 2000] [--rounds 5]
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import dispatch
+import matching
+
+VALLEY = (27.62, 27.78, 85.24, 85.44)
+
+
+def random_point(rnd):
+    return rnd.uniform(VALLEY[0], VALLEY[1]), rnd.uniform(VALLEY[2], VALLEY[3])
+
+
+def instance(rnd, rides, drivers):
+    ride_rows = [(i, *random_point(rnd)) for i in range(rides)]
+    index = dispatch.DriverIndex()
+    for d in range(drivers):
+        index.update(d, *random_point(rnd))
+    return ride_rows, index
+
+
+def hungarian(costs, columns):
+    """Exact min-cost assignment, unmatched rows allowed (O(n^3), small n only)."""
+    n = len(costs)
+    big = 1e9
+    col_ids = sorted(columns)
+    # Square matrix: real columns, then one private "unmatched" column per row.
+    size = len(col_ids) + n
+    pos = {c: k for k, c in enumerate(col_ids)}
+    # Leaving a row unmatched costs more than any whole matching.
+    top = n * max((c for row in costs for _, c in row), default=0.0) + 1.0
+    a = [[big] * size for _ in range(size)]
+    for i, row in enumerate(costs):
+        a[i][len(col_ids) + i] = top
+        for j, c in row:
+            a[i][pos[j]] = c
+    for i in range(n, size):
+        a[i] = [0.0] * size
+    u, v = [0.0] * (size + 1), [0.0] * (size + 1)
+    p, way = [0] * (size + 1), [0] * (size + 1)
+    for i in range(1, size + 1):
+        p[0], j0 = i, 0
+        minv, used = [math.inf] * (size + 1), [False] * (size + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], math.inf, 0
+            for j in range(1, size + 1):
+                if not used[j]:
+                    cur = a[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(size + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assignment = [None] * n
+    for j in range(1, len(col_ids) + 1):
+        if p[j] and p[j] <= n:
+            assignment[p[j] - 1] = col_ids[j - 1]
+    return assignment
+
+
+def brute_force(costs):
+    """(matched, cost) of the best assignment: most rows matched, then cheapest."""
+    def best(i, taken):
+        if i == len(costs):
+            return 0, 0.0
+        options = [best(i + 1, taken)]
+        for j, c in costs[i]:
+            if j not in taken:
+                matched, cost = best(i + 1, taken | {j})
+                options.append((matched + 1, cost + c))
+        return max(options, key=lambda o: (o[0], -o[1]))
+    return best(0, frozenset())
+
+
+def small_instance(rnd, rows=6, columns=5):
+    """Sparse costs where cheap edges often compete for the same column."""
+    return [[(j, rnd.choice([0.0, rnd.uniform(0, 100), 100.0]))
+             for j in rnd.sample(range(columns), rnd.randint(0, 3))]
+            for _ in range(rows)]
+
+
+def check_brute_force(rnd, instances=2000):
+    """assign() against exhaustive search on small instances."""
+    for _ in range(instances):
+        costs = small_instance(rnd)
+        got = matching.assign(costs)
+        taken = [j for j in got if j is not None]
+        assert len(taken) == len(set(taken))
+        assert all(j is None or j in dict(row) for row, j in zip(costs, got))
+        matched = len(taken)
+        cost = sum(dict(row)[j] for row, j in zip(costs, got) if j is not None)
+        want_matched, want_cost = brute_force(costs)
+        assert matched == want_matched, (costs, got)
+        assert abs(cost - want_cost) < 1e-6, (costs, got)
+    print(f"brute-force check ({instances} small sparse instances): "
+          f"same matched count and cost")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--check", type=int, default=120, help="rides/drivers in exact checks")
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    solve_ms, total_ms = [], []
+    for _ in range(args.rounds):
+        rides, index = instance(rnd, args.size, args.size)
+        t0 = time.perf_counter()
+        _, m = matching.solve(rides, index)
+        total_ms.append((time.perf_counter() - t0) * 1000)
+        solve_ms.append(m["solve_ms"])
+    print(f"{args.size} rides x {args.size} drivers, {m['edges']} candidate edges")
+    print(f"  candidates + assignment: median {sorted(total_ms)[len(total_ms) // 2]:.0f} ms, "
+          f"max {max(total_ms):.0f} ms (assignment alone median "
+          f"{sorted(solve_ms)[len(solve_ms) // 2]:.0f} ms)")
+    print(f"  matched {m['matched']} vs greedy {m['greedy_matched']}; pickup km "
+          f"{m['pickup_km']:.0f} vs greedy {m['greedy_pickup_km']:.0f}; "
+          f"per ride {m['avg_pickup_km']:.3f} vs {m['greedy_avg_pickup_km']:.3f} km "
+          f"(on greedy's rides, optimal saves {m['saved_km']:.0f} km)")
+
+    check_brute_force(rnd)
+
+    worst_gap = 0.0
+    for _ in range(5):
+        rides, index = instance(rnd, args.check, args.check)
+        edges = matching.candidate_edges(rides, index)
+        costs = [[(d, matching.pickup_eta(km)) for d, km in row] for row in edges]
+        got = matching.assign(costs)
+        exact = hungarian(costs, {d for row in edges for d, _ in row})
+        got_n, got_km = matching.total_km(edges, got)
+        exact_n, exact_km = matching.total_km(edges, exact)
+        assert got_n == exact_n, (got_n, exact_n)
+        worst_gap = max(worst_gap, got_km - exact_km)
+    print(f"exact check ({args.check}x{args.check}, 5 instances): same matched count, "
+          f"worst excess {worst_gap * 1000:.0f} m pickup distance")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        n = min(args.size, 500)
+        now = time.time()
+        with db_connection.transaction():
+            conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+            conn.executemany(
+                "INSERT INTO driver (id, name, email, password, license_number) "
+                "VALUES (?, ?, ?, 'x', ?)",
+                ((d, f"D{d}", f"d{d}@x.com", f"L{d}") for d in range(1, n + 1)))
+            conn.executemany(
+                "INSERT INTO driver_location (driver_id, lat, lon, updated_at, seq) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((d, *random_point(rnd), now, d) for d in range(1, n + 1)))
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status, "
+                "pickup_lat, pickup_lon) VALUES (1, 'p', 'd', 100, 'Requested', ?, ?)",
+                (random_point(rnd) for _ in range(n)))
+        t0 = time.perf_counter()
+        m = matching.BatchMatcher().run_once()
+        elapsed = time.perf_counter() - t0
+        busy = conn.execute("SELECT COUNT(*) FROM driver WHERE is_busy=1").fetchone()[0]
+        notes = conn.execute("SELECT COUNT(*) FROM driver_notifications").fetchone()[0]
+        assert m["assigned"] == m["matched"] == busy == notes
+        print(f"run_once on {n}x{n}: {m['assigned']} assigned in {elapsed:.2f} s "
+              f"(solve {m['solve_ms']:.0f} ms)")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_registration.py
+"""Bulk registration through register_driver/register_passenger.
+
+Compares the old three-table email probe with the identity lookup, then
+registers a batch of users end to end (with a low bcrypt cost so the
+database path is what gets measured).
+
+    python benchmarks/bench_registration.py [--users 2000] [--rounds 4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+
+
+def old_probe(email, current_role):
+    # is_email_registered_elsewhere before the identity table.
+    cursor = db_connection.get_connection().cursor()
+    for role in ("admin", "driver", "passenger"):
+        if role == current_role:
+            continue
+        if role == "admin":
+            cursor.execute("SELECT * FROM admin WHERE username=?", (email,))
+        else:
+            cursor.execute(f"SELECT * FROM {role} WHERE email=?", (email,))
+        if cursor.fetchone():
+            return role
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt cost factor")
+    args = parser.parse_args()
+
+    database.BCRYPT_ROUNDS = args.rounds
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "register.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+            t0 = time.perf_counter()
+            for i in range(args.users):
+                if i % 2:
+                    ok = database.register_driver(f"D{i}", f"u{i}@x.com", "pw", f"L{i}")
+                else:
+                    ok = database.register_passenger(f"P{i}", f"u{i}@x.com", "pw")
+                assert ok is True, ok
+            elapsed = time.perf_counter() - t0
+
+            conflicts = 0
+            t0 = time.perf_counter()
+            for i in range(1, args.users, 2):
+                if database.register_passenger("X", f"u{i}@x.com", "pw") == "email-exists-in-driver":
+                    conflicts += 1
+            conflict_elapsed = time.perf_counter() - t0
+
+        print(f"registered {args.users} users (bcrypt cost {args.rounds}): "
+              f"{args.users / elapsed:.0f} registrations/sec")
+        print(f"rejected {conflicts} cross-role duplicates: "
+              f"{conflicts / conflict_elapsed:.0f} rejections/sec")
+
+        emails = [f"u{i}@x.com" for i in range(args.users)] + \
+                 [f"new{i}@x.com" for i in range(args.users)]
+        for name, fn in (("3-table probe", old_probe),
+                         ("identity lookup", database.is_email_registered_elsewhere)):
+            t0 = time.perf_counter()
+            for e in emails:
+                fn(e, "passenger")
+            us = (time.perf_counter() - t0) / len(emails) * 1e6
+            print(f"{name:16} {us:7.1f} us/check")
+
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
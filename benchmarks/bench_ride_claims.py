@@ -0,0 +1,118 @@
+# benchmarks/bench_ride_claims.py
+"""Contention benchmark for ride acceptance.
+
+N driver processes race through the same list of Requested rides calling
+driver_accept_ride, completing each ride they win so they can claim the
+next one. Reports claims/sec and checks every ride was won exactly once.
+
+    python benchmarks/bench_ride_claims.py [--drivers 8] [--rides 2000]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db_connection
+import database
+
+
+def setup(path, n_drivers, n_rides):
+    db_connection.set_database(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_tables()
+    conn = db_connection.get_connection()
+    with db_connection.transaction():
+        conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+        conn.executemany(
+            "INSERT INTO driver (name, email, password, license_number) VALUES (?, ?, 'x', ?)",
+            ((f"D{i}", f"d{i}@x.com", f"L{i}") for i in range(n_drivers))
+        )
+        conn.executemany(
+            "INSERT INTO rides (passenger_id, pickup, destination, fare, status) "
+            "VALUES (1, 'a', 'b', 100, 'Requested')",
+            ((),) * n_rides
+        )
+    db_connection.close_all()
+
+
+def driver_worker(path, driver_id, n_rides, start_event, results):
+    db_connection.set_database(path)
+    ride_ids = list(range(1, n_rides + 1))
+    random.Random(driver_id).shuffle(ride_ids)
+
+    won = []
+    attempts = 0
+    start_event.wait()
+    for ride_id in ride_ids:
+        attempts += 1
+        if database.driver_accept_ride(driver_id, ride_id) == "accepted":
+            won.append(ride_id)
+            database.complete_ride(ride_id, driver_id)
+    results.put((driver_id, won, attempts))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=8)
+    parser.add_argument("--rides", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "claims.db")
+        setup(path, args.drivers, args.rides)
+
+        start_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(
+                target=driver_worker,
+                args=(path, driver_id, args.rides, start_event, results))
+            for driver_id in range(1, args.drivers + 1)
+        ]
+        for p in procs:
+            p.start()
+
+        t0 = time.perf_counter()
+        start_event.set()
+        collected = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - t0
+        for p in procs:
+            p.join()
+
+        wins = [ride_id for _, won, _ in collected for ride_id in won]
+        attempts = sum(a for _, _, a in collected)
+        double = len(wins) - len(set(wins))
+
+        db_connection.set_database(path)
+        conn = db_connection.get_connection()
+        completed = conn.execute(
+            "SELECT COUNT(*) FROM rides WHERE status='Completed'").fetchone()[0]
+        mismatched = sum(
+            1 for driver_id, won, _ in collected for ride_id in won
+            if conn.execute("SELECT driver_id FROM rides WHERE id=?", (ride_id,)).fetchone()[0] != driver_id
+        )
+        db_connection.close_all()
+
+    print(f"drivers={args.drivers} rides={args.rides}")
+    print(f"claim attempts:       {attempts}")
+    print(f"successful claims:    {len(wins)}")
+    print(f"claims/sec:           {len(wins) / elapsed:.0f}")
+    print(f"attempts/sec:         {attempts / elapsed:.0f}")
+    print(f"double assignments:   {double}")
+    print(f"driver_id mismatches: {mismatched}")
+    print(f"completed rides:      {completed}")
+
+    if double or mismatched or len(set(wins)) != args.rides:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
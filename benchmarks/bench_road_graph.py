@@ -0,0 +1,147 @@
+# benchmarks/bench_road_graph.py
+"""Offline routing throughput (queries/sec) on a Kathmandu-valley graph.
+
+Without --graph/--geojson a synthetic street grid over the valley is
+used: ~100 m blocks with jitter, faster arterials every tenth street,
+some one-way streets and some missing blocks. The contraction hierarchy
+is built unless the graph file already has one; CH and bidirectional A*
+queries are timed on the same trips and a sample of answers is checked
+against plain Dijkstra.
+
+    python benchmarks/bench_road_graph.py [--grid 120] [--queries 500]
+    python benchmarks/bench_road_graph.py --graph nepal_roads.graph
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passenger_constants import haversine_km
+from road_graph import RoadGraph, GraphBackend
+
+VALLEY = (27.62, 27.78, 85.24, 85.44)   # min_lat, max_lat, min_lon, max_lon
+
+
+def synthetic_valley(size, seed=1):
+    rnd = random.Random(seed)
+    min_lat, max_lat, min_lon, max_lon = VALLEY
+    coords = []
+    for r in range(size):
+        for c in range(size):
+            coords.append((min_lat + (max_lat - min_lat) * (r + rnd.uniform(-0.3, 0.3)) / size,
+                           min_lon + (max_lon - min_lon) * (c + rnd.uniform(-0.3, 0.3)) / size))
+    edges = []
+
+    def link(u, v, arterial):
+        if not arterial and rnd.random() < 0.08:
+            return                                   # missing block
+        metres = haversine_km(*coords[u], *coords[v]) * 1000
+        seconds = metres / ((50 if arterial else 20) / 3.6)
+        oneway = not arterial and rnd.random() < 0.1
+        edges.append((u, v, metres, seconds))
+        if not oneway:
+            edges.append((v, u, metres, seconds))
+
+    for r in range(size):
+        for c in range(size):
+            u = r * size + c
+            if c + 1 < size:
+                link(u, u + 1, r % 10 == 0)
+            if r + 1 < size:
+                link(u, u + size, c % 10 == 0)
+    return RoadGraph.from_edges(coords, edges)
+
+
+def dijkstra(graph, s, t):
+    dist, heap, done = {s: 0.0}, [(0.0, s)], set()
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u == t:
+            return d
+        if u in done:
+            continue
+        done.add(u)
+        for i in range(graph.f_off[u], graph.f_off[u + 1]):
+            v, nd = graph.f_dst[i], d + graph.f_time[i]
+            if nd < dist.get(v, float("inf")):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return float("inf")
+
+
+def run(backend, pairs, label):
+    times, km, found = [], 0.0, 0
+    t0 = time.perf_counter()
+    for start, end in pairs:
+        q0 = time.perf_counter()
+        route = backend.fetch(start, end)
+        times.append(time.perf_counter() - q0)
+        if route:
+            found += 1
+            km += route.distance_km
+    elapsed = time.perf_counter() - t0
+
+    times.sort()
+    print(f"{label}: {len(pairs)} random valley trips, {found} routed, "
+          f"avg {km / max(found, 1):.1f} km")
+    print(f"  throughput:  {len(pairs) / elapsed:.0f} queries/s")
+    print(f"  p50/p95/max: {times[len(times) // 2] * 1000:.2f} / "
+          f"{times[int(len(times) * 0.95)] * 1000:.2f} / {times[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--graph")
+    parser.add_argument("--geojson")
+    parser.add_argument("--grid", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--astar-queries", type=int, default=100)
+    parser.add_argument("--verify", type=int, default=20)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.graph:
+        graph = RoadGraph.load(args.graph)
+    elif args.geojson:
+        graph = RoadGraph.from_geojson(args.geojson)
+    else:
+        graph = synthetic_valley(args.grid)
+    print(f"graph: {graph.node_count} nodes, {graph.edge_count} edges "
+          f"({time.perf_counter() - t0:.2f} s to build/load)")
+
+    if graph.ch is None:
+        t0 = time.perf_counter()
+        ch = graph.contract()
+        print(f"contraction hierarchy: {len(ch.up_dst) + len(ch.dn_src)} edges "
+              f"({time.perf_counter() - t0:.1f} s)")
+
+    rnd = random.Random(42)
+    min_lat, max_lat, min_lon, max_lon = VALLEY
+    pairs = [((rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon)),
+              (rnd.uniform(min_lat, max_lat), rnd.uniform(min_lon, max_lon)))
+             for _ in range(args.queries)]
+
+    backend = GraphBackend(graph)
+    backend.fetch(*pairs[0])                         # build the snap index
+    run(backend, pairs, "contraction hierarchy")
+    ch, graph.ch = graph.ch, None
+    run(backend, pairs[:args.astar_queries], "bidirectional A*")
+    graph.ch = ch
+
+    mismatches = 0
+    for start, end in pairs[:args.verify]:
+        s, t = graph.nearest_node(*start), graph.nearest_node(*end)
+        expected = dijkstra(graph, s, t)
+        _, astar = graph.shortest_path(s, t)
+        _, hierarchy, _ = graph.ch.query(s, t)
+        if abs(astar - expected) > 1e-2 or abs(hierarchy - expected) > 1e-2:
+            mismatches += 1
+    print(f"verified against Dijkstra: {args.verify - mismatches}/{args.verify} equal")
+
+
+if __name__ == "__main__":
+    main()
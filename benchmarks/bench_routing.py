@@ -0,0 +1,73 @@
+# benchmarks/bench_routing.py
+"""Route cache hit rate and route latency against a local stub OSRM.
+
+Replays a passenger session: markers are dragged around a handful of
+spots (with a few metres of jitter) and some clicks arrive in bursts
+while a request is still in flight.
+
+    python benchmarks/bench_routing.py [--moves 300] [--delay-ms 80]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routing
+from stub_osrm_server import start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moves", type=int, default=300)
+    parser.add_argument("--spots", type=int, default=8)
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--delay-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    server, url = start(delay_ms=args.delay_ms)
+    client = routing.RoutingClient(routing.OSRMBackend(url))
+
+    rnd = random.Random(7)
+    spots = [(27.65 + rnd.random() * 0.1, 85.28 + rnd.random() * 0.1)
+             for _ in range(args.spots)]
+
+    def jitter(p):
+        return (p[0] + rnd.uniform(-2e-5, 2e-5), p[1] + rnd.uniform(-2e-5, 2e-5))
+
+    call_times = []
+    t0 = time.perf_counter()
+    for i in range(args.moves):
+        start_pt, end_pt = jitter(rnd.choice(spots)), jitter(rnd.choice(spots))
+        if i % 10 == 0:
+            # Rapid successive clicks on the same pair while the first is in flight.
+            threads = [threading.Thread(target=client.route, args=(start_pt, end_pt))
+                       for _ in range(args.burst)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            continue
+        c0 = time.perf_counter()
+        client.route(start_pt, end_pt)
+        call_times.append(time.perf_counter() - c0)
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    call_times.sort()
+    p50, p95 = client.latency_percentiles()
+    print(f"{args.moves} marker moves over {args.spots} spots, stub delay {args.delay_ms:.0f} ms")
+    print(f"stats:            {client.stats}")
+    print(f"cache hit rate:   {client.hit_rate():.1%}")
+    print(f"server requests:  {server.RequestHandlerClass.requests_served}")
+    print(f"backend p50/p95:  {p50:.1f} / {p95:.1f} ms")
+    print(f"caller  p50/p95:  {call_times[len(call_times) // 2] * 1000:.2f} / "
+          f"{call_times[int(len(call_times) * 0.95)] * 1000:.2f} ms")
+    print(f"total:            {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
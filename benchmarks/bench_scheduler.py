@@ -0,0 +1,112 @@
+# benchmarks/bench_scheduler.py
+"""Scheduled-ride release: heap memory, pickup of new bookings, timing.
+
+Seeds --rides Scheduled rides spread over the next --days, then
+measures the scheduler's startup load and heap memory per queued ride
+with the default horizon and with everything loaded, the cost of
+picking up new bookings, and how late rides are released relative to
+scheduled_at - lead while the scheduler thread is running.
+
+    python benchmarks/bench_scheduler.py [--rides 1000000] [--days 30] [--timed 200]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import scheduler
+
+
+def pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+
+def insert_scheduled(conn, times, batch=50000):
+    for lo in range(0, len(times), batch):
+        with db_connection.transaction():
+            conn.executemany(
+                "INSERT INTO rides (passenger_id, pickup, destination, fare, status, "
+                "scheduled_at, pickup_lat, pickup_lon) "
+                "VALUES (1, 'p', 'd', 100, 'Scheduled', ?, 27.7, 85.3)",
+                ((t,) for t in times[lo:lo + batch]))
+
+
+def measure_load(horizon, now):
+    sched = scheduler.RideScheduler(horizon=horizon)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    sched._load(db_connection.get_connection(), now)
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sched, elapsed, current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1_000_000)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--timed", type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(9)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        conn = db_connection.get_connection()
+        conn.execute("INSERT INTO passenger (name, email, password) VALUES ('p', 'p@x.com', 'x')")
+
+        now = time.time()
+        lead = database.SCHEDULE_LEAD
+        span = args.days * 86400
+        t0 = time.perf_counter()
+        insert_scheduled(conn, [now + lead + 60 + rnd.uniform(0, span) for _ in range(args.rides)])
+        print(f"seeded {args.rides} scheduled rides over {args.days:g} days "
+              f"in {time.perf_counter() - t0:.1f} s")
+
+        for label, horizon in (("default horizon", scheduler.HORIZON), ("all rides", span + lead)):
+            sched, elapsed, mem = measure_load(horizon, now)
+            n = len(sched)
+            print(f"load ({label}, {horizon / 3600:g} h): {n} rides queued in "
+                  f"{elapsed * 1000:.0f} ms, {mem / 1e6:.1f} MB "
+                  f"({mem / max(n, 1):.0f} B/ride)")
+
+        # New bookings: one poll after 100 inserts, against the 1M-row table.
+        sched = scheduler.RideScheduler()
+        sched.tick(now)
+        insert_scheduled(conn, [now + lead + rnd.uniform(60, 1800) for _ in range(100)])
+        t0 = time.perf_counter()
+        added = sched._poll_new(conn)
+        print(f"poll for new bookings: {added} queued in "
+              f"{(time.perf_counter() - t0) * 1000:.2f} ms")
+
+        # Release timing: rides due 1-5 s from now, booked while running.
+        sched = scheduler.RideScheduler(poll=0.5)
+        thread = sched.start()
+        time.sleep(0.2)
+        now = time.time()
+        insert_scheduled(conn, [now + lead + rnd.uniform(1.0, 5.0) for _ in range(args.timed)])
+        deadline = time.time() + 10
+        while sched.released < args.timed and time.time() < deadline:
+            time.sleep(0.1)
+        sched.stop()
+        thread.join()
+        late = list(sched.lateness)
+        print(f"released {sched.released}/{args.timed}; lateness p50 {pct(late, 0.5):.1f} ms, "
+              f"p99 {pct(late, 0.99):.1f} ms, max {max(late) * 1000:.1f} ms")
+        db_connection.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# benchmarks/check_query_plans.py
+"""Query-plan regression check for the data-access layer.
+
+Seeds a large rides table, calls every public function in database.py
+and admin_data.py, the analytics and heatmap reads, the exports and a
+scheduler tick with SQL tracing on, then runs EXPLAIN QUERY PLAN on
+each captured statement. Exits non-zero if a hot query scans a table,
+or if a page of a paged listing or an export sorts its rows instead of
+reading them in index order.
+
+    python benchmarks/check_query_plans.py [--rides 1000000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+import analytics
+import export
+import heatmap
+import scheduler
+from passenger_constants import parse_schedule
+
+STATUSES = (
+    ["Completed"] * 80 + ["Cancelled"] * 10 + ["Rejected"] * 4
+    + ["Requested"] * 3 + ["Scheduled"] + ["Accepted"] * 2
+)
+
+# Full listings legitimately walk the table; everything else must SEARCH.
+LISTINGS = {
+    "get_all_rides",
+    "admin_get_all_bookings",
+    "admin_get_all_users",
+    "admin_get_all_drivers_with_ratings",
+    "admin_get_scheduled_bookings",
+}
+
+# Pages may walk an index from one end (LIMIT stops them) but must not sort.
+PAGED = {
+    "get_rides_page",
+    "admin_bookings_page",
+    "admin_payments_page",
+    "admin_users_page",
+}
+
+# Exports read whole tables, but in rowid order: a sort would hold them all.
+STREAMED = {"export.batches"}
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def seed(n_rides, n_passengers=50000, n_drivers=5000, batch=50000):
+    conn = db_connection.get_connection()
+    rnd = random.Random(42)
+    with db_connection.transaction():
+        conn.executemany(
+            "INSERT INTO passenger (name, email, password) VALUES (?, ?, 'x')",
+            ((f"P{i}", f"p{i}@x.com") for i in range(n_passengers))
+        )
+        conn.executemany(
+            "INSERT INTO driver (name, email, password, license_number) VALUES (?, ?, 'x', ?)",
+            ((f"D{i}", f"d{i}@x.com", f"L{i}") for i in range(n_drivers))
+        )
+
+    def rows(start, stop):
+        for _ in range(start, stop):
+            status = rnd.choice(STATUSES)
+            driver = None if status in ("Requested", "Scheduled") else rnd.randint(1, n_drivers)
+            sched = rnd.random() < 0.3
+            yield (
+                rnd.randint(1, n_passengers), driver, "27.7, 85.3", "27.6, 85.4",
+                rnd.uniform(50, 2000), status,
+                "2030-01-01" if sched else None, "10:00" if sched else None,
+                parse_schedule("2030-01-01", "10:00") if sched else None,
+            )
+
+    for start in range(0, n_rides, batch):
+        with db_connection.transaction():
+            conn.executemany(
+                """INSERT INTO rides (passenger_id, driver_id, pickup, destination,
+                                      fare, status, scheduled_date, scheduled_time,
+                                      scheduled_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows(start, min(start + batch, n_rides))
+            )
+
+
+def calls():
+    """(name, callable) for every public data-access function."""
+    return [
+        ("is_email_registered_elsewhere", lambda: database.is_email_registered_elsewhere("p1@x.com", "driver")),
+        ("login_admin", lambda: database.login_admin("admin", "x")),
+        ("login_user", lambda: database.login_user("nobody@x.com", "x")),
+        ("create_ride", lambda: database.create_ride(1, "a", "b", 100.0, "Requested")),
+        ("update_driver_location", lambda: database.update_driver_location(5, 27.7, 85.3)),
+        ("create_ride(dispatch)", lambda: database.create_ride(
+            1, "27.70001, 85.30001", "b", 100.0, "Requested", pickup_coords=(27.70001, 85.30001))),
+        ("get_ride_offers", lambda: database.get_ride_offers(1)),
+        ("release_scheduled_ride", lambda: database.release_scheduled_ride(6)),
+        ("RideScheduler.tick", lambda: scheduler.RideScheduler().tick()),
+        ("cache_ride_addresses", lambda: database.cache_ride_addresses(1, "Road, City", None)),
+        ("get_active_ride", lambda: database.get_active_ride(1)),
+        ("get_active_ride(ride_id)", lambda: database.get_active_ride(1, ride_id=1)),
+        ("get_pending_rides_for_driver", lambda: database.get_pending_rides_for_driver(2)),
+        ("get_pending_rides_for_driver(ride_ids)",
+         lambda: database.get_pending_rides_for_driver(2, ride_ids=[7, 8, 9])),
+        ("get_offer_expiries", lambda: database.get_offer_expiries(2)),
+        ("driver_accept_ride", lambda: database.driver_accept_ride(1, 1)),
+        ("get_driver_active_ride", lambda: database.get_driver_active_ride(1)),
+        ("complete_ride", lambda: database.complete_ride(1, 1)),
+        ("submit_driver_rating", lambda: database.submit_driver_rating(1, 5)),
+        ("get_driver_ratings", lambda: database.get_driver_ratings(1)),
+        ("driver_reject_ride", lambda: database.driver_reject_ride(2)),
+        ("cancel_ride", lambda: database.cancel_ride(3)),
+        ("admin_assign_driver", lambda: database.admin_assign_driver(4, 3)),
+        ("get_pending_rides_for_driver(busy)", lambda: database.get_pending_rides_for_driver(3)),
+        ("get_passenger_id_from_ride_id", lambda: database.get_passenger_id_from_ride_id(4)),
+        ("insert_admin_assignment_notifications", lambda: database.insert_admin_assignment_notifications(4, 3, 1)),
+        ("get_available_drivers", lambda: database.get_available_drivers()),
+        ("get_all_rides", lambda: database.get_all_rides()),
+        ("get_rides_page", lambda: database.get_rides_page()),
+        ("get_rides_page(before_id)", lambda: database.get_rides_page(before_id=5000)),
+        ("get_total_users", admin_data.get_total_users),
+        ("get_total_bookings", admin_data.get_total_bookings),
+        ("get_total_payments", admin_data.get_total_payments),
+        ("admin_get_all_bookings", admin_data.admin_get_all_bookings),
+        ("admin_get_all_drivers_with_ratings", admin_data.admin_get_all_drivers_with_ratings),
+        ("admin_get_scheduled_bookings", admin_data.admin_get_scheduled_bookings),
+        ("admin_get_all_users", admin_data.admin_get_all_users),
+        ("admin_get_all_payments", admin_data.admin_get_all_payments),
+        ("admin_get_all_bookings(ride_ids)", lambda: admin_data.admin_get_all_bookings(ride_ids=[1, 2, 3])),
+        ("admin_get_all_payments(ride_ids)", lambda: admin_data.admin_get_all_payments(ride_ids=[1, 2, 3])),
+        ("admin_get_all_drivers_with_ratings(driver_ids)",
+         lambda: admin_data.admin_get_all_drivers_with_ratings(driver_ids=[1, 2])),
+        ("admin_bookings_page", admin_data.admin_bookings_page),
+        ("admin_bookings_page(after)", lambda: admin_data.admin_bookings_page(after=(5000, 5000))),
+        ("admin_bookings_page(fare)", lambda: admin_data.admin_bookings_page(
+            after=(500.0, 5000), sort="fare", descending=False)),
+        ("admin_bookings_page(scheduled)", lambda: admin_data.admin_bookings_page(
+            after=(None, 5000), sort="scheduled")),
+        ("admin_bookings_page(scheduled_only)", lambda: admin_data.admin_bookings_page(
+            sort="scheduled", scheduled_only=True)),
+        ("admin_bookings_page(status)", lambda: admin_data.admin_bookings_page(
+            after=(5000, 5000), status="Cancelled")),
+        ("admin_bookings_page(status, fare)", lambda: admin_data.admin_bookings_page(
+            after=(500.0, 5000), sort="fare", status="Cancelled")),
+        ("admin_bookings_page(status, dates)", lambda: admin_data.admin_bookings_page(
+            sort="scheduled", status="Cancelled", date_from=0.0, date_to=2e9)),
+        ("admin_bookings_page(scheduled_only, dates)", lambda: admin_data.admin_bookings_page(
+            after=(None, 5000), sort="scheduled", scheduled_only=True, date_from=0.0, date_to=2e9)),
+        ("admin_payments_page", lambda: admin_data.admin_payments_page(after=(5000, 5000))),
+        ("admin_payments_page(fare)", lambda: admin_data.admin_payments_page(
+            after=(500.0, 5000), sort="fare")),
+        ("admin_payments_page(dates)", lambda: admin_data.admin_payments_page(
+            date_from=0.0, date_to=2e9)),
+        ("admin_payments_page(scheduled, dates)", lambda: admin_data.admin_payments_page(
+            sort="scheduled", date_from=0.0, date_to=2e9)),
+        ("admin_users_page", lambda: admin_data.admin_users_page(after=(0, 100))),
+        ("analytics.series", lambda: analytics.series(*analytics.last_days(90))),
+        ("analytics.series(hour)", lambda: analytics.series(*analytics.last_days(1), grain="hour")),
+        ("analytics.totals", lambda: analytics.totals(*analytics.last_days(365))),
+        ("analytics.revenue_by_vehicle", lambda: analytics.revenue_by_vehicle(*analytics.last_days(90))),
+        ("heatmap.top", lambda: heatmap.top("pickup", 200)),
+        ("heatmap.grid", lambda: heatmap.grid("drop")),
+        ("export.batches(rides)", lambda: next(export.batches(
+            "rides", status="Completed", date_from=0.0, date_to=2e9), None)),
+        ("export.batches(payments)", lambda: next(export.batches("payments", date_from=0.0), None)),
+        ("export.batches(ratings)", lambda: next(export.batches("ratings", status="Completed"), None)),
+        ("export.batches(users)", lambda: next(export.batches("users"), None)),
+    ]
+
+
+def capture(conn, fn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in statements
+            if s.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT"))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "plans.db"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        seed(args.rides)
+        conn = db_connection.get_connection()
+
+        failures = []
+        for name, fn in calls():
+            base = name.split("(")[0]
+            for sql in capture(conn, fn):
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                if base in PAGED or base in STREAMED:
+                    bad = any("TEMP B-TREE" in p for p in plan)
+                else:
+                    bad = any(FULL_SCAN.match(p.strip()) for p in plan) and base not in LISTINGS
+                if bad:
+                    failures.append((name, sql, plan))
+                if args.verbose or bad:
+                    print(f"{'FAIL' if bad else 'ok  '} {name}")
+                    for p in plan:
+                        print(f"       {p}")
+
+        db_connection.close_all()
+
+    if failures:
+        print(f"\n{len(failures)} hot statement(s) fall back to a full table scan")
+        sys.exit(1)
+    print("All hot queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
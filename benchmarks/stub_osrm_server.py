@@ -0,0 +1,85 @@
+# benchmarks/stub_osrm_server.py
+"""Minimal OSRM-compatible HTTP server for benchmarks and local testing.
+
+Answers /route/v1/<profile>/<lon,lat;lon,lat> with a straight-line
+GeoJSON route after an optional artificial delay.
+
+    python benchmarks/stub_osrm_server.py --port 5005 --delay-ms 80
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passenger_constants import haversine_km
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real server
+    delay = 0.0
+    requests_served = 0
+
+    def do_GET(self):
+        type(self).requests_served += 1
+        parts = urlsplit(self.path).path.split("/")
+        try:
+            coords = parts[4].split(";")
+            (lon1, lat1), (lon2, lat2) = [map(float, c.split(",")) for c in coords]
+        except (IndexError, ValueError):
+            self._send(400, {"code": "InvalidUrl"})
+            return
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        steps = 20
+        line = [[lon1 + (lon2 - lon1) * i / steps, lat1 + (lat2 - lat1) * i / steps]
+                for i in range(steps + 1)]
+        km = haversine_km(lat1, lon1, lat2, lon2) * 1.3
+        self._send(200, {
+            "code": "Ok",
+            "routes": [{
+                "geometry": {"type": "LineString", "coordinates": line},
+                "distance": km * 1000,
+                "duration": km / 25 * 3600,
+            }],
+        })
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(port=0, delay_ms=0.0):
+    """Start in a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (_Handler,), {"delay": delay_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start(args.port, args.delay_ms)
+    print(f"stub OSRM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,351 @@
+# benchmarks/suite.py
+"""End-to-end timings of the data-access layer at several database sizes.
+
+For every --sizes entry, fills a fresh database with synthetic.generate()
+(rides, with a passenger per 20 rides and a driver per 200) and times
+each public function of database.py and admin_data.py, one call at a
+time. Calls that change rides get their own targets, made untimed
+before the case runs: new Requested rides to accept, accepted rides to
+complete, idle drivers with a fresh location, and so on. The first call
+of each case is a warm-up and is not counted.
+
+Results are printed, and with --json written as
+
+    {"meta": {...}, "results": {"<size>": {"<case>": {"number": n,
+     "min_ms": ..., "median_ms": ..., "mean_ms": ...}}}}
+
+--compare reads such a file (a stored baseline) and flags every case
+whose median is more than --threshold slower than the baseline at the
+same size, ignoring differences under NOISE_MS. The exit status is 1 if
+anything regressed.
+
+    python benchmarks/suite.py [--sizes 10000 100000 1000000] [--only ride]
+                               [--json out.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+import admin_data
+import dispatch
+import synthetic
+
+# Calls per case. bcrypt at database.BCRYPT_ROUNDS takes ~0.3 s a call;
+# the full listings hold the whole table.
+READ, WRITE, LISTING, BCRYPT = 50, 30, 3, 3
+THRESHOLD = 0.25        # a median this much slower than the baseline is a regression
+NOISE_MS = 0.02         # ...unless it is also less than this many ms slower
+
+KATHMANDU = (27.7172, 85.3240)
+
+# fn is called as fn(*args) for each tuple prepare(count) returns.
+Case = namedtuple("Case", "name fn prepare number")
+
+_serial = itertools.count(1)
+
+
+def _same(*args):
+    return lambda count: [args] * count
+
+
+def _near(rnd):
+    return rnd.gauss(KATHMANDU[0], 0.02), rnd.gauss(KATHMANDU[1], 0.02)
+
+
+def _drivers(rnd, count):
+    """count new idle drivers, each just seen near Kathmandu; returns their ids."""
+    ids = []
+    for _ in range(count):
+        n = next(_serial)
+        with db_connection.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO driver (name, email, password, license_number) VALUES (?, ?, 'x', ?)",
+                (f"Bench Driver {n}", f"bench.driver{n}@example.com", f"BENCH-{n}"))
+            ids.append(cursor.lastrowid)
+        database.update_driver_location(ids[-1], *_near(rnd))
+    return ids
+
+
+def _rides(rnd, count, passengers, status="Requested", drivers=None):
+    """count new rides near Kathmandu; returns their ids."""
+    now = time.time()
+    scheduled = now + 86400 if status == "Scheduled" else None
+    drivers = drivers or [None] * count
+    ids = []
+    with db_connection.transaction() as conn:
+        for driver in drivers:
+            pickup, drop = _near(rnd), _near(rnd)
+            cursor = conn.execute("""
+                INSERT INTO rides (passenger_id, driver_id, pickup, destination, fare, status,
+                                   scheduled_at, pickup_lat, pickup_lon, drop_lat, drop_lon,
+                                   created_at)
+                VALUES (?, ?, ?, ?, 250.0, ?, ?, ?, ?, ?, ?, ?)
+            """, (rnd.randint(*passengers), driver, f"{pickup[0]:.5f}, {pickup[1]:.5f}",
+                  f"{drop[0]:.5f}, {drop[1]:.5f}", status, scheduled, *pickup, *drop, now))
+            ids.append(cursor.lastrowid)
+    return ids
+
+
+def _accepted(rnd, count, passengers):
+    """(ride, driver) pairs of rides just accepted by new drivers."""
+    pairs = list(zip(_rides(rnd, count, passengers), _drivers(rnd, count)))
+    for ride, driver in pairs:
+        database.claim_ride(ride, driver)
+    return pairs
+
+
+def _register_admin_again(username, password):
+    # Only one admin can exist: remove the last one so that every call registers.
+    with db_connection.transaction() as conn:
+        conn.execute("DELETE FROM admin")
+        conn.execute("DELETE FROM identity WHERE role = 'admin'")
+    return database.register_admin(username, password)
+
+
+def _create_tables():
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.create_tables()
+
+
+def cases(rnd, conn):
+    """Every case, for the database just seeded."""
+    passengers = conn.execute("SELECT MIN(id), MAX(id) FROM passenger").fetchone()
+    rides = conn.execute("SELECT MAX(id) FROM rides").fetchone()[0]
+    email = conn.execute("SELECT email FROM passenger WHERE id = ?", (passengers[1],)).fetchone()[0]
+    regular = conn.execute("""
+        SELECT passenger_id FROM rides WHERE status = 'Completed' ORDER BY id DESC LIMIT 1
+    """).fetchone()[0]
+    last_ride = conn.execute(
+        "SELECT MAX(id) FROM rides WHERE passenger_id = ?", (regular,)).fetchone()[0]
+    rated = conn.execute(
+        "SELECT driver_id FROM driver_ratings GROUP BY driver_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+
+    def registrations(role):
+        def prepare(count):
+            return [(f"Bench {role} {n}", f"bench.{role}{n}@example.com", "password")
+                    + ((f"BENCH-L{n}",) if role == "driver" else ())
+                    for n in (next(_serial) for _ in range(count))]
+        return prepare
+
+    def login(count):
+        n = next(_serial)
+        database.register_passenger(f"Bench Login {n}", f"bench.login{n}@example.com", "password")
+        return [(f"bench.login{n}@example.com", "password")] * count
+
+    def new_ride(count):
+        return [(rnd.randint(*passengers), _near(rnd), _near(rnd)) for _ in range(count)]
+
+    def offered(count):
+        _drivers(rnd, dispatch.OFFER_COUNT)
+        ride = database.create_ride(passengers[0], "a", "b", 250.0, "Requested",
+                                    pickup_coords=KATHMANDU)
+        return [(ride,)] * count
+
+    def busy_driver(count):
+        return [(_accepted(rnd, 1, passengers)[0][1],)] * count
+
+    def idle_driver(count):
+        return [(_drivers(rnd, 1)[0],)] * count
+
+    def requested(count):
+        return [(ride,) for ride in _rides(rnd, count, passengers)]
+
+    def claims(count):
+        return list(zip(_rides(rnd, count, passengers), _drivers(rnd, count)))
+
+    return [
+        Case("create_tables", _create_tables, _same(), LISTING),
+        Case("is_email_registered_elsewhere", database.is_email_registered_elsewhere,
+             _same(email, "driver"), READ),
+        Case("register_admin", _register_admin_again, _same("admin", "password"), BCRYPT),
+        Case("login_admin", database.login_admin, _same("admin", "password"), READ),
+        Case("register_driver", database.register_driver, registrations("driver"), BCRYPT),
+        Case("register_passenger", database.register_passenger, registrations("passenger"), BCRYPT),
+        Case("login_user", database.login_user, login, BCRYPT),
+        Case("login_user(unknown)", database.login_user,
+             _same("nobody@example.com", "password"), READ),
+        Case("create_ride", lambda passenger, pickup, drop: database.create_ride(
+            passenger, "Thamel, Kathmandu", "Patan, Lalitpur", 250.0, "Requested",
+            pickup_coords=pickup, drop_coords=drop), new_ride, WRITE),
+        Case("create_ride(scheduled)", lambda passenger, pickup, drop: database.create_ride(
+            passenger, "Thamel, Kathmandu", "Patan, Lalitpur", 250.0, "Requested",
+            "2099-01-01", "10:00", pickup_coords=pickup, drop_coords=drop), new_ride, WRITE),
+        Case("release_scheduled_ride", database.release_scheduled_ride,
+             lambda count: [(r,) for r in _rides(rnd, count, passengers, "Scheduled")], WRITE),
+        Case("cache_ride_addresses", database.cache_ride_addresses,
+             lambda count: [(r, "Thamel, Kathmandu", "Patan, Lalitpur") for r, in requested(count)],
+             WRITE),
+        Case("get_ride_offers", database.get_ride_offers, offered, READ),
+        Case("get_active_ride", database.get_active_ride, _same(regular), READ),
+        Case("get_active_ride(ride_id)", database.get_active_ride, _same(regular, last_ride), READ),
+        Case("get_pending_rides_for_driver", database.get_pending_rides_for_driver,
+             idle_driver, READ),
+        Case("get_pending_rides_for_driver(busy)", database.get_pending_rides_for_driver,
+             busy_driver, READ),
+        Case("claim_ride", database.claim_ride, claims, WRITE),
+        Case("driver_accept_ride", database.driver_accept_ride,
+             lambda count: [(d, r) for r, d in claims(count)], WRITE),
+        Case("admin_assign_driver", database.admin_assign_driver, claims, WRITE),
+        Case("get_driver_active_ride", database.get_driver_active_ride, busy_driver, READ),
+        Case("complete_ride", database.complete_ride,
+             lambda count: _accepted(rnd, count, passengers), WRITE),
+        Case("cancel_ride", database.cancel_ride,
+             lambda count: [(r,) for r, _ in _accepted(rnd, count, passengers)], WRITE),
+        Case("driver_reject_ride", database.driver_reject_ride, requested, WRITE),
+        Case("submit_driver_rating", database.submit_driver_rating,
+             lambda count: [(r, 5) for r in _rides(rnd, count, passengers, "Completed",
+                                                    _drivers(rnd, count))], WRITE),
+        Case("update_driver_location", database.update_driver_location,
+             lambda count: [(d, *_near(rnd)) for d in _drivers(rnd, count)], WRITE),
+        Case("get_passenger_id_from_ride_id", database.get_passenger_id_from_ride_id,
+             _same(last_ride), READ),
+        Case("insert_admin_assignment_notifications",
+             database.insert_admin_assignment_notifications, _same(last_ride, rated, regular), WRITE),
+        Case("get_available_drivers", database.get_available_drivers, _same(), LISTING),
+        Case("get_driver_ratings", database.get_driver_ratings, _same(rated), READ),
+        Case("get_all_rides", database.get_all_rides, _same(), LISTING),
+        Case("get_rides_page", database.get_rides_page, _same(), READ),
+        Case("get_rides_page(before_id)", database.get_rides_page, _same(rides // 2), READ),
+        Case("get_total_users", admin_data.get_total_users, _same(), READ),
+        Case("get_total_bookings", admin_data.get_total_bookings, _same(), READ),
+        Case("get_total_payments", admin_data.get_total_payments, _same(), READ),
+        Case("admin_get_all_bookings", admin_data.admin_get_all_bookings, _same(), LISTING),
+        Case("admin_get_all_bookings(ride_ids)", admin_data.admin_get_all_bookings,
+             _same([last_ride, rides // 2, 1]), READ),
+        Case("admin_bookings_page", admin_data.admin_bookings_page, _same(), READ),
+        Case("admin_bookings_page(after)", admin_data.admin_bookings_page,
+             _same((rides // 2, rides // 2)), READ),
+        Case("admin_bookings_page(fare)", lambda: admin_data.admin_bookings_page(
+            after=(500.0, rides // 2), sort="fare", descending=False), _same(), READ),
+        Case("admin_bookings_page(scheduled_only)", lambda: admin_data.admin_bookings_page(
+            sort="scheduled", scheduled_only=True), _same(), READ),
+        Case("admin_bookings_page(status)", lambda: admin_data.admin_bookings_page(
+            status="Cancelled"), _same(), READ),
+        Case("admin_get_all_drivers_with_ratings", admin_data.admin_get_all_drivers_with_ratings,
+             _same(), LISTING),
+        Case("admin_get_all_drivers_with_ratings(driver_ids)",
+             admin_data.admin_get_all_drivers_with_ratings, _same([rated, 1]), READ),
+        Case("admin_get_scheduled_bookings", admin_data.admin_get_scheduled_bookings,
+             _same(), LISTING),
+        Case("admin_get_users", admin_data.admin_get_users, _same("driver"), LISTING),
+        Case("admin_get_all_users", admin_data.admin_get_all_users, _same(), LISTING),
+        Case("admin_users_page", admin_data.admin_users_page, _same(), READ),
+        Case("admin_users_page(after)", admin_data.admin_users_page,
+             _same((0, passengers[1] // 2)), READ),
+        Case("admin_get_all_payments", admin_data.admin_get_all_payments, _same(), LISTING),
+        Case("admin_get_all_payments(ride_ids)", admin_data.admin_get_all_payments,
+             _same([last_ride, rides // 2, 1]), READ),
+        Case("admin_payments_page", admin_data.admin_payments_page, _same(), READ),
+        Case("admin_payments_page(fare)", lambda: admin_data.admin_payments_page(
+            sort="fare"), _same(), READ),
+    ]
+
+
+def run(case):
+    """Timing of one case: the calls after the warm-up, in ms."""
+    args = case.prepare(case.number + 1)
+    samples = []
+    for call in args:
+        t0 = time.perf_counter()
+        case.fn(*call)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples = samples[1:]
+    return {"number": len(samples), "min_ms": min(samples),
+            "median_ms": statistics.median(samples), "mean_ms": statistics.fmean(samples)}
+
+
+def measure(size, only=None, seed=1):
+    """{case: timing} for a fresh database of `size` rides."""
+    rnd = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_connection.set_database(os.path.join(tmp, "bench.db"))
+        # The dispatcher's driver index belongs to the previous database.
+        dispatch._dispatcher = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        t0 = time.perf_counter()
+        synthetic.generate(size, max(size // 20, 100), max(size // 200, 50), seed=seed)
+        print(f"{size} rides (seeded in {time.perf_counter() - t0:.1f} s)")
+        for case in cases(rnd, db_connection.get_connection()):
+            if only and not any(word in case.name for word in only):
+                continue
+            results[case.name] = timing = run(case)
+            print(f"  {case.name:48s} median {timing['median_ms']:9.3f} ms, "
+                  f"min {timing['min_ms']:9.3f} ms ({timing['number']} calls)")
+        db_connection.close_all()
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Lines describing each case that is slower than the baseline, by size."""
+    regressions = []
+    for size, timings in results.items():
+        for name, timing in timings.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            old, new = base["median_ms"], timing["median_ms"]
+            if new > old * (1 + threshold) and new - old > NOISE_MS:
+                regressions.append(f"{size:>8s} {name:48s} {old:9.3f} -> {new:9.3f} ms "
+                                   f"({new / old:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="rides in each database")
+    parser.add_argument("--only", nargs="+", help="cases whose name contains any of these")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results = {str(size): measure(size, args.only, args.seed) for size in args.sizes}
+    if args.json:
+        meta = {"created": datetime.now().astimezone().isoformat(timespec="seconds"),
+                "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(), "seed": args.seed}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        missing = sorted(set(map(str, args.sizes)) - set(baseline))
+        if missing:
+            print(f"No baseline for size(s) {', '.join(missing)}")
+        if regressions:
+            print(f"{len(regressions)} case(s) more than {args.threshold:.0%} slower than "
+                  f"{args.compare}:")
+            print("\n".join(regressions))
+            raise SystemExit(1)
+        print(f"No regressions against {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,13 @@ import threading
 from tkinter import messagebox
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from datetime import datetime, date
-from passenger_constants import haversine_km
+import fares
+import geocode_cache
 
 from database import create_ride, get_active_ride, cancel_ride
+from app_logging import get_logger
+
+log = get_logger("booking_management")
 
 
 class BookingManagementMixin:
@@ -42,8 +46,8 @@ class BookingManagementMixin:
             if self.geolocator:
                 try:
                     flt, flon = self.from_loc
-                    loc_from = self.geolocator.reverse(
-                        f"{flt}, {flon}", timeout=10)
+                    loc_from = geocode_cache.reverse(
+                        flt, flon, self.geolocator, timeout=10)
                     pickup_name = loc_from.address if loc_from and getattr(
                         loc_from, "address", None) else None
                 except (GeocoderTimedOut, GeocoderServiceError, Exception):
@@ -51,8 +55,8 @@ class BookingManagementMixin:
 
                 try:
                     tlt, tlon = self.to_loc
-                    loc_to = self.geolocator.reverse(
-                        f"{tlt}, {tlon}", timeout=10)
+                    loc_to = geocode_cache.reverse(
+                        tlt, tlon, self.geolocator, timeout=10)
                     dest_name = loc_to.address if loc_to and getattr(
                         loc_to, "address", None) else None
                 except (GeocoderTimedOut, GeocoderServiceError, Exception):
@@ -63,23 +67,20 @@ class BookingManagementMixin:
             if not dest_name:
                 dest_name = f"{self.to_loc[0]:.5f}, {self.to_loc[1]:.5f}"
         except Exception as e:
-            print("Reverse geocoding error:", e)
+            log.warning("Reverse geocoding error: %s", e)
             pickup_name = f"{self.from_loc[0]:.5f}, {self.from_loc[1]:.5f}"
             dest_name = f"{self.to_loc[0]:.5f}, {self.to_loc[1]:.5f}"
 
-        # distance & fare
+        # distance & fare: the route drawn on the map is normally cached by now
         try:
-
-            d = haversine_km(
-                self.from_loc[0], self.from_loc[1], self.to_loc[0], self.to_loc[1])
-        except Exception:
+            q = fares.quote(self.from_loc, self.to_loc,
+                            getattr(self, "selected_card", "normal"), fetch_route=True)
+            d, fare = q.distance_km, q.fare
+        except Exception as e:
+            log.warning("Fare quote error: %s", e)
             d = getattr(self, "last_distance_km", 0.0)
-
-        try:
-            rate = self.rates[self.selected_card]
-        except Exception:
-            rate = 30.0
-        fare = d * rate
+            fare = fares.price(d, d / fares.DEFAULT_SPEED_KMH * 60,
+                               getattr(self, "selected_card", "normal"))
         self.last_distance_km = d
         self.last_fare = fare
 
@@ -128,7 +129,9 @@ class BookingManagementMixin:
 
             ride_id = create_ride(
                 self.user_id, pickup_name, dest_name, fare, "Requested",
-                scheduled_date=sched_date, scheduled_time=sched_time
+                scheduled_date=sched_date, scheduled_time=sched_time,
+                pickup_coords=self.from_loc, drop_coords=self.to_loc,
+                vehicle=getattr(self, "selected_card", "normal")
             )
         except Exception as e:
             messagebox.showerror(
@@ -142,15 +145,16 @@ class BookingManagementMixin:
             self.ride_info = None
 
         self.ride_active = True
-        self.ride_status = "Requested"
+        # Future bookings are stored as 'Scheduled' until shortly before pickup.
+        self.ride_status = self.ride_info[3] if self.ride_info else "Requested"
 
         # Update passenger UI widgets
         try:
-            self.lbl_status_value.configure(text="Requested ⏳")
+            self.lbl_status_value.configure(text=f"{self.ride_status} ⏳")
             self.btn_cancel_ride.grid()
             def short(s): return ", ".join([p.strip()
                                             for p in str(s).split(",")][:2])
-            self.footer_status_lbl.configure(text="Ride Requested")
+            self.footer_status_lbl.configure(text=f"Ride {self.ride_status}")
             self.footer_pickup_lbl.configure(
                 text=f"Pickup: {short(pickup_name)}")
             self.footer_drop_lbl.configure(text=f"Drop: {short(dest_name)}")
@@ -188,7 +192,7 @@ class BookingManagementMixin:
         try:
             cancel_ride(ride_id, new_status="Cancelled")
         except Exception as e:
-            print("Error cancelling ride:", e)
+            log.error("Error cancelling ride: %s", e)
 
         # update local state + UI
         self.ride_active = False
@@ -221,7 +225,7 @@ class BookingManagementMixin:
             else:
                 active = get_active_ride(self.user_id)
         except Exception as e:
-            print("Error fetching active ride:", e)
+            log.error("Error fetching active ride: %s", e)
             active = None
 
         if not active:
@@ -242,8 +246,7 @@ class BookingManagementMixin:
         # Normalize tuple length
         active = tuple(active) + (None,) * (9 - len(active))
         ride_id, pickup, destination, status, fare, driver_id, rating, scheduled_date, scheduled_time = active
-        print(
-            f"DEBUG: show_active_ride - Fetched rating: {rating}, Status: {status}")
+        log.debug("show_active_ride - rating=%s status=%s", rating, status)
 
         # set mixin state
         self.ride_info = active
@@ -279,7 +282,7 @@ class BookingManagementMixin:
 
         # show/cancel button
         try:
-            if str(status).lower() in ("requested", "pending", "accepted"):
+            if str(status).lower() in ("scheduled", "requested", "pending", "accepted"):
                 self.btn_cancel_ride.grid()
             else:
                 self.btn_cancel_ride.grid_remove()
@@ -297,8 +300,7 @@ class BookingManagementMixin:
             if str(status).lower() == "completed" and (rating is None):
 
                 if hasattr(self, "_handle_rating_required"):
-                    print(
-                        f"DEBUG: Calling _handle_rating_required with: {active}")
+                    log.debug("calling _handle_rating_required with %s", active)
                     self._handle_rating_required(active)
         except Exception:
             pass
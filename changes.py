@@ -0,0 +1,127 @@
+# changes.py
+"""Change feed: dashboards refresh when rides change, not on a timer.
+
+Triggers (migration 10) append a row to change_log for every ride
+insert and status/driver/fare/rating update, and for new driver and
+passenger accounts. change_log.version only ever grows.
+
+Each process has one ChangeFeed. Every WATCH_MS it asks its own
+connection for PRAGMA data_version, which changes only when another
+connection has committed; this reads the WAL header, not any table.
+Only then does it read the change_log rows past the last version it
+saw (a primary-key range) and hand each subscriber the changes it
+asked for, on the Tk loop:
+
+    feed = changes.get_feed()
+    feed.subscribe(self, self._on_changes, match=lambda c: c.passenger_id == user_id)
+
+An idle database therefore costs one pragma per process per tick, not
+one dashboard query per open window every few seconds.
+"""
+import threading
+from collections import namedtuple
+
+import db_connection
+from app_logging import get_logger
+
+log = get_logger("changes")
+
+WATCH_MS = 250
+
+Change = namedtuple("Change", "version ride_id passenger_id driver_id status old_status")
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._conn = None
+        self._data_version = None
+        self.version = None
+        self._subscribers = []      # [widget, callback, match]
+        self._watching = False
+        self.checks = 0             # data_version reads
+        self.reads = 0              # change_log reads
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db_connection.open_connection()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self.version = self._conn.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM change_log").fetchone()[0]
+        return self._conn
+
+    def poll(self):
+        """Changes committed since the last poll, oldest first."""
+        conn = self._connection()
+        self.checks += 1
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+        self.reads += 1
+        rows = conn.execute("""
+            SELECT version, ride_id, passenger_id, driver_id, status, old_status
+            FROM change_log WHERE version > ? ORDER BY version
+        """, (self.version,)).fetchall()
+        if rows:
+            self.version = rows[-1][0]
+        return [Change(*row) for row in rows]
+
+    def subscribe(self, widget, callback, match=None):
+        """Call callback([Change, ...]) on widget's Tk loop for changes match() accepts.
+
+        The subscription ends when the widget is destroyed or when the
+        returned function is called.
+        """
+        entry = [widget, callback, match]
+        self._subscribers.append(entry)
+        self._connection()
+        if not self._watching:
+            self._watching = True
+            widget.after(WATCH_MS, self._watch)
+        return lambda: entry in self._subscribers and self._subscribers.remove(entry)
+
+    def _alive(self):
+        alive = []
+        for entry in self._subscribers:
+            try:
+                if entry[0].winfo_exists():
+                    alive.append(entry)
+            except Exception:
+                pass
+        self._subscribers = alive
+        return alive
+
+    def _watch(self):
+        alive = self._alive()
+        if not alive:
+            self._watching = False
+            return
+        try:
+            changes = self.poll()
+        except Exception as e:
+            log.error("Change feed poll failed: %s", e)
+            changes = []
+        for widget, callback, match in list(alive):
+            wanted = [c for c in changes if match is None or match(c)]
+            if wanted:
+                try:
+                    callback(wanted)
+                except Exception as e:
+                    log.error("Change subscriber failed: %s", e)
+        alive = self._alive()
+        if alive:
+            alive[0][0].after(WATCH_MS, self._watch)
+        else:
+            self._watching = False
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = ChangeFeed()
+        return _feed
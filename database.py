@@ -1,193 +1,96 @@
 import sqlite3
+import time
 import bcrypt
 
-DB_NAME = "taxi_booking.db"
+from db_connection import DB_NAME, get_connection, transaction
+import migrations
+import dispatch
+from app_logging import get_logger
+from passenger_constants import parse_latlon, parse_schedule, short_address
 
+log = get_logger("database")
 
-def create_tables():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS admin (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    )
-    """)
+# bcrypt cost factor for new password hashes.
+BCRYPT_ROUNDS = 12
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS driver (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        phone TEXT,
-        password TEXT NOT NULL,
-        license_number TEXT UNIQUE NOT NULL,
-        is_busy INTEGER DEFAULT 0,
-        current_ride_id INTEGER
-    )
-    """)
+# Scheduled rides are opened to drivers this long before pickup.
+SCHEDULE_LEAD = 15 * 60
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS passenger (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL
-    )
-    """)
+# Appended to ride rows the driver dashboard renders.
+RIDE_PLACE_COLUMNS = ("pickup_address, drop_address, "
+                      "pickup_lat, pickup_lon, drop_lat, drop_lon")
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS rides (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        passenger_id INTEGER NOT NULL,
-        driver_id INTEGER,
-        pickup TEXT NOT NULL,
-        destination TEXT NOT NULL,
-        status TEXT DEFAULT 'Requested',
-        fare REAL,
-
-         NEW FIELDS FOR SCHEDULED BOOKING
-        scheduled_date TEXT,          
-        scheduled_time TEXT,          
-        scheduled_datetime TEXT,      
-
-         FOR ADMIN ASSIGN DRIVER
-        assigned_by_admin INTEGER DEFAULT 0,
-        assigned_at TEXT,
-
-        cancel_requested INTEGER DEFAULT 0,
-        rating INTEGER DEFAULT NULL
-    );
-    """
-    )
 
-    # Add new columns to rides table 
-    cursor.execute("PRAGMA table_info(rides)")
-    columns = [column[1] for column in cursor.fetchall()]
+def create_tables():
+    """Create or upgrade the schema (see migrations.py)."""
+    if migrations.migrate():
+        print("Tables created successfully!")
 
-    if 'scheduled_date' not in columns:
-        cursor.execute("ALTER TABLE rides ADD COLUMN scheduled_date TEXT")
-    if 'scheduled_time' not in columns:
-        cursor.execute("ALTER TABLE rides ADD COLUMN scheduled_time TEXT")
-    if 'scheduled_datetime' not in columns:
-        cursor.execute("ALTER TABLE rides ADD COLUMN scheduled_datetime TEXT")
-    if 'assigned_by_admin' not in columns:
-        cursor.execute("ALTER TABLE rides ADD COLUMN assigned_by_admin INTEGER DEFAULT 0")
 
+def is_email_registered_elsewhere(email, current_role):
+    cursor = get_connection().cursor()
     cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS driver_ratings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ride_id INTEGER,
-        driver_id INTEGER,
-        rating INTEGER,
-        comment TEXT,
-        FOREIGN KEY (ride_id) REFERENCES rides(id),
-        FOREIGN KEY (driver_id) REFERENCES driver(id)
-    )
-    """)
-
-   
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS driver_notifications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        driver_id INTEGER NOT NULL,
-        ride_id INTEGER NOT NULL,
-        message TEXT NOT NULL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (driver_id) REFERENCES driver(id),
-        FOREIGN KEY (ride_id) REFERENCES rides(id)
+        "SELECT role FROM identity WHERE email=? AND role<>?",
+        (email, current_role)
     )
-    """)
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS passenger_notifications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        passenger_id INTEGER NOT NULL,
-        ride_id INTEGER NOT NULL,
-        message TEXT NOT NULL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (passenger_id) REFERENCES passenger(id),
-        FOREIGN KEY (ride_id) REFERENCES rides(id)
-    )
-    """)
-
-    conn.commit()
-    conn.close()
-    print("Tables created successfully!")
+    row = cursor.fetchone()
+    return row[0] if row else None
 
 
-def is_email_registered_elsewhere(email, current_role):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    tables = {
-        "admin": "admin",
-        "driver": "driver",
-        "passenger": "passenger"
-    }
+def _hash_password(password):
+    return bcrypt.hashpw(password.strip().encode('utf-8'),
+                         bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
 
-    for role, table in tables.items():
-        if role == current_role:
-            continue
 
-        if role == "admin":
-            cursor.execute("SELECT * FROM admin WHERE username=?", (email,))
-        else:
-            cursor.execute(f"SELECT * FROM {table} WHERE email=?", (email,))
+def _add_identity(conn, email, role, user_id):
+    # identity.email is the primary key: a cross-role clash raises
+    # IntegrityError and rolls the whole registration back.
+    conn.execute(
+        "INSERT INTO identity (email, role, user_id) VALUES (?, ?, ?)",
+        (email, role, user_id)
+    )
 
-        if cursor.fetchone():
-            conn.close()
-            return role
 
-    conn.close()
-    return None
+def _registration_conflict(email, current_role):
+    conflict = is_email_registered_elsewhere(email, current_role)
+    return f"email-exists-in-{conflict}" if conflict else False
 
 
 #  REGISTER FUNCTIONS 
 
 def register_admin(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
 
     cursor.execute("SELECT COUNT(*) FROM admin")
     count = cursor.fetchone()[0]
 
     if count > 0:
-        conn.close()
         return "exists"
 
     try:
-        hashed_password = bcrypt.hashpw(password.strip().encode('utf-8'), bcrypt.gensalt())
-        cursor.execute(
-            "INSERT INTO admin (id, username, password) VALUES (1, ?, ?)",
-            (username.strip(), hashed_password.decode('utf-8'))
-        )
-        conn.commit()
+        hashed_password = _hash_password(password)
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO admin (id, username, password) VALUES (1, ?, ?)",
+                (username.strip(), hashed_password)
+            )
+            _add_identity(conn, username.strip(), "admin", 1)
         return True
     
     except Exception as e:
-        print("Admin Registration Error:",e)
+        log.error("Admin Registration Error: %s", e)
         return False
-    
-    finally:
-        conn.close()
 
 
 def login_admin(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
 
     cursor.execute(
         "SELECT * FROM admin WHERE username=? AND password=?",
         (username.strip(), password.strip())
     )
 
-    result = cursor.fetchone()
-    conn.close()
-    return result
+    return cursor.fetchone()
 
 
 def register_driver(name, email, password, license_number):
@@ -195,23 +98,18 @@ def register_driver(name, email, password, license_number):
     if conflict:
         return f"email-exists-in-{conflict}"
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    debug_message = f"DEBUG: register_passenger - Registering email: {email}, password: {password.strip()}"
-    with open("debug_log.txt", "a") as f:
-        f.write(debug_message + "\n")
+    log.debug("register_driver - registering email: %s", email)
     try:
-        hashed_password = bcrypt.hashpw(password.strip().encode('utf-8'), bcrypt.gensalt())
-        cursor.execute("""
-            INSERT INTO driver (name, email, password, license_number)
-            VALUES (?, ?, ?, ?)
-        """, (name, email, hashed_password.decode('utf-8'), license_number))
-        conn.commit()
+        hashed_password = _hash_password(password)
+        with transaction() as conn:
+            cursor = conn.execute("""
+                INSERT INTO driver (name, email, password, license_number)
+                VALUES (?, ?, ?, ?)
+            """, (name, email, hashed_password, license_number))
+            _add_identity(conn, email, "driver", cursor.lastrowid)
         return True
     except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+        return _registration_conflict(email, "driver")
 
 
 def register_passenger(name, email, password):
@@ -219,336 +117,480 @@ def register_passenger(name, email, password):
     if conflict:
         return f"email-exists-in-{conflict}"
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
     try:
-        hashed_password = bcrypt.hashpw(password.strip().encode('utf-8'), bcrypt.gensalt())
-        cursor.execute("""
-            INSERT INTO passenger (name, email, password)
-            VALUES (?, ?, ?)
-        """, (name, email.strip(), hashed_password.decode('utf-8')))
-        conn.commit()
+        hashed_password = _hash_password(password)
+        with transaction() as conn:
+            cursor = conn.execute("""
+                INSERT INTO passenger (name, email, password)
+                VALUES (?, ?, ?)
+            """, (name, email.strip(), hashed_password))
+            _add_identity(conn, email.strip(), "passenger", cursor.lastrowid)
         return True
     except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+        return _registration_conflict(email.strip(), "passenger")
 
 
 
 def login_user(username_or_email, password):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    login = username_or_email.strip()
 
-    debug_message_admin = f"DEBUG: login_user - Checking Admin with email: {username_or_email.strip()}"
-    with open("debug_log.txt", "a") as f:
-        f.write(debug_message_admin + "\n")
-    cursor.execute(
-        "SELECT id, username, password FROM admin WHERE username=?",
-        (username_or_email.strip(),)
-    )
-    admin = cursor.fetchone()
-    if admin and bcrypt.checkpw(password.strip().encode('utf-8'), admin[2].encode('utf-8')):
-        conn.close()
-        return ("Admin", admin)
-
-    debug_message_driver = f"DEBUG: login_user - Checking Driver with email: {username_or_email.strip()}"
-    with open("debug_log.txt", "a") as f:
-        f.write(debug_message_driver + "\n")
-    cursor.execute(
-        "SELECT id, name, email, phone, password FROM driver WHERE email=?",
-        (username_or_email.strip(),)
-    )
-    driver = cursor.fetchone()
-    if driver and bcrypt.checkpw(password.strip().encode('utf-8'), driver[4].encode('utf-8')):
-        return ("Driver", driver)
+    log.debug("login_user - looking up account with email: %s", login)
 
-    debug_message_passenger = f"DEBUG: login_user - Checking Passenger with email: {username_or_email.strip()}"
-    with open("debug_log.txt", "a") as f:
-        f.write(debug_message_passenger + "\n")
-    cursor.execute(
-        "SELECT id, name, email, password FROM passenger WHERE email=?",
-        (username_or_email.strip(),)
-    )
-    passenger = cursor.fetchone()
-    if passenger and bcrypt.checkpw(password.strip().encode('utf-8'), passenger[3].encode('utf-8')):
-        conn.close()
-        return ("Passenger", passenger)
+    # identity resolves the role with one indexed lookup; the joins fetch
+    # the matching account row by primary key.
+    cursor = get_connection().cursor()
+    cursor.execute("""
+        SELECT CASE i.role WHEN 'admin' THEN 'Admin'
+                           WHEN 'driver' THEN 'Driver'
+                           ELSE 'Passenger' END,
+               i.user_id,
+               COALESCE(a.username, d.name, p.name),
+               COALESCE(d.email, p.email),
+               d.phone,
+               COALESCE(a.password, d.password, p.password)
+        FROM identity i
+        LEFT JOIN admin a ON i.role='admin' AND a.id=i.user_id
+        LEFT JOIN driver d ON i.role='driver' AND d.id=i.user_id
+        LEFT JOIN passenger p ON i.role='passenger' AND p.id=i.user_id
+        WHERE i.email=?
+    """, (login,))
+
+    for role, user_id, name, email, phone, hashed in cursor.fetchall():
+        if not hashed or not bcrypt.checkpw(password.strip().encode('utf-8'), hashed.encode('utf-8')):
+            continue
+        if role == "Admin":
+            return (role, (user_id, name, hashed))
+        if role == "Driver":
+            return (role, (user_id, name, email, phone, hashed))
+        return (role, (user_id, name, email, hashed))
 
-    conn.close()
     return None
 
 
 
-def create_ride(passenger_id, pickup, destination, fare, status,
-                scheduled_date=None, scheduled_time=None):
+def _ride_place(text, coords):
+    """(lat, lon, display address) for one ride endpoint."""
+    parsed = parse_latlon(text)
+    if coords is None:
+        coords = parsed
+    lat, lon = (float(coords[0]), float(coords[1])) if coords else (None, None)
+    # A "lat, lon" label has no address yet; dashboards resolve and cache it.
+    address = short_address(text) if text and not parsed else None
+    return lat, lon, address
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+
+def _offer_ride(conn, ride_id, lat, lon):
+    try:
+        dispatch.get_dispatcher().offer(conn, ride_id, lat, lon)
+    except sqlite3.Error as e:
+        # Without offers the ride is shown to every idle driver.
+        log.error("Dispatch failed for ride %s: %s", ride_id, e)
+
+
+def create_ride(passenger_id, pickup, destination, fare, status,
+                scheduled_date=None, scheduled_time=None,
+                pickup_coords=None, drop_coords=None, vehicle="normal"):
 
     # Combine into one datetime 
     scheduled_datetime = None
     if scheduled_date and scheduled_time:
         scheduled_datetime = f"{scheduled_date} {scheduled_time}"
+    scheduled_at = parse_schedule(scheduled_date, scheduled_time)
+
+    # A booking further out than the lead time waits as 'Scheduled' until
+    # the scheduler releases it to dispatch (see scheduler.py).
+    if (status == "Requested" and scheduled_at is not None
+            and scheduled_at - SCHEDULE_LEAD > time.time()):
+        status = "Scheduled"
+
+    pickup_lat, pickup_lon, pickup_address = _ride_place(pickup, pickup_coords)
+    drop_lat, drop_lon, drop_address = _ride_place(destination, drop_coords)
+
+    with transaction() as conn:
+        cursor = conn.execute("""
+            INSERT INTO rides (
+                passenger_id, pickup, destination, fare, status,
+                scheduled_date, scheduled_time, scheduled_datetime, scheduled_at,
+                pickup_lat, pickup_lon, drop_lat, drop_lon,
+                pickup_address, drop_address, vehicle, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (passenger_id, pickup, destination, fare, status,
+              scheduled_date, scheduled_time, scheduled_datetime, scheduled_at,
+              pickup_lat, pickup_lon, drop_lat, drop_lon,
+              pickup_address, drop_address, vehicle, time.time()))
+        ride_id = cursor.lastrowid
+
+        if status == "Requested" and pickup_lat is not None:
+            _offer_ride(conn, ride_id, pickup_lat, pickup_lon)
 
-    cursor.execute("""
-        INSERT INTO rides (
-            passenger_id, pickup, destination, fare, status,
-            scheduled_date, scheduled_time, scheduled_datetime
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (passenger_id, pickup, destination, fare, status,
-          scheduled_date, scheduled_time, scheduled_datetime))
-
-    conn.commit()
-    ride_id = cursor.lastrowid
-    conn.close()
     return ride_id
 
 
+def release_scheduled_ride(ride_id):
+    """Open a Scheduled ride to drivers. False if it is no longer Scheduled."""
+    with transaction(immediate=True) as conn:
+        cursor = conn.execute(
+            "UPDATE rides SET status='Requested' WHERE id=? AND status='Scheduled'",
+            (ride_id,))
+        if cursor.rowcount != 1:
+            return False
+        lat, lon = conn.execute(
+            "SELECT pickup_lat, pickup_lon FROM rides WHERE id=?", (ride_id,)).fetchone()
+        if lat is not None:
+            _offer_ride(conn, ride_id, lat, lon)
+    return True
+
+
+def cache_ride_addresses(ride_id, pickup_address, drop_address):
+    """Store resolved display addresses; existing ones are kept."""
+    with transaction() as conn:
+        conn.execute("""
+            UPDATE rides SET
+                pickup_address = COALESCE(pickup_address, ?),
+                drop_address = COALESCE(drop_address, ?)
+            WHERE id = ?
+        """, (pickup_address, drop_address, ride_id))
+
+
 
 def get_active_ride(user_id, ride_id=None):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    print(f"DEBUG: get_active_ride called with user_id={user_id}, ride_id={ride_id}")
+    cursor = get_connection().cursor()
+    log.debug("get_active_ride user_id=%s ride_id=%s", user_id, ride_id)
 
     if ride_id:
         cursor.execute("""
             SELECT id, pickup, destination, status, fare, driver_id, rating,
                    scheduled_date, scheduled_time
             FROM rides
-            WHERE id=? AND passenger_id=? AND status IN ('Requested','Accepted','Completed')
+            WHERE id=? AND passenger_id=? AND status IN ('Scheduled','Requested','Accepted','Completed')
         """, (ride_id, user_id))
     else:
         cursor.execute("""
             SELECT id, pickup, destination, status, fare, driver_id, rating,
                    scheduled_date, scheduled_time
             FROM rides
-            WHERE passenger_id=? AND status IN ('Requested','Accepted','Completed')
+            WHERE passenger_id=? AND status IN ('Scheduled','Requested','Accepted','Completed')
             ORDER BY id DESC
             LIMIT 1
         """, (user_id,))
-    ride = cursor.fetchone()
-    conn.close()
-    return ride
+    return cursor.fetchone()
 
 
 
 
 def cancel_ride(ride_id, new_status="Cancelled"):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    # Read-then-write: take the write lock first, so a cancel racing an
+    # accept waits for it instead of failing with SQLITE_BUSY.
+    with transaction(immediate=True) as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("SELECT driver_id FROM rides WHERE id=?", (ride_id,))
-    d = cursor.fetchone()
-
-    cursor.execute("UPDATE rides SET status=? WHERE id=?", (new_status, ride_id))
+        cursor.execute("SELECT driver_id FROM rides WHERE id=?", (ride_id,))
+        d = cursor.fetchone()
 
-    if d and d[0]:
-        cursor.execute("""
-            UPDATE driver
-            SET is_busy=0, current_ride_id=NULL
-            WHERE id=?
-        """, (d[0],))
+        cursor.execute("UPDATE rides SET status=? WHERE id=?", (new_status, ride_id))
+        cursor.execute("DELETE FROM ride_offers WHERE ride_id=?", (ride_id,))
 
-    conn.commit()
-    conn.close()
+        if d and d[0]:
+            cursor.execute("""
+                UPDATE driver
+                SET is_busy=0, current_ride_id=NULL
+                WHERE id=?
+            """, (d[0],))
 
 
 
 def submit_driver_rating(ride_id, rating_value):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("""
-            UPDATE rides
-            SET rating=?
-            WHERE id=?
-        """, (rating_value, ride_id))
+        with transaction() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                UPDATE rides
+                SET rating=?
+                WHERE id=?
+            """, (rating_value, ride_id))
+
+            cursor.execute("SELECT driver_id FROM rides WHERE id=?", (ride_id,))
+            row = cursor.fetchone()
+            driver_id = row[0] if row else None
+
+            if driver_id:
+                cursor.execute("SELECT id FROM driver_ratings WHERE ride_id=?", (ride_id,))
+                existing = cursor.fetchone()
+                if existing:
+                    cursor.execute(
+                        "UPDATE driver_ratings SET rating=? WHERE id=?",
+                        (rating_value, existing[0])
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        INSERT INTO driver_ratings (ride_id, driver_id, rating, comment)
+                        VALUES (?, ?, ?, ?)
+                        """,
+                        (ride_id, driver_id, rating_value, "")
+                    )
 
-        cursor.execute("SELECT driver_id FROM rides WHERE id=?", (ride_id,))
-        row = cursor.fetchone()
-        driver_id = row[0] if row else None
-
-        if driver_id:
-            cursor.execute("SELECT id FROM driver_ratings WHERE ride_id=?", (ride_id,))
-            existing = cursor.fetchone()
-            if existing:
-                cursor.execute(
-                    "UPDATE driver_ratings SET rating=? WHERE id=?",
-                    (rating_value, existing[0])
-                )
-            else:
-                cursor.execute(
-                    """
-                    INSERT INTO driver_ratings (ride_id, driver_id, rating, comment)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (ride_id, driver_id, rating_value, "")
-                )
-
-        conn.commit()
         return True
     except Exception as e:
-        print("Rating Error:", e)
+        log.error("Rating Error: %s", e)
         return False
-    finally:
-        conn.close()
 
 
-def driver_accept_ride(driver_id, ride_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def claim_ride(ride_id, driver_id, assigned_by_admin=False):
+    """Compare-and-set a Requested ride onto an idle driver_id.
 
-    cursor.execute("""
-        SELECT id FROM rides 
-        WHERE driver_id=? AND status='Accepted'
-    """, (driver_id,))
-    active = cursor.fetchone()
+    Returns True only for the caller that actually moved the ride out of
+    'Requested'; everyone racing for the same ride gets False, and so
+    does an assignment (admin or batch) onto a driver who is busy by now.
+    """
+    with transaction(immediate=True) as conn:
+        cursor = conn.execute("""
+            UPDATE rides
+            SET status='Accepted', driver_id=?,
+                assigned_by_admin=?, assigned_at=CURRENT_TIMESTAMP
+            WHERE id=? AND status='Requested'
+              AND NOT EXISTS (SELECT 1 FROM driver WHERE id=? AND is_busy=1)
+        """, (driver_id, 1 if assigned_by_admin else 0, ride_id, driver_id))
 
-    if active:
-        conn.close()
-        return "busy"
+        if cursor.rowcount != 1:
+            return False
 
-    cursor.execute("""
-        UPDATE rides 
-        SET status='Accepted', driver_id=?
-        WHERE id=?
-    """, (driver_id, ride_id))
+        conn.execute("""
+            UPDATE driver
+            SET is_busy=1, current_ride_id=?
+            WHERE id=?
+        """, (ride_id, driver_id))
+        conn.execute("DELETE FROM ride_offers WHERE ride_id=?", (ride_id,))
 
-    cursor.execute("""
-        UPDATE driver
-        SET is_busy=1, current_ride_id=?
-        WHERE id=?
-    """, (ride_id, driver_id))
+    return True
+
+
+def driver_accept_ride(driver_id, ride_id):
+    with transaction(immediate=True) as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id FROM rides 
+            WHERE driver_id=? AND status='Accepted'
+        """, (driver_id,))
+        active = cursor.fetchone()
+
+        if active:
+            return "busy"
+
+        if not claim_ride(ride_id, driver_id):
+            return "taken"
 
-    conn.commit()
-    conn.close()
     return "accepted"
 
 
 def get_all_rides():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
 
     cursor.execute("SELECT * FROM rides ORDER BY id DESC")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return cursor.fetchall()
 
 
-def get_pending_rides_for_driver(driver_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def get_rides_page(before_id=None, limit=100):
+    """get_all_rides() limit rows at a time: pass the last id seen as before_id."""
+    cursor = get_connection().cursor()
+
+    if before_id is None:
+        cursor.execute("SELECT * FROM rides ORDER BY id DESC LIMIT ?", (limit,))
+    else:
+        cursor.execute("SELECT * FROM rides WHERE id < ? ORDER BY id DESC LIMIT ?",
+                       (before_id, limit))
+    return cursor.fetchall()
+
+
+def get_pending_rides_for_driver(driver_id, ride_ids=None):
+    """Rides to show a driver; with ride_ids, only those that still qualify."""
+    cursor = get_connection().cursor()
 
     cursor.execute("SELECT is_busy FROM driver WHERE id=?", (driver_id,))
     is_busy = cursor.fetchone()[0]
 
+    only = ""
+    params = ()
+    if ride_ids is not None:
+        ride_ids = list(ride_ids)
+        only = f"AND id IN ({','.join('?' * len(ride_ids))})" if ride_ids else "AND 0"
+        params = tuple(ride_ids)
+
     if is_busy == 1:
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT id, passenger_id, pickup, destination, fare, status,
-                   driver_id, scheduled_date, scheduled_time
+                   driver_id, scheduled_date, scheduled_time, {RIDE_PLACE_COLUMNS}
             FROM rides
-            WHERE driver_id=? AND status IN ('Assigned', 'Accepted')
-        """, (driver_id,))
+            WHERE driver_id=? AND status IN ('Assigned', 'Accepted') {only}
+        """, (driver_id,) + params)
     else:
-        cursor.execute("""
+        # Rides offered to nearby drivers only go to them for
+        # dispatch.OFFER_TTL; rides nobody was offered, or whose offers
+        # have expired, are open to every idle driver. Scheduled rides
+        # show up once the scheduler releases them.
+        cursor.execute(f"""
             SELECT id, passenger_id, pickup, destination, fare, status,
-                   driver_id, scheduled_date, scheduled_time
-            FROM rides
-            WHERE status IN ('Requested', 'Scheduled')
-        """)
+                   driver_id, scheduled_date, scheduled_time, {RIDE_PLACE_COLUMNS}
+            FROM rides r
+            WHERE status='Requested' {only}
+              AND (NOT EXISTS (SELECT 1 FROM ride_offers o
+                               WHERE o.ride_id = r.id AND o.offered_at > datetime('now', ?))
+                   OR EXISTS (SELECT 1 FROM ride_offers o
+                              WHERE o.ride_id = r.id AND o.driver_id = ?))
+        """, params + (f"-{dispatch.OFFER_TTL} seconds", driver_id))
 
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return cursor.fetchall()
 
 
 
-def driver_reject_ride(ride_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def get_offer_expiries(driver_id):
+    """(ride_id, seconds left) for Requested rides hidden from driver_id.
 
+    A ride is hidden while another driver holds a live offer for it (see
+    get_pending_rides_for_driver); it opens up once its last offer is
+    dispatch.OFFER_TTL old. Offers expire without a change-log entry, so
+    the driver dashboard re-checks these rides when that time comes.
+    """
+    cursor = get_connection().cursor()
     cursor.execute("""
-        UPDATE rides
-        SET status='Rejected'
-        WHERE id=?
-    """, (ride_id,))
-    conn.commit()
-    conn.close()
+        SELECT o.ride_id,
+               MAX(CAST(strftime('%s', o.offered_at) AS INTEGER)) + ?
+                   - CAST(strftime('%s', 'now') AS INTEGER)
+        FROM ride_offers o
+        JOIN rides r ON r.id = o.ride_id
+        WHERE o.offered_at > datetime('now', ?) AND r.status = 'Requested'
+          AND NOT EXISTS (SELECT 1 FROM ride_offers m
+                          WHERE m.ride_id = o.ride_id AND m.driver_id = ?)
+        GROUP BY o.ride_id
+    """, (dispatch.OFFER_TTL, f"-{dispatch.OFFER_TTL} seconds", driver_id))
+    return cursor.fetchall()
+
+
+def driver_reject_ride(ride_id):
+    with transaction() as conn:
+        conn.execute("""
+            UPDATE rides
+            SET status='Rejected'
+            WHERE id=?
+        """, (ride_id,))
+        conn.execute("DELETE FROM ride_offers WHERE ride_id=?", (ride_id,))
 
 
 def complete_ride(ride_id, driver_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with transaction(immediate=True) as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        UPDATE rides
-        SET status='Completed'
-        WHERE id=?
-    """, (ride_id,))
+        cursor.execute("""
+            UPDATE rides
+            SET status='Completed'
+            WHERE id=?
+        """, (ride_id,))
 
-    cursor.execute("""
-        UPDATE driver
-        SET is_busy=0,
-            current_ride_id=NULL
-        WHERE id=?
-    """, (driver_id,))
+        cursor.execute("""
+            UPDATE driver
+            SET is_busy=0,
+                current_ride_id=NULL
+            WHERE id=?
+        """, (driver_id,))
+
+        # The driver is now where the ride ended.
+        row = cursor.execute(
+            "SELECT drop_lat, drop_lon FROM rides WHERE id=?", (ride_id,)).fetchone()
+        if row and row[0] is not None:
+            _set_driver_location(conn, driver_id, row[0], row[1])
 
-    conn.commit()
-    conn.close()
-    
-def admin_assign_driver(ride_id, driver_id):
-   conn = sqlite3.connect(DB_NAME)
-   cursor = conn.cursor()
 
-   cursor.execute("""
-        UPDATE rides
-        SET driver_id=?, status='Accepted',
-            assigned_by_admin=1
-        WHERE id=?
-    """, (driver_id, ride_id))
- 
-   cursor.execute("""
-        UPDATE driver
-        SET is_busy=1, current_ride_id=?
-        WHERE id=?
-    """, (ride_id, driver_id))
+def _set_driver_location(conn, driver_id, lat, lon):
+    # seq is taken under the write lock, so it increases in commit order.
+    conn.execute("""
+        INSERT INTO driver_location (driver_id, lat, lon, updated_at, seq)
+        VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM driver_location))
+        ON CONFLICT(driver_id) DO UPDATE SET
+            lat=excluded.lat, lon=excluded.lon,
+            updated_at=excluded.updated_at, seq=excluded.seq
+    """, (driver_id, float(lat), float(lon), time.time()))
 
-   conn.commit()
-   conn.close()
-   return True
+
+def update_driver_location(driver_id, lat, lon):
+    with transaction(immediate=True) as conn:
+        _set_driver_location(conn, driver_id, lat, lon)
+
+
+def get_ride_offers(ride_id):
+    cursor = get_connection().cursor()
+    cursor.execute(
+        "SELECT driver_id, distance_km FROM ride_offers WHERE ride_id=? ORDER BY distance_km",
+        (ride_id,))
+    return cursor.fetchall()
+
+
+def admin_assign_driver(ride_id, driver_id):
+    return claim_ride(ride_id, driver_id, assigned_by_admin=True)
 
 
 
 
 def get_passenger_id_from_ride_id(ride_id):
     """Additive function to get passenger_id from ride_id"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
     cursor.execute("SELECT passenger_id FROM rides WHERE id=?", (ride_id,))
     result = cursor.fetchone()
-    conn.close()
     return result[0] if result else None
 
 def insert_admin_assignment_notifications(ride_id, driver_id, passenger_id):
     """Additive function to insert admin assignment notifications (no existing code changes)"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+        INSERT INTO driver_notifications (driver_id, ride_id, message)
+        VALUES (?, ?, ?)
+        """, (driver_id, ride_id, f"You have been assigned to ride #{ride_id} by admin"))
+
+        cursor.execute("""
+        INSERT INTO passenger_notifications (passenger_id, ride_id, message)
+        VALUES (?, ?, ?)
+        """, (passenger_id, ride_id, f"Your ride #{ride_id} has been assigned a driver by admin"))
 
-    cursor.execute("""
-    INSERT INTO driver_notifications (driver_id, ride_id, message)
-    VALUES (?, ?, ?)
-    """, (driver_id, ride_id, f"You have been assigned to ride #{ride_id} by admin"))
 
+def get_available_drivers():
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT id, name FROM driver WHERE is_busy=0")
+    return cursor.fetchall()
+
+
+def get_driver_ratings(driver_id):
+    cursor = get_connection().cursor()
     cursor.execute("""
-    INSERT INTO passenger_notifications (passenger_id, ride_id, message)
-    VALUES (?, ?, ?)
-    """, (passenger_id, ride_id, f"Your ride #{ride_id} has been assigned a driver by admin"))
+        SELECT r.rating, r.comment, rd.pickup, rd.destination, rd.id,
+               rd.pickup_address, rd.drop_address,
+               rd.pickup_lat, rd.pickup_lon, rd.drop_lat, rd.drop_lon
+        FROM driver_ratings r
+        JOIN rides rd ON r.ride_id = rd.id
+        WHERE rd.driver_id = ?
+    """, (driver_id,))
+    return cursor.fetchall()
+
+
+def get_driver_active_ride(driver_id):
+    cursor = get_connection().cursor()
+
+    cursor.execute("SELECT current_ride_id FROM driver WHERE id=?", (driver_id,))
+    row = cursor.fetchone()
+
+    if not row or not row[0]:
+        return None
 
-    conn.commit()
-    conn.close()
+    cursor.execute(f"""
+        SELECT id, pickup, destination, status, fare, scheduled_date, scheduled_time, assigned_by_admin,
+               {RIDE_PLACE_COLUMNS}
+        FROM rides
+        WHERE id=? AND status='Accepted'
+    """, (row[0],))
+    return cursor.fetchone()
 
 if __name__ == "__main__":
     create_tables()
@@ -0,0 +1,114 @@
+# db_connection.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME = "taxi_booking.db"
+
+# Applied once per connection, not once per query.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Number of prepared statements sqlite3 keeps per connection.
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_lock = threading.Lock()
+_connections = []
+_db_path = DB_NAME
+_generation = 0
+
+
+def _open_connection(path):
+    # isolation_level=None: reads never hold a transaction open, writes
+    # go through transaction() below.
+    conn = sqlite3.connect(
+        path,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Return the long-lived connection owned by the calling thread."""
+    conn = getattr(_local, "conn", None)
+    if (conn is not None
+            and _local.generation == _generation
+            and _local.pid == os.getpid()):
+        return conn
+
+    conn = _open_connection(_db_path)
+    with _lock:
+        _connections.append(conn)
+    _local.conn = conn
+    _local.generation = _generation
+    _local.pid = os.getpid()
+    return conn
+
+
+def open_connection():
+    """A new connection outside the per-thread ones, e.g. for a watcher.
+
+    It is still closed by close_all().
+    """
+    conn = _open_connection(_db_path)
+    with _lock:
+        _connections.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction(immediate=False):
+    """Run a block inside one transaction on the thread's connection.
+
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE).
+    Nested calls join the outer transaction.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def close_all():
+    """Close every connection handed out so far (e.g. on shutdown)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        _connections.clear()
+
+
+def set_database(path):
+    """Point the manager at another database file (benchmarks, tools)."""
+    global _db_path
+    close_all()
+    _db_path = path
+
+
+def get_database():
+    return _db_path
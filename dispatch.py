@@ -0,0 +1,161 @@
+# dispatch.py
+"""Offer new rides to the nearest idle drivers.
+
+Drivers report positions into driver_location (from the driver dashboard,
+and on completing a ride). Each process keeps a DriverIndex: the known
+positions bucketed in a lat/lon grid, topped up incrementally from
+driver_location (by its write sequence number) before every dispatch. create_ride asks the dispatcher
+for the k nearest idle drivers to the pickup and records them in
+ride_offers; get_pending_rides_for_driver then shows an offered ride to
+those drivers only, for OFFER_TTL. Offers are deleted once they expire
+(at the next dispatch) or the ride is taken, rejected or cancelled.
+Rides that could not be offered (no
+coordinates, no driver nearby) and rides whose offers have expired,
+because the offered drivers ignored them or took other jobs, are
+visible to every idle driver, as before.
+"""
+import heapq
+import math
+import threading
+import time
+
+from db_connection import get_connection
+from app_logging import get_logger
+
+log = get_logger("dispatch")
+
+CELL_DEG = 0.01              # ~1.1 km grid cells
+OFFER_COUNT = 5              # drivers offered each ride
+MAX_OFFER_KM = 5.0
+LOCATION_TTL = 15 * 60       # positions older than this are ignored
+OFFER_TTL = 60               # seconds a ride is shown only to the drivers offered it
+OVERFETCH = 4                # candidates per offer slot, before the idle check
+KM_PER_DEG = 111.195
+
+
+class DriverIndex:
+    """Driver positions in grid buckets; nearest() scans outward in rings."""
+
+    def __init__(self, cell_deg=CELL_DEG):
+        self.cell = cell_deg
+        self._cells = {}     # (row, col) -> {driver_id: (lat, lon, updated_at)}
+        self._where = {}     # driver_id -> (row, col)
+
+    def __len__(self):
+        return len(self._where)
+
+    def _cell_of(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def update(self, driver_id, lat, lon, updated_at=None):
+        cell = self._cell_of(lat, lon)
+        old = self._where.get(driver_id)
+        if old is not None and old != cell:
+            bucket = self._cells[old]
+            del bucket[driver_id]
+            if not bucket:
+                del self._cells[old]
+        self._cells.setdefault(cell, {})[driver_id] = (
+            lat, lon, time.time() if updated_at is None else updated_at)
+        self._where[driver_id] = cell
+
+    def remove(self, driver_id):
+        cell = self._where.pop(driver_id, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            del bucket[driver_id]
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lon, k=OFFER_COUNT, max_km=MAX_OFFER_KM, fresh_after=0.0):
+        """Up to k (distance_km, driver_id) pairs, closest first."""
+        row, col = self._cell_of(lat, lon)
+        kx = math.cos(math.radians(lat))
+        # Once ring r is scanned, anything unscanned is r whole cells away.
+        cell_km = self.cell * KM_PER_DEG * min(kx, 1.0)
+        found = []
+        ring = 0
+        while True:
+            for r in range(row - ring, row + ring + 1):
+                edge = r in (row - ring, row + ring)
+                cols = range(col - ring, col + ring + 1) if edge else (col - ring, col + ring)
+                for c in cols:
+                    bucket = self._cells.get((r, c))
+                    if not bucket:
+                        continue
+                    for driver_id, (dlat, dlon, seen) in bucket.items():
+                        if seen < fresh_after:
+                            continue
+                        km = KM_PER_DEG * math.hypot(dlat - lat, (dlon - lon) * kx)
+                        if km <= max_km:
+                            found.append((km, driver_id))
+            reach = ring * cell_km
+            if reach > max_km or (len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= reach):
+                break
+            ring += 1
+        found.sort()
+        return found[:k]
+
+
+class Dispatcher:
+    def __init__(self, index=None, offer_count=OFFER_COUNT, max_km=MAX_OFFER_KM):
+        self.index = index or DriverIndex()
+        self.offer_count = offer_count
+        self.max_km = max_km
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def sync(self, conn=None):
+        """Pull driver moves since the last sync into the index."""
+        conn = conn or get_connection()
+        with self._lock:
+            rows = conn.execute(
+                "SELECT driver_id, lat, lon, updated_at, seq FROM driver_location "
+                "WHERE seq > ? ORDER BY seq", (self._seq,)
+            ).fetchall()
+            for driver_id, lat, lon, updated_at, seq in rows:
+                self.index.update(driver_id, lat, lon, updated_at)
+            if rows:
+                self._seq = rows[-1][4]
+        return len(rows)
+
+    def nearest_idle(self, lat, lon, conn=None):
+        """[(distance_km, driver_id)] of up to offer_count idle drivers."""
+        conn = conn or get_connection()
+        candidates = self.index.nearest(
+            lat, lon, self.offer_count * OVERFETCH, self.max_km,
+            fresh_after=time.time() - LOCATION_TTL)
+        if not candidates:
+            return []
+        ids = [driver_id for _, driver_id in candidates]
+        idle = {row[0] for row in conn.execute(
+            f"SELECT id FROM driver WHERE is_busy=0 AND id IN ({','.join('?' * len(ids))})",
+            ids)}
+        return [c for c in candidates if c[1] in idle][:self.offer_count]
+
+    def offer(self, conn, ride_id, lat, lon):
+        """Record offers for ride_id inside the caller's transaction."""
+        self.sync(conn)
+        chosen = self.nearest_idle(lat, lon, conn)
+        # Expired offers hide nothing any more; dropping them here keeps
+        # ride_offers down to the live ones that every driver refresh checks.
+        conn.execute("DELETE FROM ride_offers WHERE offered_at <= datetime('now', ?)",
+                     (f"-{OFFER_TTL} seconds",))
+        conn.executemany(
+            "INSERT OR IGNORE INTO ride_offers (ride_id, driver_id, distance_km) "
+            "VALUES (?, ?, ?)",
+            [(ride_id, driver_id, km) for km, driver_id in chosen])
+        log.debug("ride %s offered to %s", ride_id, [d for _, d in chosen])
+        return [driver_id for _, driver_id in chosen]
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher()
+        return _dispatcher
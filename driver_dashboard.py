@@ -3,68 +3,94 @@ from tkinter import messagebox
 import subprocess
 import sys
 from geopy.geocoders import Nominatim
+import geocode_cache
+import changes
+from tk_async import run_in_background
+from passenger_constants import parse_latlon, short_address
 
 from database import (
     get_pending_rides_for_driver,
+    get_offer_expiries,
     driver_accept_ride,
     driver_reject_ride,
-    complete_ride
+    complete_ride,
+    get_driver_active_ride,
+    get_driver_ratings,
+    cache_ride_addresses,
+    update_driver_location
 )
+from app_logging import get_logger
+
+log = get_logger("driver_dashboard")
 
 geolocator = Nominatim(user_agent="gharjau_app")
 
 # COORDS TO ADDRESS 
 def looks_like_coords(s: str) -> bool:
-    if not s or not isinstance(s, str):
-        return False
-    s_clean = s.strip().lstrip("(").rstrip(")")
-    parts = [p.strip() for p in s_clean.split(",")]
-    if len(parts) != 2:
-        return False
-    try:
-        float(parts[0])
-        float(parts[1])
-        return True
-    except ValueError:
-        return False
+    return parse_latlon(s) is not None
 
-def convert_coords_to_address(coord):
+def coords_to_label(lat, lon):
+    """Short "road, city" label for a point, or None if it can't be resolved."""
     try:
-        if coord is None:
-            return "Unknown"
-
-        coord_str = str(coord).strip()
-
-        if not looks_like_coords(coord_str):
-            parts = coord_str.split(",")
-            if len(parts) >= 2:
-                return f"{parts[0].strip()}, {parts[1].strip()}"
-            return coord_str
-
-        s = coord_str.strip("()")
-        lat, lon = [float(x) for x in s.split(",")]
-
-        location = geolocator.reverse((lat, lon), language="en", timeout=10)
-        if not location:
-            return coord_str
-
-        addr = location.raw.get("address", {})
-        road = addr.get("road", "")
-        suburb = addr.get("suburb", "")
-        city = addr.get("city", addr.get("town", addr.get("village", "")))
-
-        if road and city:
-            return f"{road}, {city}"
-        if suburb and city:
-            return f"{suburb}, {city}"
-        if city:
-            return city
-
-        return coord_str
-
+        location = geocode_cache.reverse(lat, lon, geolocator, language="en", timeout=10)
     except Exception as e:
-        print("Short address error:", e)
-        return str(coord)
+        log.error("Short address error: %s", e)
+        return None
+    if not location:
+        return None
+
+    addr = location.raw.get("address", {})
+    road = addr.get("road", "")
+    suburb = addr.get("suburb", "")
+    city = addr.get("city", addr.get("town", addr.get("village", "")))
+
+    if road and city:
+        return f"{road}, {city}"
+    if suburb and city:
+        return f"{suburb}, {city}"
+    if city:
+        return city
+    return None
+
+def convert_coords_to_address(coord):
+    """Label for a free-text endpoint (rides without typed columns)."""
+    if coord is None:
+        return "Unknown"
+
+    coord_str = str(coord).strip()
+    coords = parse_latlon(coord_str)
+    if not coords:
+        return short_address(coord_str)
+    return coords_to_label(*coords) or coord_str
+
+def _place_label(text, address, lat, lon):
+    """(label, resolved): resolved labels are worth caching on the ride."""
+    if address:
+        return address, False
+    if lat is not None and lon is not None:
+        label = coords_to_label(lat, lon)
+        if label:
+            return label, True
+        return f"{lat:.5f}, {lon:.5f}", False
+    return convert_coords_to_address(text), False
+
+def ride_labels(ride_id, pickup, destination, places):
+    """Display labels for a ride's endpoints from its typed place columns.
+
+    places is (pickup_address, drop_address, pickup_lat, pickup_lon,
+    drop_lat, drop_lon), see database.RIDE_PLACE_COLUMNS. Addresses that
+    had to be reverse-geocoded are written back, so each ride is resolved
+    once rather than on every render.
+    """
+    pu_addr, de_addr, pu_lat, pu_lon, de_lat, de_lon = places
+    pu, pu_new = _place_label(pickup, pu_addr, pu_lat, pu_lon)
+    de, de_new = _place_label(destination, de_addr, de_lat, de_lon)
+    if pu_new or de_new:
+        try:
+            cache_ride_addresses(ride_id, pu if pu_new else None, de if de_new else None)
+        except Exception as e:
+            log.error("Address cache error: %s", e)
+    return pu, de
 
 
 ctk.set_appearance_mode("light")
@@ -85,38 +111,41 @@ class DriverDashboard(ctk.CTk):
         self.driver_id = driver_id
 
         self.title("Driver Dashboard - Active Requests")
-        self.geometry("600x750")
+        self.geometry("600x800")
         self.resizable(False, False)
 
         self.active_ride_frame = None
+        self._cards = {}            # ride_id -> request card
+        self._empty_label = None
+        self._expiry_job = None     # after() id of the next offer expiry
 
         self._setup_ui()
         self._load_active_ride()
         self._load_requests()
+
+        # Rides entering or leaving 'Requested' may change the list;
+        # anything touching this driver may change the active ride.
+        changes.get_feed().subscribe(
+            self, self._on_changes,
+            match=lambda c: c.ride_id is not None and (
+                c.driver_id == self.driver_id or "Requested" in (c.status, c.old_status)))
+
+    def _on_changes(self, changed):
+        if any(c.driver_id == self.driver_id for c in changed):
+            self._reload_all()
+        else:
+            self._refresh_requests({c.ride_id for c in changed})
     
     def _view_ratings(self):
-        import sqlite3
-        conn = sqlite3.connect("taxi_booking.db")
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT r.rating, r.comment, rd.pickup, rd.destination
-            FROM driver_ratings r
-            JOIN rides rd ON r.ride_id = rd.id
-            WHERE rd.driver_id = ?
-        """, (self.driver_id,))
-
-        rows = cursor.fetchall()
-        conn.close()
+        rows = get_driver_ratings(self.driver_id)
 
         if not rows:
             messagebox.showinfo("Ratings", "You have no ratings yet!")
             return
 
         text = ""
-        for rating, comment, pu, de in rows:
-            pu = convert_coords_to_address(pu)
-            de = convert_coords_to_address(de)
+        for rating, comment, pu, de, ride_id, *places in rows:
+            pu, de = ride_labels(ride_id, pu, de, places)
 
             text += f"⭐ Rating: {rating}\n"
             text += f"💬 Comment: {comment}\n"
@@ -142,6 +171,16 @@ class DriverDashboard(ctk.CTk):
         ctk.CTkButton(self, text="Refresh Requests",
                       command=self._reload_all).pack(pady=(10, 5))
 
+        # Position used to offer this driver nearby rides
+        loc_row = ctk.CTkFrame(self, fg_color="transparent")
+        loc_row.pack(pady=5)
+        self.location_entry = ctk.CTkEntry(loc_row, width=230,
+                                           placeholder_text="My location (place or lat, lon)")
+        self.location_entry.pack(side="left", padx=(0, 8))
+        self.location_btn = ctk.CTkButton(loc_row, text="Update Location", width=130,
+                                          command=self._update_location)
+        self.location_btn.pack(side="left")
+
         # NEW BUTTON 
         ctk.CTkButton(self, text="View Ratings",
                       fg_color="#7C4DFF",
@@ -151,6 +190,37 @@ class DriverDashboard(ctk.CTk):
                       command=lambda: logout(self)).pack(pady=(5, 20))
         
 
+    def _update_location(self):
+        text = self.location_entry.get().strip()
+        if not text:
+            return
+        coords = parse_latlon(text)
+        if coords:
+            self._set_location(coords)
+            return
+
+        # A place name may need Nominatim (up to 10 s); keep the window responsive
+        self.location_btn.configure(state="disabled")
+        run_in_background(self, geocode_cache.geocode, text, geolocator,
+                          country_codes="np", language="en", timeout=10,
+                          on_done=self._place_found, on_error=self._place_lookup_failed)
+
+    def _place_lookup_failed(self, e):
+        log.error("Location lookup error: %s", e)
+        self._place_found(None)
+
+    def _place_found(self, place):
+        self.location_btn.configure(state="normal")
+        if not place:
+            messagebox.showwarning("Location", "Could not find that place.")
+            return
+        self._set_location((place.latitude, place.longitude))
+
+    def _set_location(self, coords):
+        update_driver_location(self.driver_id, *coords)
+        messagebox.showinfo("Location", "Location updated. You will be offered rides nearby.")
+        self._reload_all()
+
     #  RELOAD 
     def _reload_all(self):
         self._load_active_ride()
@@ -167,14 +237,13 @@ class DriverDashboard(ctk.CTk):
         if not ride:
             return
 
-        ride_id, pickup, destination, status, fare, sched_date, sched_time, assigned_by_admin = ride
+        ride_id, pickup, destination, status, fare, sched_date, sched_time, assigned_by_admin, *places = ride
 
         # Show admin assignment notification
         if assigned_by_admin == 1:
             messagebox.showinfo("Admin Assignment", "You have been assigned a ride by your admin")
 
-        pickup = convert_coords_to_address(pickup)
-        destination = convert_coords_to_address(destination)
+        pickup, destination = ride_labels(ride_id, pickup, destination, places)
 
         self.active_ride_frame = ctk.CTkFrame(self, fg_color="#333", corner_radius=12)
         self.active_ride_frame.pack(pady=10, padx=20, fill="x")
@@ -212,30 +281,7 @@ class DriverDashboard(ctk.CTk):
 
 
     def _get_driver_active_ride(self):
-        import sqlite3
-        conn = sqlite3.connect("taxi_booking.db")
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT current_ride_id FROM driver WHERE id=?", (self.driver_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        if not row or not row[0]:
-            return None
-
-        ride_id = row[0]
-
-        conn = sqlite3.connect("taxi_booking.db")
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, pickup, destination, status, fare, scheduled_date, scheduled_time, assigned_by_admin
-            FROM rides
-            WHERE id=? AND status='Accepted'
-        """, (ride_id,))
-        ride = cursor.fetchone()
-        conn.close()
-
-        return ride
+        return get_driver_active_ride(self.driver_id)
 
     def _handle_complete(self, ride_id):
         complete_ride(ride_id, self.driver_id)
@@ -246,27 +292,66 @@ class DriverDashboard(ctk.CTk):
     def _load_requests(self):
         for widget in self.scroll_frame.winfo_children():
             widget.destroy()
+        self._cards = {}
+        self._empty_label = None
+
+        for ride in get_pending_rides_for_driver(self.driver_id):
+            self._cards[ride[0]] = self._create_request_card(self.scroll_frame, ride)
+        self._show_request_count()
+        self._schedule_offer_expiry()
+
+    def _refresh_requests(self, ride_ids):
+        """Re-query only ride_ids and add, replace or drop their cards."""
+        rides = {ride[0]: ride for ride in
+                 get_pending_rides_for_driver(self.driver_id, ride_ids=ride_ids)}
+        for ride_id in ride_ids:
+            card = self._cards.pop(ride_id, None)
+            if card is not None:
+                card.destroy()
+            if ride_id in rides:
+                self._cards[ride_id] = self._create_request_card(self.scroll_frame, rides[ride_id])
+        self._show_request_count()
+        self._schedule_offer_expiry()
+
+    def _schedule_offer_expiry(self):
+        # Offers to other drivers expire without a change-log entry, so
+        # wake once, when the first ride they hide opens up, and re-query
+        # just the rides due by then.
+        if self._expiry_job is not None:
+            self.after_cancel(self._expiry_job)
+            self._expiry_job = None
+        expiries = get_offer_expiries(self.driver_id)
+        if not expiries:
+            return
+        first = max(0, min(left for _, left in expiries))
+        due = {ride_id for ride_id, left in expiries if left <= first}
+        # offered_at has whole seconds: one more covers the rounding.
+        self._expiry_job = self.after((first + 1) * 1000, self._offers_expired, due)
 
-        rides = get_pending_rides_for_driver(self.driver_id)
+    def _offers_expired(self, ride_ids):
+        self._expiry_job = None
+        self._refresh_requests(ride_ids)
 
-        if not rides:
+    def _show_request_count(self):
+        if not self._cards:
             self.status_label.configure(text="✔ No Pending Requests", text_color="green")
-            ctk.CTkLabel(self.scroll_frame, text="No new requests right now.").pack(pady=20)
+            if self._empty_label is None:
+                self._empty_label = ctk.CTkLabel(self.scroll_frame, text="No new requests right now.")
+                self._empty_label.pack(pady=20)
             return
 
+        if self._empty_label is not None:
+            self._empty_label.destroy()
+            self._empty_label = None
         self.status_label.configure(
-            text=f"🔴 {len(rides)} Request(s) Pending",
+            text=f"🔴 {len(self._cards)} Request(s) Pending",
             text_color="red"
         )
 
-        for ride in rides:
-            self._create_request_card(self.scroll_frame, ride)
-
     # REQUEST CARD 
     def _create_request_card(self, parent, ride):
         ride_id = ride[0]
-        pickup = convert_coords_to_address(ride[2])
-        destination = convert_coords_to_address(ride[3])
+        pickup, destination = ride_labels(ride_id, ride[2], ride[3], ride[9:15])
 
         fare = ride[4]
         status = ride[5]
@@ -316,6 +401,8 @@ class DriverDashboard(ctk.CTk):
                           command=lambda: self._handle_complete(ride_id)).pack(
                 side="left", expand=True, fill="x", padx=5)
 
+        return card
+
     # BUTTON HANDLERS 
     def _handle_accept(self, ride_id):
         result = driver_accept_ride(self.driver_id, ride_id)
@@ -324,6 +411,11 @@ class DriverDashboard(ctk.CTk):
             messagebox.showerror("Busy", "You already have an active ride!")
             return
 
+        if result == "taken":
+            messagebox.showwarning("Unavailable", "This ride was already taken by another driver.")
+            self._reload_all()
+            return
+
         messagebox.showinfo("Success", "Ride accepted!")
         self._reload_all()
 
@@ -0,0 +1,232 @@
+# fares.py
+"""Fare quotes on road distance and travel time.
+
+    quote = fares.quote(from_loc, to_loc, "comfort")
+    quote.fare, quote.distance_km, quote.duration_min, quote.source
+
+Distance and time come from the first source that has an answer:
+
+1. "route":    the routing client already holds this exact trip (the
+               passenger map fetches it when the markers move);
+2. "zone":     the precomputed zone matrix (ZONE_FILE), a grid of ~1 km
+               zones over the Kathmandu valley with the road distance and
+               time between zone centres; the trip's straight-line
+               distance is scaled by the pair's detour factor and speed;
+3. "route":    a routing lookup, when fetch_route=True;
+4. "estimate": straight line x DEFAULT_DETOUR at DEFAULT_SPEED_KMH.
+
+The matrix file is memory-mapped, so a zone lookup is two index reads
+and nothing is loaded up front. Build it from the offline road graph
+(see road_graph.py) with
+
+    python fares.py build-matrix
+"""
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import routing
+from passenger_constants import PRICE_NORMAL, PRICE_COMFORT, haversine_km
+from app_logging import get_logger
+
+log = get_logger("fares")
+
+FareClass = namedtuple("FareClass", "base per_km per_min minimum")
+Quote = namedtuple("Quote", "fare distance_km duration_min source")
+
+FARE_CLASSES = {
+    "normal": FareClass(base=50.0, per_km=PRICE_NORMAL, per_min=2.0, minimum=100.0),
+    "comfort": FareClass(base=80.0, per_km=PRICE_COMFORT, per_min=3.0, minimum=150.0),
+}
+
+DEFAULT_DETOUR = 1.3          # road km per straight-line km
+DEFAULT_SPEED_KMH = 20.0
+
+ZONE_FILE = "fare_zones.bin"
+ZONE_BBOX = (27.60, 27.80, 85.20, 85.45)   # min_lat, max_lat, min_lon, max_lon
+ZONE_DEG = 0.01
+ZONE_MAGIC = b"TXFZ\x00\x00\x00\x01"
+ZONE_HEADER = struct.Struct("<8s4dd2I")    # 8 + 40 + 8 bytes, float-aligned
+MIN_CENTRE_KM = 0.5           # closer zone centres say nothing about detours
+
+
+def price(distance_km, duration_min, vehicle="normal"):
+    fc = FARE_CLASSES.get(vehicle, FARE_CLASSES["normal"])
+    fare = fc.base + distance_km * fc.per_km + duration_min * fc.per_min
+    return round(max(fare, fc.minimum), 2)
+
+
+class ZoneMatrix:
+    """Read-only view of a zone-to-zone road distance/time matrix.
+
+    Layout: header, then rows*cols x rows*cols float32 kilometres, then
+    the same for minutes; NaN marks pairs with no route.
+    """
+
+    def __init__(self, path=ZONE_FILE):
+        self._file = open(path, "rb")
+        header = self._file.read(ZONE_HEADER.size)
+        magic, self.min_lat, self.max_lat, self.min_lon, self.max_lon, \
+            self.cell, self.rows, self.cols = ZONE_HEADER.unpack(header)
+        if magic != ZONE_MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a fare zone matrix")
+        self.zones = self.rows * self.cols
+        count = self.zones * self.zones
+        if sys.byteorder == "little":
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._mmap)[ZONE_HEADER.size:].cast("f")
+            self.km, self.minutes = view[:count], view[count:2 * count]
+        else:
+            self._mmap = None
+            self.km, self.minutes = array("f"), array("f")
+            self.km.fromfile(self._file, count)
+            self.minutes.fromfile(self._file, count)
+            self.km.byteswap()
+            self.minutes.byteswap()
+
+    def zone_of(self, lat, lon):
+        if not (self.min_lat <= lat < self.max_lat and self.min_lon <= lon < self.max_lon):
+            return None
+        r = int((lat - self.min_lat) / self.cell)
+        c = int((lon - self.min_lon) / self.cell)
+        return r * self.cols + c
+
+    def centre(self, zone):
+        r, c = divmod(zone, self.cols)
+        return (self.min_lat + (r + 0.5) * self.cell,
+                self.min_lon + (c + 0.5) * self.cell)
+
+    def lookup(self, start, end):
+        """(km, minutes) for the trip, or None if the matrix can't answer."""
+        a = self.zone_of(start[0], start[1])
+        b = self.zone_of(end[0], end[1])
+        if a is None or b is None or a == b:
+            return None
+        i = a * self.zones + b
+        km, minutes = self.km[i], self.minutes[i]
+        if km != km:    # NaN: no route between these zones
+            return None
+        (clat1, clon1), (clat2, clon2) = self.centre(a), self.centre(b)
+        centre_km = haversine_km(clat1, clon1, clat2, clon2)
+        if centre_km < MIN_CENTRE_KM:
+            return None
+        trip_km = haversine_km(start[0], start[1], end[0], end[1]) * (km / centre_km)
+        return trip_km, minutes * (trip_km / km)
+
+    def close(self):
+        self.km = self.minutes = None
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+_matrix = None
+_matrix_loaded = False
+
+
+def get_matrix():
+    """The shared ZoneMatrix, or None when ZONE_FILE is missing/invalid."""
+    global _matrix, _matrix_loaded
+    if not _matrix_loaded:
+        _matrix_loaded = True
+        if os.path.exists(ZONE_FILE):
+            try:
+                _matrix = ZoneMatrix(ZONE_FILE)
+            except (OSError, ValueError, struct.error) as e:
+                log.error("Could not open %s: %s", ZONE_FILE, e)
+    return _matrix
+
+
+def quote(start, end, vehicle="normal", fetch_route=False):
+    """Quote a trip; see the module docstring for the source order.
+
+    fetch_route=False never touches the network, so it is safe on the
+    Tk thread.
+    """
+    start = (float(start[0]), float(start[1]))
+    end = (float(end[0]), float(end[1]))
+    client = routing.get_client()
+
+    found = client.peek(start, end)
+    if found is not None:
+        return Quote(price(found.distance_km, found.duration_min, vehicle),
+                     found.distance_km, found.duration_min, "route")
+
+    matrix = get_matrix()
+    if matrix is not None:
+        hit = matrix.lookup(start, end)
+        if hit is not None:
+            km, minutes = hit
+            return Quote(price(km, minutes, vehicle), km, minutes, "zone")
+
+    if fetch_route:
+        found = client.route(start, end)
+        if found is not None:
+            return Quote(price(found.distance_km, found.duration_min, vehicle),
+                         found.distance_km, found.duration_min, "route")
+
+    km = haversine_km(start[0], start[1], end[0], end[1]) * DEFAULT_DETOUR
+    minutes = km / DEFAULT_SPEED_KMH * 60
+    return Quote(price(km, minutes, vehicle), km, minutes, "estimate")
+
+
+def build_matrix(path=ZONE_FILE, bbox=ZONE_BBOX, cell=ZONE_DEG, backend=None):
+    """Route every zone-centre pair and write the matrix file.
+
+    Uses the offline road graph unless a backend is given; a matrix is
+    tens of thousands of routes, not something to ask a public server.
+    """
+    min_lat, max_lat, min_lon, max_lon = bbox
+    rows = int(math.ceil(round((max_lat - min_lat) / cell, 6)))
+    cols = int(math.ceil(round((max_lon - min_lon) / cell, 6)))
+    zones = rows * cols
+    if backend is None:
+        import road_graph
+        backend = road_graph.GraphBackend(road_graph.RoadGraph.load(road_graph.GRAPH_FILE))
+    centres = [(min_lat + (r + 0.5) * cell, min_lon + (c + 0.5) * cell)
+               for r in range(rows) for c in range(cols)]
+
+    nan = float("nan")
+    km = array("f", [nan]) * (zones * zones)
+    minutes = array("f", [nan]) * (zones * zones)
+    t0 = time.perf_counter()
+    for a, start in enumerate(centres):
+        for b, end in enumerate(centres):
+            if a == b:
+                continue
+            found = backend.fetch(start, end)
+            if found is not None and found.distance_km > 0:
+                km[a * zones + b] = found.distance_km
+                minutes[a * zones + b] = found.duration_min
+        log.info("Zone matrix row %d/%d (%.0f s)", a + 1, zones, time.perf_counter() - t0)
+
+    if sys.byteorder == "big":
+        km.byteswap()
+        minutes.byteswap()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(ZONE_HEADER.pack(ZONE_MAGIC, min_lat, max_lat, min_lon, max_lon,
+                                 cell, rows, cols))
+        km.tofile(f)
+        minutes.tofile(f)
+    os.replace(tmp, path)
+    return rows, cols
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fare engine tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build-matrix")
+    build.add_argument("output", nargs="?", default=ZONE_FILE)
+    build.add_argument("--cell", type=float, default=ZONE_DEG)
+    args = parser.parse_args()
+
+    rows, cols = build_matrix(args.output, cell=args.cell)
+    print(f"{args.output}: {rows}x{cols} zones")
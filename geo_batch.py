@@ -0,0 +1,64 @@
+# geo_batch.py
+"""NumPy versions of the passenger_constants geo helpers for many points.
+
+    from geo_batch import haversine_km, distance_matrix, is_inside_nepal
+
+    haversine_km(lats, lons, 27.7172, 85.3240)      # many-to-one
+    haversine_km(lat1, lon1, lat2, lon2)            # element-wise pairs
+    distance_matrix(pickups, drivers)               # (n, m) all pairs
+    is_inside_nepal(lats, lons)                     # boolean mask
+
+Arguments are anything np.asarray accepts and broadcast the usual way;
+results are float64 km. The scalar functions in passenger_constants are
+the same formulas for one pair, and stay plain `math` so the per-click
+UI path does not pay numpy's per-call overhead.
+"""
+import numpy as np
+
+from passenger_constants import (
+    EARTH_RADIUS_KM, NEPAL_MIN_LAT, NEPAL_MAX_LAT, NEPAL_MIN_LON, NEPAL_MAX_LON,
+)
+
+MATRIX_CHUNK = 4096   # rows per block in distance_matrix
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, broadcast over all arguments."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64))
+                              for x in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) * 0.5) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(a, b, out=None):
+    """km between every point of a (n, 2) and b (m, 2) as an (n, m) array.
+
+    Points are (lat, lon) rows. cos(lat) and the radian conversion are
+    done once per point rather than once per pair, and rows are filled
+    in blocks so the temporaries stay small for large n.
+    """
+    a = np.radians(np.asarray(a, dtype=np.float64).reshape(-1, 2))
+    b = np.radians(np.asarray(b, dtype=np.float64).reshape(-1, 2))
+    if out is None:
+        out = np.empty((len(a), len(b)))
+    cos_b = np.cos(b[:, 0])
+    for lo in range(0, len(a), MATRIX_CHUNK):
+        blk = a[lo:lo + MATRIX_CHUNK]
+        dlat = b[None, :, 0] - blk[:, None, 0]
+        dlon = b[None, :, 1] - blk[:, None, 1]
+        h = (np.sin(dlat * 0.5) ** 2
+             + np.cos(blk[:, 0])[:, None] * cos_b[None, :] * np.sin(dlon * 0.5) ** 2)
+        np.clip(h, 0.0, 1.0, out=h)
+        np.sqrt(h, out=h)
+        np.arcsin(h, out=h)
+        np.multiply(h, 2 * EARTH_RADIUS_KM, out=out[lo:lo + len(blk)])
+    return out
+
+
+def is_inside_nepal(lats, lons):
+    """Boolean mask of points inside the Nepal bounding box."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return ((lats >= NEPAL_MIN_LAT) & (lats <= NEPAL_MAX_LAT)
+            & (lons >= NEPAL_MIN_LON) & (lons <= NEPAL_MAX_LON))
@@ -2,11 +2,12 @@
 
 import tkinter as tk
 from tkinter import messagebox
-import requests
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from passenger_constants import is_inside_nepal, haversine_km, PRICE_NORMAL, PRICE_COMFORT
-import time
+import fares
+import geocode_cache
+import routing
+from passenger_constants import is_inside_nepal, PRICE_NORMAL, PRICE_COMFORT
 
 
 class GeoRoutingMixin:
@@ -55,12 +56,12 @@ class GeoRoutingMixin:
 
     def _geocode_and_update_map(self, type_str, query):
         try:
-            location = self.geolocator.geocode(
-                query, country_codes="np", language="en", timeout=10)
+            location = geocode_cache.geocode(
+                query, self.geolocator, country_codes="np", language="en", timeout=10)
 
             if not location:
-                location = self.geolocator.geocode(
-                    f"{query}, Nepal", language="en", timeout=10)
+                location = geocode_cache.geocode(
+                    f"{query}, Nepal", self.geolocator, language="en", timeout=10)
 
             if location:
                 if is_inside_nepal(location.latitude, location.longitude):
@@ -105,64 +106,9 @@ class GeoRoutingMixin:
             self._geocode_and_update_map("to", q)
 
     def _get_route_osrm(self, start, end, retries=1):
-        try:
-            s_lat, s_lon = float(start[0]), float(start[1])
-            e_lat, e_lon = float(end[0]), float(end[1])
-
-            url = (
-                "https://router.project-osrm.org/route/v1/driving/"
-                f"{s_lon:.6f},{s_lat:.6f};{e_lon:.6f},{e_lat:.6f}"
-                "?overview=full&geometries=geojson&alternatives=false&steps=true"
-            )
-            print(f"OSRM Request URL: {url}")
-
-            for attempt in range(retries + 1):
-                try:
-                    resp = requests.get(url, timeout=10)
-                    print(f"OSRM Response Status: {resp.status_code}")
-                    
-                    print(f"OSRM Response Content: {resp.text[:500]}...")
-                    resp.raise_for_status() 
-                except requests.exceptions.RequestException as req_err:
-                    print(
-                        f"OSRM Request Error (Attempt {attempt+1}/{retries+1}): {req_err}")
-                    if attempt < retries:
-                        time.sleep(0.5)
-                        continue
-                    return None
-                except Exception as e:
-                    print(
-                        f"OSRM Unexpected Error (Attempt {attempt+1}/{retries+1}): {e}")
-                    if attempt < retries:
-                        time.sleep(0.5)
-                        continue
-                    return None
-
-                try:
-                    data = resp.json()
-                except ValueError as json_err:
-                    print(f"OSRM JSON Decoding Error: {json_err}")
-                    return None
-
-                if "routes" not in data or not data["routes"]:
-                    print("OSRM Error: No routes found in response.")
-                    return None
-
-                route_geometry = data["routes"][0]["geometry"]
-                if route_geometry.get("type") != "LineString" or "coordinates" not in route_geometry:
-                    print(
-                        f"OSRM Error: Expected GeoJSON LineString, but got type {route_geometry.get("type")} or missing coordinates.")
-                    return None
-
-                geometry = route_geometry["coordinates"]
-
-                return [(float(pt[1]), float(pt[0])) for pt in geometry]
-
-            return None
-
-        except Exception as e:
-            print("OSRM General Error:", e)
-            return None
+        """Route points [(lat, lon), ...] via the shared routing client, or None."""
+        route = routing.get_client().route(start, end)
+        return route.points if route else None
 
     def _draw_route(self):
         if getattr(self, "current_path", None):
@@ -228,10 +174,8 @@ class GeoRoutingMixin:
             return
 
         try:
-            lat1, lon1 = map(float, self.from_loc)
-            lat2, lon2 = map(float, self.to_loc)
-
-            distance_km = haversine_km(lat1, lon1, lat2, lon2)
+            q = fares.quote(self.from_loc, self.to_loc, self.selected_card)
+            distance_km, fare = q.distance_km, q.fare
 
             distance_text = f"Distance: {distance_km:.2f} km"
             hint_text = f"Distance\n{distance_km:.2f} km"
@@ -242,9 +186,6 @@ class GeoRoutingMixin:
             if getattr(self, "lbl_distance_hint", None):
                 self.lbl_distance_hint.configure(text=hint_text)
 
-            rate = self.rates.get(self.selected_card, PRICE_NORMAL)
-            fare = distance_km * rate
-
             fare_text = f"Fare: Rs {fare:.2f}"
 
             if getattr(self, "lbl_fare", None):
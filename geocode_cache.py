@@ -0,0 +1,159 @@
+# geocode_cache.py
+"""Shared cache for Nominatim geocode / reverse-geocode lookups.
+
+Two tiers: an in-process LRU in front of the geocode_cache table, so a
+warm lookup costs a dict hit and a cold one (per process) a primary-key
+read instead of a network round trip. Reverse lookups are keyed on
+coordinates snapped to a ~10 m grid, so nearby clicks share an entry.
+
+Results come back as Place tuples whose fields mirror the geopy Location
+attributes the call sites use (address, latitude, longitude, raw).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from db_connection import get_connection, transaction
+from app_logging import get_logger
+
+log = get_logger("geocode_cache")
+
+Place = namedtuple("Place", "address latitude longitude raw")
+
+GRID_DEG = 0.0001            # ~11 m of latitude
+LRU_SIZE = 2048
+TTL_SECONDS = 30 * 24 * 3600
+NEGATIVE_TTL_SECONDS = 24 * 3600   # "not found" answers expire sooner
+
+_lock = threading.Lock()
+_lru = OrderedDict()
+_default_geolocator = None
+
+stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "expired": 0}
+
+
+def _geolocator():
+    global _default_geolocator
+    if _default_geolocator is None:
+        from geopy.geocoders import Nominatim
+        _default_geolocator = Nominatim(user_agent="taxi_booking_app_v1")
+    return _default_geolocator
+
+
+def quantize(lat, lon):
+    return (round(round(float(lat) / GRID_DEG) * GRID_DEG, 4),
+            round(round(float(lon) / GRID_DEG) * GRID_DEG, 4))
+
+
+def _encode(place):
+    if place is None:
+        return None
+    return json.dumps([place.address, place.latitude, place.longitude, place.raw])
+
+
+def _decode(value):
+    if value is None:
+        return None
+    return Place(*json.loads(value))
+
+
+def _from_location(location):
+    if not location:
+        return None
+    raw = getattr(location, "raw", None) or {}
+    # Only the address breakdown is used downstream; keep rows small.
+    return Place(location.address, location.latitude, location.longitude,
+                 {"address": raw.get("address", {})})
+
+
+def _lru_get(key, now):
+    with _lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return False, None
+        expires, place = entry
+        if expires < now:
+            del _lru[key]
+            return False, None
+        _lru.move_to_end(key)
+        return True, place
+
+
+def _lru_put(key, place, expires):
+    with _lock:
+        _lru[key] = (expires, place)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _cached(kind, key, fetch):
+    now = time.time()
+    full_key = f"{kind}:{key}"
+
+    found, place = _lru_get(full_key, now)
+    if found:
+        stats["memory_hits"] += 1
+        return place
+
+    row = get_connection().execute(
+        "SELECT value, expires_at FROM geocode_cache WHERE kind=? AND key=?",
+        (kind, key)
+    ).fetchone()
+    if row and row[1] >= now:
+        stats["db_hits"] += 1
+        place = _decode(row[0])
+        _lru_put(full_key, place, row[1])
+        return place
+    if row:
+        stats["expired"] += 1
+
+    stats["misses"] += 1
+    place = fetch()   # network errors propagate and are not cached
+    expires = now + (TTL_SECONDS if place else NEGATIVE_TTL_SECONDS)
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache (kind, key, value, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (kind, key, _encode(place), expires)
+        )
+    _lru_put(full_key, place, expires)
+    return place
+
+
+def reverse(lat, lon, geolocator=None, language=False, timeout=10):
+    """Cached geolocator.reverse(); returns a Place or None."""
+    qlat, qlon = quantize(lat, lon)
+    key = f"{qlat:.4f},{qlon:.4f}|{language or ''}"
+    geo = geolocator or _geolocator()
+    return _cached("reverse", key, lambda: _from_location(
+        geo.reverse((float(lat), float(lon)), language=language, timeout=timeout)))
+
+
+def geocode(query, geolocator=None, country_codes=None, language=False, timeout=10):
+    """Cached geolocator.geocode(); returns a Place or None."""
+    norm = " ".join(query.lower().split())
+    key = f"{norm}|{country_codes or ''}|{language or ''}"
+    geo = geolocator or _geolocator()
+    return _cached("geocode", key, lambda: _from_location(
+        geo.geocode(query, country_codes=country_codes, language=language, timeout=timeout)))
+
+
+def purge_expired():
+    """Delete expired rows; returns how many were removed."""
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM geocode_cache WHERE expires_at < ?", (time.time(),)
+        ).rowcount
+
+
+def clear_memory():
+    with _lock:
+        _lru.clear()
+
+
+def hit_rate():
+    hits = stats["memory_hits"] + stats["db_hits"]
+    total = hits + stats["misses"]
+    return hits / total if total else 0.0
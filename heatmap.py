@@ -0,0 +1,208 @@
+# heatmap.py
+"""Pickup and drop demand on a fixed lat/lon grid over Nepal.
+
+The NEPAL_* bounding box is cut into CELL_DEG cells (about 1.1 km),
+ROWS x COLS of them, numbered row-major from the south-west corner:
+
+    cell = row * COLS + col
+
+The heatmap table holds (layer, cell) -> rides for the cells that have
+any, one layer per end of the ride ("pickup", "drop"). Triggers
+(migration 14) add each new ride to its two cells, so reading the map
+never touches rides:
+
+    heatmap.top("pickup", 50)      # busiest cells, with their bounds
+    heatmap.grid("drop")           # dense ROWS x COLS uint32 array
+
+Rebuilds bin the coordinates with numpy, a batch of rides at a time, and
+check() / rebuild() compare with / recompute from the rides table. numpy
+is imported only by the functions that use arrays, so the triggers,
+add_rides() and top() work without it.
+
+    python heatmap.py [--layer pickup] [--top 20] [--check | --rebuild]
+"""
+import argparse
+import math
+from collections import namedtuple
+from itertools import chain
+
+from constants import NEPAL_MIN_LAT, NEPAL_MAX_LAT, NEPAL_MIN_LON, NEPAL_MAX_LON
+from db_connection import get_connection, transaction
+from app_logging import get_logger
+
+log = get_logger("heatmap")
+
+CELL_DEG = 0.01
+ROWS = math.ceil(round((NEPAL_MAX_LAT - NEPAL_MIN_LAT) / CELL_DEG, 6))
+COLS = math.ceil(round((NEPAL_MAX_LON - NEPAL_MIN_LON) / CELL_DEG, 6))
+
+# layer -> (lat column, lon column) of rides
+LAYERS = {
+    "pickup": ("pickup_lat", "pickup_lon"),
+    "drop": ("drop_lat", "drop_lon"),
+}
+
+BATCH_SIZE = 100000     # rides per fetchmany() in a rebuild
+
+Cell = namedtuple("Cell", "cell rides south west north east")
+
+
+def cell_sql(lat, lon):
+    """SQL for the cell of (lat, lon), NULL outside the grid.
+
+    Must agree with cells(): the same float arithmetic, and CAST truncates
+    like astype() does (the offsets are never negative inside the box).
+    """
+    def index(value, low, size):
+        return f"MIN(CAST(({value} - {low!r}) / {CELL_DEG!r} AS INTEGER), {size - 1})"
+    return (f"(CASE WHEN {lat} BETWEEN {NEPAL_MIN_LAT!r} AND {NEPAL_MAX_LAT!r} "
+            f"AND {lon} BETWEEN {NEPAL_MIN_LON!r} AND {NEPAL_MAX_LON!r} "
+            f"THEN {index(lat, NEPAL_MIN_LAT, ROWS)} * {COLS} "
+            f"+ {index(lon, NEPAL_MIN_LON, COLS)} END)")
+
+
+def cells(lats, lons):
+    """Cell of every point inside the grid; points outside (or NaN) are dropped."""
+    import numpy as np
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    inside = ((lats >= NEPAL_MIN_LAT) & (lats <= NEPAL_MAX_LAT)
+              & (lons >= NEPAL_MIN_LON) & (lons <= NEPAL_MAX_LON))
+    rows = np.minimum(((lats[inside] - NEPAL_MIN_LAT) / CELL_DEG).astype(np.int64), ROWS - 1)
+    cols = np.minimum(((lons[inside] - NEPAL_MIN_LON) / CELL_DEG).astype(np.int64), COLS - 1)
+    return rows * COLS + cols
+
+
+def bin_counts(lats, lons):
+    """Rides per cell for the given points, as a flat int64 array of ROWS * COLS."""
+    import numpy as np
+
+    return np.bincount(cells(lats, lons), minlength=ROWS * COLS)
+
+
+def bounds(cell):
+    """(south, west, north, east) of a cell."""
+    row, col = divmod(cell, COLS)
+    south = NEPAL_MIN_LAT + row * CELL_DEG
+    west = NEPAL_MIN_LON + col * CELL_DEG
+    return south, west, south + CELL_DEG, west + CELL_DEG
+
+
+def top(layer="pickup", limit=50):
+    """The `limit` cells with the most rides in a layer, busiest first."""
+    rows = get_connection().execute("""
+        SELECT cell, rides FROM heatmap
+        WHERE layer = ? AND rides > 0
+        ORDER BY rides DESC LIMIT ?
+    """, (layer, limit)).fetchall()
+    return [Cell(cell, rides, *bounds(cell)) for cell, rides in rows]
+
+
+def _stored(conn, layer, dtype="int64"):
+    import numpy as np
+
+    out = np.zeros(ROWS * COLS, dtype=dtype)
+    rows = conn.execute("SELECT cell, rides FROM heatmap WHERE layer = ?", (layer,)).fetchall()
+    if rows:
+        rows = np.array(rows, dtype=np.int64)
+        out[rows[:, 0]] = rows[:, 1]
+    return out
+
+
+def grid(layer="pickup"):
+    """The whole layer as a (ROWS, COLS) uint32 array, row 0 southmost."""
+    return _stored(get_connection(), layer, "uint32").reshape(ROWS, COLS)
+
+
+def recount(conn):
+    """{layer: flat int64 counts} binned from the rides table."""
+    import numpy as np
+
+    # Missing coordinates read as (0, 0), which is outside the grid.
+    columns = ", ".join(f"COALESCE({c}, 0.0)" for pair in LAYERS.values() for c in pair)
+    counts = {layer: np.zeros(ROWS * COLS, dtype=np.int64) for layer in LAYERS}
+    cursor = conn.execute(f"SELECT {columns} FROM rides")
+    while True:
+        batch = cursor.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        width = 2 * len(LAYERS)
+        points = np.fromiter(chain.from_iterable(batch), np.float64,
+                             len(batch) * width).reshape(-1, width)
+        for i, layer in enumerate(LAYERS):
+            counts[layer] += bin_counts(points[:, 2 * i], points[:, 2 * i + 1])
+    return counts
+
+
+def fill(conn):
+    """Recompute the heatmap from rides. Call inside a write transaction."""
+    import numpy as np
+
+    counts = recount(conn)
+    conn.execute("DELETE FROM heatmap")
+    for layer, flat in counts.items():
+        busy = np.flatnonzero(flat)
+        conn.executemany("INSERT INTO heatmap (layer, cell, rides) VALUES (?, ?, ?)",
+                         ((layer, int(c), int(n)) for c, n in zip(busy, flat[busy])))
+
+
+def add_rides(conn, first_id, last_id):
+    """Add rides first_id..last_id to both layers. Call inside a write transaction."""
+    for layer, (lat, lon) in LAYERS.items():
+        conn.execute(f"""
+            INSERT INTO heatmap (layer, cell, rides)
+            SELECT ?, cell, COUNT(*)
+            FROM (SELECT {cell_sql(lat, lon)} AS cell FROM rides WHERE id BETWEEN ? AND ?)
+            WHERE cell IS NOT NULL
+            GROUP BY cell
+            ON CONFLICT(layer, cell) DO UPDATE SET rides = rides + excluded.rides
+        """, (layer, first_id, last_id))
+
+
+def check():
+    """{(layer, cell): (stored, recounted)} for cells that differ."""
+    import numpy as np
+
+    drift = {}
+    with transaction() as conn:
+        actual = recount(conn)
+        for layer in LAYERS:
+            stored = _stored(conn, layer)
+            for cell in np.flatnonzero(stored != actual[layer]):
+                drift[(layer, int(cell))] = (int(stored[cell]), int(actual[layer][cell]))
+    return drift
+
+
+def rebuild():
+    """Recompute the heatmap. Writers wait until it is done."""
+    with transaction(immediate=True) as conn:
+        fill(conn)
+    log.info("Rebuilt demand heatmap")
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Demand heatmap: busiest cells, check or rebuild.")
+    parser.add_argument("--layer", choices=list(LAYERS), default="pickup")
+    parser.add_argument("--top", type=int, default=20)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true")
+    group.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    database.create_tables()
+    if args.rebuild:
+        rebuild()
+    elif args.check:
+        drift = check()
+        for (layer, cell), (have, want) in sorted(drift.items()):
+            print(f"{layer} cell {cell}: stored {have}, actual {want}")
+        print("Heatmap matches the rides table." if not drift else
+              f"{len(drift)} cell(s) drifted; run with --rebuild.")
+        raise SystemExit(1 if drift else 0)
+    else:
+        print(f"{'rides':>7s}  {'south':>8s} {'west':>8s}  ({args.layer}, {CELL_DEG} deg cells)")
+        for c in top(args.layer, args.top):
+            print(f"{c.rides:7d}  {c.south:8.3f} {c.west:8.3f}")
@@ -7,7 +7,14 @@ import driver_dashboard
 import sqlite3
 
 
-from database import login_user, DB_NAME, register_admin
+from database import login_user, DB_NAME, register_admin, create_tables
+from tk_async import run_in_background
+from scheduler import RideScheduler
+
+create_tables()
+# Release advance bookings to drivers while the app is open; several
+# schedulers can run side by side (see scheduler.py).
+RideScheduler().start()
 
 
 def open_roles():
@@ -87,11 +94,18 @@ def login():
         messagebox.showwarning("Input Error", "Please fill in all fields.")
         return
 
-    try:
-        result = login_user(username_or_email, password)
-    except Exception as e:
-        messagebox.showerror("Error", f"Login failure: {e}")
-        return
+    login_btn.configure(state="disabled", text="Signing in...")
+    run_in_background(root, login_user, username_or_email, password,
+                      on_done=_login_finished, on_error=_login_failed)
+
+
+def _login_failed(e):
+    login_btn.configure(state="normal", text="Sign In")
+    messagebox.showerror("Error", f"Login failure: {e}")
+
+
+def _login_finished(result):
+    login_btn.configure(state="normal", text="Sign In")
 
     if result:
         role, user_data = result
@@ -0,0 +1,236 @@
+# matching.py
+"""Batch driver-ride matching for peak hours.
+
+Every run takes all Requested rides with pickup coordinates and all idle
+drivers with a fresh position, and assigns them to minimise total pickup
+ETA instead of first-click-wins. Each ride only considers its
+CANDIDATES nearest drivers within MAX_MATCH_KM (from a dispatch
+DriverIndex), so the cost matrix is sparse, and the assignment is solved
+exactly by shortest augmenting paths: as many rides as possible are
+matched, then total ETA is minimised. Rides with no reachable driver
+are left for the next run. Results go through admin_assign_driver and
+insert_admin_assignment_notifications, like a manual admin assignment.
+
+    python matching.py [--interval 10]
+
+Metrics of the last run (rides matched and pickup km, next to a greedy
+nearest-free-driver pass in ride order over the same candidates, and
+the km an optimal assignment of greedy's rides saves) are in
+BatchMatcher.last_metrics and the log.
+"""
+import argparse
+import heapq
+import itertools
+import math
+import time
+
+import database
+import dispatch
+from db_connection import get_connection
+from fares import DEFAULT_DETOUR
+from app_logging import get_logger
+
+log = get_logger("matching")
+
+CANDIDATES = 10
+MAX_MATCH_KM = 6.0
+PICKUP_SPEED_KMH = 20.0
+
+
+def pickup_eta(km):
+    """Seconds to reach a pickup km away in a straight line."""
+    return km * DEFAULT_DETOUR / PICKUP_SPEED_KMH * 3600
+
+
+def candidate_edges(rides, index, k=CANDIDATES, max_km=MAX_MATCH_KM):
+    """rides: [(ride_id, lat, lon)] -> per ride [(driver_id, km)], nearest first."""
+    return [[(driver_id, km) for km, driver_id in index.nearest(lat, lon, k, max_km)]
+            for _, lat, lon in rides]
+
+
+def assign(costs):
+    """Min-cost assignment of rows to columns on a sparse cost matrix.
+
+    costs[i] is a list of (column, cost). Every row may also stay
+    unassigned, at a penalty larger than the cost of any whole matching,
+    so as many rows as possible are matched and then total cost is
+    minimised. Returns assignment[i] = column or None.
+
+    Shortest augmenting paths (Jonker-Volgenant, sparse): rows are added
+    one at a time, each by a Dijkstra search over alternating paths to a
+    free column, on costs reduced by column prices that keep every edge
+    non-negative. Each row's "unassigned" option is a private column at
+    the penalty, so a row is dropped only when no path frees a driver
+    for it; the search stays local because most rows reach a free
+    column within a few hops.
+    """
+    n = len(costs)
+    top = max((c for row in costs for _, c in row), default=0.0)
+    penalty = n * top + 1.0
+    edges = [row + [(("unassigned", i), penalty)] for i, row in enumerate(costs)]
+    cost_of = [dict(row) for row in edges]
+    prices = {}
+    owner = {}
+    assigned = [None] * n
+    tie = itertools.count()       # heap tie-break; columns may not compare
+
+    for start in range(n):
+        # Dijkstra over columns; a matched column leads on to its owner's edges.
+        dist, via = {}, {}
+        heap = []
+        for j, c in edges[start]:
+            d = c - prices.get(j, 0.0)
+            if d < dist.get(j, math.inf):
+                dist[j], via[j] = d, start
+                heapq.heappush(heap, (d, next(tie), j))
+        done = {}
+        while True:
+            d, _, j = heapq.heappop(heap)
+            if j in done:
+                continue
+            done[j] = d
+            row = owner.get(j)
+            if row is None:
+                end, total = j, d
+                break
+            # The owner's own edge has reduced cost 0.
+            base = d - (cost_of[row][j] - prices.get(j, 0.0))
+            for k, c in edges[row]:
+                if k in done:
+                    continue
+                nd = base + c - prices.get(k, 0.0)
+                if nd < dist.get(k, math.inf):
+                    dist[k], via[k] = nd, row
+                    heapq.heappush(heap, (nd, next(tie), k))
+
+        for j, d in done.items():
+            prices[j] = prices.get(j, 0.0) + d - total
+        j = end
+        while True:
+            row = via[j]
+            owner[j] = row
+            j, assigned[row] = assigned[row], j
+            if row == start:
+                break
+
+    return [None if isinstance(j, tuple) else j for j in assigned]
+
+
+def greedy(edges):
+    """Rides in order each take their nearest free driver (first come, first served)."""
+    taken = set()
+    assignment = []
+    for row in edges:
+        pick = next((d for d, _ in row if d not in taken), None)
+        if pick is not None:
+            taken.add(pick)
+        assignment.append(pick)
+    return assignment
+
+
+def total_km(edges, assignment):
+    matched = km = 0
+    for row, driver_id in zip(edges, assignment):
+        if driver_id is not None:
+            matched += 1
+            km += dict(row)[driver_id]
+    return matched, km
+
+
+def solve(rides, index):
+    """(assignment, metrics) for rides [(ride_id, lat, lon)] against index."""
+    t0 = time.perf_counter()
+    edges = candidate_edges(rides, index)
+    t1 = time.perf_counter()
+    costs = [[(d, pickup_eta(km)) for d, km in row] for row in edges]
+    assignment = assign(costs)
+    t2 = time.perf_counter()
+
+    matched, km = total_km(edges, assignment)
+    first_come = greedy(edges)
+    greedy_matched, greedy_km = total_km(edges, first_come)
+    # Matching more rides costs pickup km, so compare like with like: the
+    # best assignment of just the rides greedy matched.
+    same = [i for i, d in enumerate(first_come) if d is not None]
+    _, same_km = total_km([edges[i] for i in same], assign([costs[i] for i in same]))
+    metrics = {
+        "rides": len(rides),
+        "drivers": len(index),
+        "edges": sum(len(row) for row in edges),
+        "matched": matched,
+        "pickup_km": round(km, 3),
+        "avg_pickup_km": round(km / matched, 3) if matched else None,
+        "greedy_matched": greedy_matched,
+        "greedy_pickup_km": round(greedy_km, 3),
+        "greedy_avg_pickup_km": round(greedy_km / greedy_matched, 3) if greedy_matched else None,
+        "extra_matched": matched - greedy_matched,
+        # Pickup km saved over greedy on the rides greedy matched.
+        "saved_km": round(greedy_km - same_km, 3),
+        "candidates_ms": round((t1 - t0) * 1000, 1),
+        "solve_ms": round((t2 - t1) * 1000, 1),
+    }
+    return assignment, metrics
+
+
+class BatchMatcher:
+    def __init__(self):
+        self.last_metrics = None
+
+    def snapshot(self, conn=None):
+        """Open rides and an index of idle, recently located drivers."""
+        conn = conn or get_connection()
+        rides = conn.execute("""
+            SELECT id, pickup_lat, pickup_lon, passenger_id FROM rides
+            WHERE status='Requested' AND pickup_lat IS NOT NULL
+            ORDER BY id
+        """).fetchall()
+        index = dispatch.DriverIndex()
+        for driver_id, lat, lon, updated_at in conn.execute("""
+            SELECT l.driver_id, l.lat, l.lon, l.updated_at
+            FROM driver_location l JOIN driver d ON d.id = l.driver_id
+            WHERE d.is_busy=0 AND l.updated_at > ?
+        """, (time.time() - dispatch.LOCATION_TTL,)):
+            index.update(driver_id, lat, lon, updated_at)
+        return rides, index
+
+    def run_once(self):
+        rides, index = self.snapshot()
+        assignment, metrics = solve([r[:3] for r in rides], index)
+
+        assigned = 0
+        for (ride_id, _, _, passenger_id), driver_id in zip(rides, assignment):
+            if driver_id is None:
+                continue
+            # Same path as an admin assignment; a ride or driver taken
+            # since the snapshot is simply skipped.
+            if database.admin_assign_driver(ride_id, driver_id):
+                database.insert_admin_assignment_notifications(ride_id, driver_id, passenger_id)
+                assigned += 1
+        metrics["assigned"] = assigned
+        self.last_metrics = metrics
+        if rides:
+            log.info("Batch match: %s", metrics)
+        return metrics
+
+    def run_forever(self, interval):
+        while True:
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error("Batch match failed: %s", e)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the batch driver-ride matcher.")
+    parser.add_argument("--interval", type=float, default=10.0)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+
+    database.create_tables()
+    matcher = BatchMatcher()
+    if args.once:
+        print(matcher.run_once())
+    else:
+        matcher.run_forever(args.interval)
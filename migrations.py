@@ -0,0 +1,816 @@
+# migrations.py
+"""Versioned schema migrations.
+
+Each migration runs once, in order, and is recorded in schema_version.
+PRAGMA user_version mirrors the newest applied version so that an
+up-to-date database is recognised with a single header read.
+"""
+from db_connection import get_connection, transaction
+from passenger_constants import parse_latlon, parse_schedule, short_address
+import analytics
+import heatmap
+import stats
+
+BATCH_SIZE = 5000
+
+MIGRATIONS = []
+
+
+def migration(version, name, transactional=True):
+    """Register a migration.
+
+    Transactional migrations run inside one BEGIN IMMEDIATE together with
+    their schema_version row. Non-transactional ones manage their own
+    (batched) transactions and must be safe to re-run after a crash.
+    """
+    def register(fn):
+        MIGRATIONS.append((version, name, transactional, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def head_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn=None):
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _record(conn, version, name):
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_version (version, name) VALUES (?, ?)",
+        (version, name)
+    )
+    # PRAGMA does not take bound parameters; version is always an int.
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def migrate():
+    """Bring the database up to head. Returns the number of migrations applied."""
+    conn = get_connection()
+    if current_version(conn) >= head_version():
+        return 0
+
+    with transaction(immediate=True):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+    applied = 0
+    for version, name, transactional, fn in MIGRATIONS:
+        if transactional:
+            with transaction(immediate=True):
+                # Another process may have got here first.
+                if current_version(conn) >= version:
+                    continue
+                fn(conn)
+                _record(conn, version, name)
+        else:
+            if current_version(conn) >= version:
+                continue
+            fn(conn)
+            with transaction(immediate=True):
+                if current_version(conn) < version:
+                    _record(conn, version, name)
+        applied += 1
+    return applied
+
+
+def backfill_in_batches(select_sql, apply_batch, batch_size=BATCH_SIZE, start=0):
+    """Walk a table in id order, one short write transaction per batch.
+
+    select_sql takes (last_id, limit) and must return rows whose first
+    column is the id, in ascending order; the walk begins after `start`.
+    apply_batch(conn, rows) writes the batch. Readers and other writers
+    get the lock between batches.
+    """
+    last_id = start
+    total = 0
+    while True:
+        with transaction(immediate=True) as conn:
+            rows = conn.execute(select_sql, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            apply_batch(conn, rows)
+        last_id = rows[-1][0]
+        total += len(rows)
+    return total
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _when(*conds):
+    """WHEN clause joining the given trigger conditions; None ones are left out."""
+    conds = [f"({c})" for c in conds if c]
+    return f"WHEN {' AND '.join(conds)}" if conds else ""
+
+
+def count_rides_in_batches(conn, name, triggers, add_rides):
+    """Bring up triggers that count rides into a table, then count the old rides.
+
+    triggers(counted) returns {trigger name: CREATE TRIGGER sql};
+    counted(row) is the SQL condition for a ride (NEW or OLD) to be
+    counted already, which the triggers must check, or None once the
+    backfill is done. add_rides(conn, first_id, last_id) counts a batch.
+
+    The triggers go live together with a backfill_progress row saying
+    which rides are still to come (ids up to the current MAX(id)). The
+    backfill counts their state as it reaches them, one short write
+    transaction per batch, while the triggers keep every ride before
+    that point, and every new one, current. The triggers are then
+    recreated without the check. Re-running after a crash resumes.
+    """
+    with transaction(immediate=True):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            name TEXT PRIMARY KEY,
+            done INTEGER NOT NULL,
+            until INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """)
+        row = conn.execute(
+            "SELECT done, until FROM backfill_progress WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            first = next(iter(triggers(lambda ride: None)))
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                            (first,)).fetchone():
+                return
+            conn.execute(
+                "INSERT INTO backfill_progress (name, done, until) "
+                "SELECT ?, 0, COALESCE(MAX(id), 0) FROM rides", (name,))
+            row = conn.execute(
+                "SELECT done, until FROM backfill_progress WHERE name = ?", (name,)).fetchone()
+            counted = lambda ride: (
+                f"NOT EXISTS (SELECT 1 FROM backfill_progress WHERE name = '{name}' "
+                f"AND {ride}.id > done AND {ride}.id <= until)")
+            for sql in triggers(counted).values():
+                conn.execute(sql)
+    done, until = row
+
+    def count(conn, rows):
+        add_rides(conn, rows[0][0], rows[-1][0])
+        conn.execute("UPDATE backfill_progress SET done = ? WHERE name = ?", (rows[-1][0], name))
+
+    backfill_in_batches(
+        f"SELECT id FROM rides WHERE id > ? AND id <= {int(until)} ORDER BY id LIMIT ?",
+        count, start=done)
+
+    with transaction(immediate=True):
+        for trigger, sql in triggers(lambda ride: None).items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(sql)
+        conn.execute("DELETE FROM backfill_progress WHERE name = ?", (name,))
+
+
+#  MIGRATIONS
+
+RIDES_COLUMNS = """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        passenger_id INTEGER NOT NULL,
+        driver_id INTEGER,
+        pickup TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        status TEXT DEFAULT 'Requested',
+        fare REAL,
+
+        -- scheduled booking
+        scheduled_date TEXT,
+        scheduled_time TEXT,
+        scheduled_datetime TEXT,
+
+        -- admin assign driver
+        assigned_by_admin INTEGER DEFAULT 0,
+        assigned_at TEXT,
+
+        cancel_requested INTEGER DEFAULT 0,
+        rating INTEGER DEFAULT NULL
+"""
+
+RIDES_COLUMN_NAMES = (
+    "id", "passenger_id", "driver_id", "pickup", "destination", "status",
+    "fare", "scheduled_date", "scheduled_time", "scheduled_datetime",
+    "assigned_by_admin", "assigned_at", "cancel_requested", "rating",
+)
+
+
+@migration(1, "baseline schema")
+def _baseline(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS admin (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS driver (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        phone TEXT,
+        password TEXT NOT NULL,
+        license_number TEXT UNIQUE NOT NULL,
+        is_busy INTEGER DEFAULT 0,
+        current_ride_id INTEGER
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS passenger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    """)
+
+    conn.execute(f"CREATE TABLE IF NOT EXISTS rides ({RIDES_COLUMNS})")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS driver_ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ride_id INTEGER,
+        driver_id INTEGER,
+        rating INTEGER,
+        comment TEXT,
+        FOREIGN KEY (ride_id) REFERENCES rides(id),
+        FOREIGN KEY (driver_id) REFERENCES driver(id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS driver_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        driver_id INTEGER NOT NULL,
+        ride_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (driver_id) REFERENCES driver(id),
+        FOREIGN KEY (ride_id) REFERENCES rides(id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS passenger_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        passenger_id INTEGER NOT NULL,
+        ride_id INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (passenger_id) REFERENCES passenger(id),
+        FOREIGN KEY (ride_id) REFERENCES rides(id)
+    )
+    """)
+
+
+@migration(2, "ride columns missing from legacy databases")
+def _legacy_ride_columns(conn):
+    # Databases created by the old create_tables() swallowed some of these
+    # columns into the stray "NEW"/"FOR" columns; add them back.
+    columns = _columns(conn, "rides")
+    wanted = (
+        ("scheduled_date", "TEXT"),
+        ("scheduled_time", "TEXT"),
+        ("scheduled_datetime", "TEXT"),
+        ("assigned_by_admin", "INTEGER DEFAULT 0"),
+        ("assigned_at", "TEXT"),
+        ("cancel_requested", "INTEGER DEFAULT 0"),
+        ("rating", "INTEGER DEFAULT NULL"),
+    )
+    for name, decl in wanted:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE rides ADD COLUMN {name} {decl}")
+
+
+SCHEMA_INDEXES = (
+    # get_active_ride
+    "CREATE INDEX IF NOT EXISTS idx_rides_passenger_status ON rides(passenger_id, status)",
+    # driver_accept_ride, get_pending_rides_for_driver (busy driver), get_driver_ratings
+    "CREATE INDEX IF NOT EXISTS idx_rides_driver_status ON rides(driver_id, status)",
+    # get_total_payments, admin_get_all_payments (covers SUM(fare))
+    "CREATE INDEX IF NOT EXISTS idx_rides_status_fare ON rides(status, fare)",
+    # get_pending_rides_for_driver (idle driver): only open rides are indexed
+    "CREATE INDEX IF NOT EXISTS idx_rides_open ON rides(status) "
+    "WHERE status IN ('Requested', 'Scheduled')",
+    # admin_get_scheduled_bookings
+    "CREATE INDEX IF NOT EXISTS idx_rides_schedule ON rides(scheduled_date, scheduled_time)",
+    # admin_get_all_drivers_with_ratings, submit_driver_rating
+    "CREATE INDEX IF NOT EXISTS idx_driver_ratings_driver ON driver_ratings(driver_id)",
+    "CREATE INDEX IF NOT EXISTS idx_driver_ratings_ride ON driver_ratings(ride_id)",
+    # get_available_drivers
+    "CREATE INDEX IF NOT EXISTS idx_driver_busy ON driver(is_busy)",
+)
+
+RIDES_INDEXES = tuple(s for s in SCHEMA_INDEXES if " ON rides(" in s)
+
+
+@migration(3, "indexes for hot queries")
+def _indexes(conn):
+    for statement in SCHEMA_INDEXES:
+        conn.execute(statement)
+
+
+@migration(4, "rebuild rides without stray columns", transactional=False)
+def _rebuild_rides(conn):
+    """Copy rides into a clean table in batches, then swap.
+
+    Triggers mirror writes made during the copy into rides_new, so the
+    write lock is only held per batch and for the final swap.
+    """
+    if set(_columns(conn, "rides")) <= set(RIDES_COLUMN_NAMES):
+        return
+
+    cols = ", ".join(RIDES_COLUMN_NAMES)
+    new_cols = ", ".join(f"NEW.{c}" for c in RIDES_COLUMN_NAMES)
+
+    with transaction(immediate=True):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS rides_new ({RIDES_COLUMNS})")
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rides_rebuild_ins AFTER INSERT ON rides
+        BEGIN
+            INSERT OR REPLACE INTO rides_new ({cols}) VALUES ({new_cols});
+        END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS rides_rebuild_upd AFTER UPDATE ON rides
+        BEGIN
+            INSERT OR REPLACE INTO rides_new ({cols}) VALUES ({new_cols});
+        END
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS rides_rebuild_del AFTER DELETE ON rides
+        BEGIN
+            DELETE FROM rides_new WHERE id = OLD.id;
+        END
+        """)
+
+    def copy(conn, rows):
+        # OR IGNORE: a row mirrored by a trigger is already newer.
+        placeholders = ", ".join("?" * len(RIDES_COLUMN_NAMES))
+        conn.executemany(
+            f"INSERT OR IGNORE INTO rides_new ({cols}) VALUES ({placeholders})",
+            rows
+        )
+
+    backfill_in_batches(
+        f"SELECT {cols} FROM rides WHERE id > ? ORDER BY id LIMIT ?", copy)
+
+    with transaction(immediate=True):
+        for trigger in ("rides_rebuild_ins", "rides_rebuild_upd", "rides_rebuild_del"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DROP TABLE rides")
+        conn.execute("ALTER TABLE rides_new RENAME TO rides")
+        for statement in RIDES_INDEXES:
+            conn.execute(statement)
+
+
+@migration(5, "identity index for cross-role email uniqueness")
+def _identity(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS identity (
+        email TEXT PRIMARY KEY,
+        role TEXT NOT NULL CHECK (role IN ('admin', 'driver', 'passenger')),
+        user_id INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_identity_role_user ON identity(role, user_id)")
+
+    # Backfill. Older databases could hold the same email under two roles;
+    # the first claim wins in the order login used to check them.
+    conn.execute("""
+        INSERT OR IGNORE INTO identity (email, role, user_id)
+        SELECT username, 'admin', id FROM admin
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO identity (email, role, user_id)
+        SELECT email, 'driver', id FROM driver ORDER BY id
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO identity (email, role, user_id)
+        SELECT email, 'passenger', id FROM passenger ORDER BY id
+    """)
+
+
+@migration(6, "geocode cache")
+def _geocode_cache(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (kind, key)
+    ) WITHOUT ROWID
+    """)
+
+
+@migration(7, "typed ride coordinates and display addresses", transactional=False)
+def _ride_coordinates(conn):
+    """Numeric endpoints plus a cached short display address per ride.
+
+    Historical rows are backfilled from the pickup/destination text: a
+    "lat, lon" string fills the coordinates (its address is resolved
+    and cached the first time a dashboard shows it), anything else is
+    an address and fills the display column. COALESCE keeps values that
+    create_ride wrote while the backfill was running.
+    """
+    with transaction(immediate=True):
+        columns = _columns(conn, "rides")
+        for name, decl in (("pickup_lat", "REAL"), ("pickup_lon", "REAL"),
+                           ("drop_lat", "REAL"), ("drop_lon", "REAL"),
+                           ("pickup_address", "TEXT"), ("drop_address", "TEXT")):
+            if name not in columns:
+                conn.execute(f"ALTER TABLE rides ADD COLUMN {name} {decl}")
+
+    def place(text):
+        coords = parse_latlon(text)
+        if coords:
+            return coords[0], coords[1], None
+        return None, None, short_address(text) if text else None
+
+    def fill(conn, rows):
+        conn.executemany("""
+            UPDATE rides SET
+                pickup_lat = COALESCE(pickup_lat, ?),
+                pickup_lon = COALESCE(pickup_lon, ?),
+                pickup_address = COALESCE(pickup_address, ?),
+                drop_lat = COALESCE(drop_lat, ?),
+                drop_lon = COALESCE(drop_lon, ?),
+                drop_address = COALESCE(drop_address, ?)
+            WHERE id = ?
+        """, [place(pickup) + place(destination) + (ride_id,)
+              for ride_id, pickup, destination in rows])
+
+    backfill_in_batches("""
+        SELECT id, pickup, destination FROM rides
+        WHERE id > ? AND ((pickup_lat IS NULL AND pickup_address IS NULL)
+                          OR (drop_lat IS NULL AND drop_address IS NULL))
+        ORDER BY id LIMIT ?
+    """, fill)
+
+
+@migration(8, "driver locations and ride offers")
+def _dispatch(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS driver_location (
+        driver_id INTEGER PRIMARY KEY,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        -- bumped on every write; Dispatcher.sync reads rows past its last seq
+        seq INTEGER NOT NULL,
+        FOREIGN KEY (driver_id) REFERENCES driver(id)
+    )
+    """)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_driver_location_seq ON driver_location(seq)")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ride_offers (
+        ride_id INTEGER NOT NULL,
+        driver_id INTEGER NOT NULL,
+        distance_km REAL,
+        offered_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (ride_id, driver_id)
+    ) WITHOUT ROWID
+    """)
+
+
+@migration(9, "indexed scheduled pickup time", transactional=False)
+def _scheduled_at(conn):
+    """rides.scheduled_at: the scheduled pickup as epoch seconds.
+
+    The admin bookings list sorts on it instead of the scheduled_date/
+    scheduled_time text, and the scheduler range-scans the small index
+    of rides still waiting for release. Historical rows are backfilled
+    from that text; unparseable ones stay NULL.
+    """
+    with transaction(immediate=True):
+        if "scheduled_at" not in _columns(conn, "rides"):
+            conn.execute("ALTER TABLE rides ADD COLUMN scheduled_at REAL")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rides_scheduled_at ON rides(scheduled_at) "
+            "WHERE scheduled_at IS NOT NULL")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rides_pending_schedule ON rides(scheduled_at) "
+            "WHERE status = 'Scheduled'")
+
+    def fill(conn, rows):
+        conn.executemany(
+            "UPDATE rides SET scheduled_at = COALESCE(scheduled_at, ?) WHERE id = ?",
+            [(parse_schedule(date_text, time_text), ride_id)
+             for ride_id, date_text, time_text in rows])
+
+    backfill_in_batches("""
+        SELECT id, scheduled_date, scheduled_time FROM rides
+        WHERE id > ? AND scheduled_date IS NOT NULL AND scheduled_at IS NULL
+        ORDER BY id LIMIT ?
+    """, fill)
+
+
+CHANGE_LOG_KEEP = 100000     # newest change_log rows kept; older ones are pruned
+
+
+@migration(10, "change log for dashboard refreshes")
+def _change_log(conn):
+    """change_log: one row per ride (or account) change, newest version last.
+
+    Triggers write it, so every path that creates, assigns, accepts,
+    releases, completes, cancels or rates a ride is covered without the
+    callers knowing. changes.ChangeFeed reads it to tell dashboards which
+    rides changed.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        version INTEGER PRIMARY KEY,
+        ride_id INTEGER,
+        passenger_id INTEGER,
+        driver_id INTEGER,
+        status TEXT,
+        old_status TEXT,
+        changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS rides_change_ins AFTER INSERT ON rides
+    BEGIN
+        INSERT INTO change_log (ride_id, passenger_id, driver_id, status)
+        VALUES (NEW.id, NEW.passenger_id, NEW.driver_id, NEW.status);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS rides_change_upd
+    AFTER UPDATE OF status, driver_id, fare, rating ON rides
+    WHEN OLD.status IS NOT NEW.status OR OLD.driver_id IS NOT NEW.driver_id
+         OR OLD.fare IS NOT NEW.fare OR OLD.rating IS NOT NEW.rating
+    BEGIN
+        INSERT INTO change_log (ride_id, passenger_id, driver_id, status, old_status)
+        VALUES (NEW.id, NEW.passenger_id, COALESCE(NEW.driver_id, OLD.driver_id),
+                NEW.status, OLD.status);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS driver_change_ins AFTER INSERT ON driver
+    BEGIN
+        INSERT INTO change_log (driver_id) VALUES (NEW.id);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS passenger_change_ins AFTER INSERT ON passenger
+    BEGIN
+        INSERT INTO change_log (passenger_id) VALUES (NEW.id);
+    END
+    """)
+    # Prune in batches rather than on every write.
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS change_log_prune AFTER INSERT ON change_log
+    WHEN NEW.version % 1000 = 0
+    BEGIN
+        DELETE FROM change_log WHERE version <= NEW.version - {CHANGE_LOG_KEEP};
+    END
+    """)
+
+
+@migration(11, "indexes for paged admin listings")
+def _listing_indexes(conn):
+    # admin_data *_page(): each sort order walks one index, so a page
+    # costs LIMIT rows whatever the table size. Fare order uses (fare,
+    # rowid); with a status filter, id and pickup-time order use
+    # (status, rowid) and (status, scheduled_at, rowid).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rides_fare ON rides(fare)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rides_status ON rides(status)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rides_status_scheduled ON rides(status, scheduled_at)")
+    # idx_rides_scheduled_at leaves out rides without a pickup time;
+    # pages of those (they sort as NULL) read this one instead.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rides_unscheduled ON rides(scheduled_at) "
+        "WHERE scheduled_at IS NULL")
+
+
+def _bump(key, delta, when=None):
+    """Trigger statement adding delta to stats[key], optionally only when `when`."""
+    source = f"SELECT {key}, {delta} WHERE {when}" if when else f"VALUES ({key}, {delta})"
+    return (f"INSERT INTO stats (key, value) {source} "
+            f"ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;")
+
+
+@migration(12, "running totals for the admin dashboard", transactional=False)
+def _stats(conn):
+    """stats: one row per counter, kept current by triggers (see stats.py)."""
+    with transaction(immediate=True):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats (
+            key TEXT PRIMARY KEY,
+            value NUMERIC NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """)
+        # Accounts are few: they are counted here, with their triggers.
+        for table, key in (("passenger", "passengers"), ("driver", "drivers")):
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                            (f"stats_{table}_ins",)).fetchone():
+                continue
+            conn.execute(f"""
+            CREATE TRIGGER stats_{table}_ins AFTER INSERT ON {table}
+            BEGIN {_bump(f"'{key}'", 1)} END
+            """)
+            conn.execute(f"""
+            CREATE TRIGGER stats_{table}_del AFTER DELETE ON {table}
+            BEGIN {_bump(f"'{key}'", -1)} END
+            """)
+            conn.execute(
+                f"INSERT OR REPLACE INTO stats (key, value) SELECT ?, COUNT(*) FROM {table}", (key,))
+
+    count_rides_in_batches(conn, "stats", _stats_triggers, stats.add_rides)
+
+
+def _stats_triggers(counted):
+    new_status = "'status:' || COALESCE(NEW.status, '')"
+    old_status = "'status:' || COALESCE(OLD.status, '')"
+    return {
+        "stats_rides_ins": f"""
+        CREATE TRIGGER stats_rides_ins AFTER INSERT ON rides
+        {_when(counted("NEW"))}
+        BEGIN
+            {_bump("'rides'", 1)}
+            {_bump(new_status, 1)}
+            {_bump("'revenue'", "NEW.fare", "NEW.status = 'Completed' AND NEW.fare IS NOT NULL")}
+        END
+        """,
+        "stats_rides_upd": f"""
+        CREATE TRIGGER stats_rides_upd AFTER UPDATE OF status, fare ON rides
+        {_when(counted("NEW"), "OLD.status IS NOT NEW.status OR OLD.fare IS NOT NEW.fare")}
+        BEGIN
+            {_bump(old_status, -1, "OLD.status IS NOT NEW.status")}
+            {_bump(new_status, 1, "OLD.status IS NOT NEW.status")}
+            {_bump("'revenue'", "-OLD.fare", "OLD.status = 'Completed' AND OLD.fare IS NOT NULL")}
+            {_bump("'revenue'", "NEW.fare", "NEW.status = 'Completed' AND NEW.fare IS NOT NULL")}
+        END
+        """,
+        "stats_rides_del": f"""
+        CREATE TRIGGER stats_rides_del AFTER DELETE ON rides
+        {_when(counted("OLD"))}
+        BEGIN
+            {_bump("'rides'", -1)}
+            {_bump(old_status, -1)}
+            {_bump("'revenue'", "-OLD.fare", "OLD.status = 'Completed' AND OLD.fare IS NOT NULL")}
+        END
+        """,
+    }
+
+
+def _rollup(table, row, sign=""):
+    """Trigger statement adding (sign "") or removing (sign "-") ride `row` in a rollup."""
+    when = analytics.ride_time(row)
+    bucket = analytics.ROLLUPS[table].format(t=when)
+    return f"""
+        INSERT INTO {table} (bucket, vehicle, status, rides, fare_sum, rating_sum, rating_n)
+        SELECT {bucket}, COALESCE({row}.vehicle, 'normal'), COALESCE({row}.status, ''),
+               {sign}1, {sign}COALESCE({row}.fare, 0), {sign}COALESCE({row}.rating, 0),
+               {sign}({row}.rating IS NOT NULL)
+        WHERE {when} IS NOT NULL
+        ON CONFLICT(bucket, vehicle, status) DO UPDATE SET
+            rides = rides + excluded.rides,
+            fare_sum = fare_sum + excluded.fare_sum,
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_n = rating_n + excluded.rating_n;"""
+
+
+@migration(13, "hourly and daily ride rollups", transactional=False)
+def _rollups(conn):
+    """rides.created_at and rides.vehicle, and the rollups analytics.py reads.
+
+    Rows from before this migration have no created_at; they are
+    bucketed by scheduled_at when they have one.
+    """
+    with transaction(immediate=True):
+        columns = _columns(conn, "rides")
+        if "created_at" not in columns:
+            conn.execute("ALTER TABLE rides ADD COLUMN created_at REAL")
+        if "vehicle" not in columns:
+            conn.execute("ALTER TABLE rides ADD COLUMN vehicle TEXT NOT NULL DEFAULT 'normal'")
+
+        for table in analytics.ROLLUPS:
+            conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                vehicle TEXT NOT NULL,
+                status TEXT NOT NULL,
+                rides INTEGER NOT NULL,
+                fare_sum REAL NOT NULL,
+                rating_sum INTEGER NOT NULL,
+                rating_n INTEGER NOT NULL,
+                PRIMARY KEY (bucket, vehicle, status)
+            ) WITHOUT ROWID
+            """)
+
+    count_rides_in_batches(conn, "rollups", _rollup_triggers, analytics.add_rides)
+
+
+def _rollup_triggers(counted):
+    tables = list(analytics.ROLLUPS)
+    return {
+        "rollup_rides_ins": f"""
+        CREATE TRIGGER rollup_rides_ins AFTER INSERT ON rides
+        {_when(counted("NEW"))}
+        BEGIN {"".join(_rollup(t, "NEW") for t in tables)}
+        END
+        """,
+        "rollup_rides_upd": f"""
+        CREATE TRIGGER rollup_rides_upd
+        AFTER UPDATE OF status, fare, rating, vehicle, scheduled_at, created_at ON rides
+        {_when(counted("NEW"),
+               "OLD.status IS NOT NEW.status OR OLD.fare IS NOT NEW.fare "
+               "OR OLD.rating IS NOT NEW.rating OR OLD.vehicle IS NOT NEW.vehicle "
+               "OR OLD.scheduled_at IS NOT NEW.scheduled_at OR OLD.created_at IS NOT NEW.created_at")}
+        BEGIN {"".join(_rollup(t, "OLD", "-") + _rollup(t, "NEW") for t in tables)}
+        END
+        """,
+        "rollup_rides_del": f"""
+        CREATE TRIGGER rollup_rides_del AFTER DELETE ON rides
+        {_when(counted("OLD"))}
+        BEGIN {"".join(_rollup(t, "OLD", "-") for t in tables)}
+        END
+        """,
+    }
+
+
+def _heat(layer, row, sign=""):
+    """Trigger statement adding (sign "") or removing (sign "-") ride `row` in a heatmap layer."""
+    lat, lon = heatmap.LAYERS[layer]
+    cell = heatmap.cell_sql(f"{row}.{lat}", f"{row}.{lon}")
+    return f"""
+        INSERT INTO heatmap (layer, cell, rides)
+        SELECT '{layer}', cell, {sign}1 FROM (SELECT {cell} AS cell)
+        WHERE cell IS NOT NULL
+        ON CONFLICT(layer, cell) DO UPDATE SET rides = rides + excluded.rides;"""
+
+
+@migration(14, "pickup and drop demand heatmap", transactional=False)
+def _heatmap(conn):
+    """heatmap: rides per grid cell and ride end (see heatmap.py)."""
+    with transaction(immediate=True):
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS heatmap (
+            layer TEXT NOT NULL,
+            cell INTEGER NOT NULL,
+            rides INTEGER NOT NULL,
+            PRIMARY KEY (layer, cell)
+        ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_heatmap_top ON heatmap(layer, rides)")
+
+    count_rides_in_batches(conn, "heatmap", _heatmap_triggers, heatmap.add_rides)
+
+
+def _heatmap_triggers(counted):
+    coords = [c for pair in heatmap.LAYERS.values() for c in pair]
+    return {
+        "heatmap_rides_ins": f"""
+        CREATE TRIGGER heatmap_rides_ins AFTER INSERT ON rides
+        {_when(counted("NEW"))}
+        BEGIN {"".join(_heat(layer, "NEW") for layer in heatmap.LAYERS)}
+        END
+        """,
+        "heatmap_rides_upd": f"""
+        CREATE TRIGGER heatmap_rides_upd AFTER UPDATE OF {", ".join(coords)} ON rides
+        {_when(counted("NEW"), " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in coords))}
+        BEGIN {"".join(_heat(layer, "OLD", "-") + _heat(layer, "NEW") for layer in heatmap.LAYERS)}
+        END
+        """,
+        "heatmap_rides_del": f"""
+        CREATE TRIGGER heatmap_rides_del AFTER DELETE ON rides
+        {_when(counted("OLD"))}
+        BEGIN {"".join(_heat(layer, "OLD", "-") for layer in heatmap.LAYERS)}
+        END
+        """,
+    }
+
+
+@migration(15, "index for unparsed schedules")
+def _unparsed_schedule_index(conn):
+    # Scheduled rides whose schedule text never parsed: the NULL part of
+    # the admin scheduled listing, read in rowid order.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_rides_unparsed_schedule ON rides(scheduled_at) "
+        "WHERE scheduled_at IS NULL "
+        "AND (scheduled_date IS NOT NULL OR scheduled_time IS NOT NULL)")
+
+
+@migration(16, "index for expiring ride offers")
+def _offer_expiry_index(conn):
+    # Dispatcher.offer deletes expired offers, and get_offer_expiries
+    # reads the live ones, by offered_at.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ride_offers_offered_at ON ride_offers(offered_at)")
@@ -2,6 +2,7 @@
 
 import math
 import subprocess
+from datetime import datetime
 
 
 KATHMANDU_CENTER = (27.7172, 85.3240)
@@ -13,6 +14,8 @@ NEPAL_MAX_LAT = 30.447
 NEPAL_MIN_LON = 80.058
 NEPAL_MAX_LON = 88.201
 
+EARTH_RADIUS_KM = 6371.0
+
 # Pricing
 PRICE_NORMAL = 30.0
 PRICE_COMFORT = 45.0
@@ -39,11 +42,54 @@ def is_inside_nepal(lat, lon):
            (NEPAL_MIN_LON <= lon <= NEPAL_MAX_LON)
 
 def haversine_km(lat1, lon1, lat2, lon2):
-    """Calculates the great-circle distance between two points on the Earth."""
-    R = 6371.0
+    """Calculates the great-circle distance between two points on the Earth.
+
+    For arrays of points use geo_batch.haversine_km / distance_matrix.
+    """
+    R = EARTH_RADIUS_KM
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
     a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * \
         math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
\ No newline at end of file
+    return R * c
+
+
+def parse_latlon(text):
+    """(lat, lon) from a "lat, lon" or "(lat, lon)" string, else None.
+
+    Rides booked without a geocoded address store their endpoints this
+    way. A pair that only makes sense swapped (lat > 90, or lon, lat
+    inside Nepal) is swapped.
+    """
+    if not text or not isinstance(text, str):
+        return None
+    parts = text.strip().lstrip("(").rstrip(")").split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if abs(lat) > 90 or (not is_inside_nepal(lat, lon) and is_inside_nepal(lon, lat)):
+        lat, lon = lon, lat
+    if abs(lat) > 90 or abs(lon) > 180:
+        return None
+    return lat, lon
+
+
+def short_address(text):
+    """First two comma-separated parts of an address, for compact display."""
+    parts = [p.strip() for p in str(text).split(",")]
+    return ", ".join(parts[:2]) if len(parts) >= 2 else str(text).strip()
+
+
+def parse_schedule(date_text, time_text):
+    """Epoch seconds for a local "YYYY-MM-DD" date and "HH:MM" time, else None."""
+    if not date_text or not time_text:
+        return None
+    try:
+        when = datetime.strptime(f"{date_text.strip()} {time_text.strip()}", "%Y-%m-%d %H:%M")
+    except (ValueError, AttributeError):
+        return None
+    return when.timestamp()
@@ -1,7 +1,6 @@
 import customtkinter as ctk
 import tkinter as tk
 import tkintermapview
-import requests
 from geopy.geocoders import Nominatim
 from tkinter import messagebox
 from datetime import datetime, date, timedelta
@@ -18,6 +17,8 @@ from passenger_constants import (
 )
 from geo_routing import GeoRoutingMixin
 from booking_management import BookingManagementMixin
+from tk_async import run_in_background
+import changes
 
 from database import get_active_ride, create_ride, cancel_ride, submit_driver_rating
 
@@ -302,10 +303,14 @@ class PassengerDashboard(ctk.CTk, GeoRoutingMixin, BookingManagementMixin):
             print(f"Error checking active ride on startup: {e}")
             self.ride_info = None
 
+        # Re-check only when one of this passenger's rides changes.
+        changes.get_feed().subscribe(
+            self, lambda _changes: self._refresh_ride_status(),
+            match=lambda c: c.passenger_id == self.user_id and c.ride_id is not None)
+
     def _refresh_ride_status(self):
 
         if getattr(self, "rating_card", None) and self.rating_card.winfo_ismapped():
-            self.after(5000, self._refresh_ride_status)
             return
 
         try:
@@ -368,28 +373,30 @@ class PassengerDashboard(ctk.CTk, GeoRoutingMixin, BookingManagementMixin):
         if not (self.from_loc and self.to_loc):
             return
 
-        coords = self.get_route_osrm(self.from_loc, self.to_loc)
+        # Fetch off the Tk thread; rapid marker moves share one request
+        # inside the routing client and stale answers are dropped here.
+        start, end = self.from_loc, self.to_loc
+        run_in_background(self, self.get_route_osrm, start, end,
+                          on_done=lambda coords: self._draw_route_path(start, end, coords))
+
+    def _draw_route_path(self, start, end, coords):
+        if (start, end) != (self.from_loc, self.to_loc):
+            return
+        if self.current_path:
+            self.current_path.delete()
+            self.current_path = None
         try:
             self.current_path = self.map_widget.set_path(
                 coords, width=4) if coords else self.map_widget.set_path([self.from_loc, self.to_loc], width=3)
         except Exception:
             self.current_path = self.map_widget.set_path(
                 coords) if coords else self.map_widget.set_path([self.from_loc, self.to_loc])
+        if coords:
+            # The route is cached now; re-quote on road distance.
+            self._compute_distance_and_fare()
 
     def get_route_osrm(self, from_loc, to_loc):
-        try:
-            url = f"https://router.project-osrm.org/route/v1/driving/{from_loc[1]},{from_loc[0]};{to_loc[1]},{to_loc[0]}?overview=full&geometries=geojson"
-            resp = requests.get(url, timeout=8)
-            if resp.status_code != 200:
-                return None
-            data = resp.json()
-            if not data.get("routes"):
-                return None
-            geom = data["routes"][0]["geometry"]["coordinates"]
-            return [(pt[1], pt[0]) for pt in geom]
-        except Exception as e:
-            print("OSRM error:", e)
-            return None
+        return self._get_route_osrm(from_loc, to_loc)
 
     def _setup_rating_ui(self):
         """Builds the dedicated rating interface which overlays the main screen."""
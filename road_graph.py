@@ -0,0 +1,606 @@
+# road_graph.py
+"""Offline road graph and shortest-path search.
+
+The graph is kept in CSR form in flat `array` buffers (node coordinates,
+edge targets, travel time and length per edge, plus the reverse graph
+for the backward search), so a Nepal extract loads with a few
+fromfile() calls and no per-edge Python objects.
+
+    python road_graph.py build roads.geojson nepal_roads.graph
+
+builds a graph file from a GeoJSON export of OSM ways (for example
+`osmium export nepal-latest.osm.pbf -o roads.geojson`), keeping drivable
+highways inside the Nepal bounding box, and precomputes a contraction
+hierarchy that is stored in the same file. GraphBackend answers
+routing.RoutingClient lookups from it: a CH query when the file has
+one, bidirectional A* on the plain graph otherwise.
+"""
+import argparse
+import heapq
+import json
+import math
+import struct
+import sys
+from array import array
+
+from passenger_constants import (
+    NEPAL_MIN_LAT, NEPAL_MAX_LAT, NEPAL_MIN_LON, NEPAL_MAX_LON, haversine_km,
+)
+from routing import Route, DEFAULT_PROFILE
+from app_logging import get_logger
+
+log = get_logger("road_graph")
+
+GRAPH_FILE = "nepal_roads.graph"
+MAGIC = b"TXRG\x00\x00\x00\x01"
+HEADER = struct.Struct("<8sIIII")
+
+# km/h by OSM highway class; anything not listed is not drivable.
+SPEEDS = {
+    "motorway": 80, "trunk": 60, "primary": 50, "secondary": 40,
+    "tertiary": 30, "unclassified": 25, "residential": 20,
+    "motorway_link": 40, "trunk_link": 35, "primary_link": 30,
+    "secondary_link": 25, "tertiary_link": 20, "living_street": 10,
+    "service": 15, "road": 20, "track": 10,
+}
+
+SNAP_CELL_DEG = 0.002        # ~200 m grid for nearest-node lookup
+MAX_SNAP_M = 500
+M_PER_DEG = 111195.0
+COORD_DIGITS = 7             # vertices closer than this are the same node
+WITNESS_SETTLE_LIMIT = 60    # CH build: give up looking for a witness path
+
+
+class RoadGraph:
+    def __init__(self, lat, lon, f_off, f_dst, f_time, f_len,
+                 r_off, r_src, r_time):
+        self.lat, self.lon = lat, lon
+        self.f_off, self.f_dst, self.f_time, self.f_len = f_off, f_dst, f_time, f_len
+        self.r_off, self.r_src, self.r_time = r_off, r_src, r_time
+        # Fastest edge bounds the A* heuristic, seconds per metre.
+        self.min_sec_per_m = min(
+            (t / l for t, l in zip(f_time, f_len) if l > 0), default=0.0)
+        self.ch = None
+        self._cells = None
+
+    @property
+    def node_count(self):
+        return len(self.lat)
+
+    @property
+    def edge_count(self):
+        return len(self.f_dst)
+
+    # -- construction -------------------------------------------------------
+
+    @classmethod
+    def from_edges(cls, coords, edges):
+        """coords: [(lat, lon)]; edges: [(u, v, length_m, seconds)], directed."""
+        n, m = len(coords), len(edges)
+        lat = array("d", (c[0] for c in coords))
+        lon = array("d", (c[1] for c in coords))
+
+        def csr(key_of, other_of):
+            off = array("i", bytes(4 * (n + 1)))
+            for e in edges:
+                off[key_of(e) + 1] += 1
+            for i in range(n):
+                off[i + 1] += off[i]
+            pos = array("i", off[:n])
+            other = array("i", bytes(4 * m))
+            time = array("f", bytes(4 * m))
+            length = array("f", bytes(4 * m))
+            for e in edges:
+                k = key_of(e)
+                i = pos[k]
+                pos[k] = i + 1
+                other[i] = other_of(e)
+                length[i] = e[2]
+                time[i] = e[3]
+            return off, other, time, length
+
+        f_off, f_dst, f_time, f_len = csr(lambda e: e[0], lambda e: e[1])
+        r_off, r_src, r_time, _ = csr(lambda e: e[1], lambda e: e[0])
+        return cls(lat, lon, f_off, f_dst, f_time, f_len, r_off, r_src, r_time)
+
+    @classmethod
+    def from_geojson(cls, path, speeds=SPEEDS,
+                     bbox=(NEPAL_MIN_LAT, NEPAL_MAX_LAT, NEPAL_MIN_LON, NEPAL_MAX_LON)):
+        min_lat, max_lat, min_lon, max_lon = bbox
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f).get("features", [])
+
+        index, coords, edges = {}, [], []
+
+        def node(pt):
+            key = (round(pt[1], COORD_DIGITS), round(pt[0], COORD_DIGITS))
+            nid = index.get(key)
+            if nid is None:
+                nid = index[key] = len(coords)
+                coords.append(key)
+            return nid
+
+        def inside(pt):
+            return min_lat <= pt[1] <= max_lat and min_lon <= pt[0] <= max_lon
+
+        for feature in features:
+            props = feature.get("properties") or {}
+            speed = _speed(props, speeds)
+            if speed is None:
+                continue
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "LineString":
+                lines = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiLineString":
+                lines = geometry["coordinates"]
+            else:
+                continue
+            oneway = str(props.get("oneway", "no")).lower()
+            for line in lines:
+                for a, b in zip(line, line[1:]):
+                    if not (inside(a) and inside(b)):
+                        continue
+                    u, v = node(a), node(b)
+                    if u == v:
+                        continue
+                    metres = haversine_km(a[1], a[0], b[1], b[0]) * 1000
+                    seconds = metres / (speed / 3.6)
+                    if oneway == "-1":
+                        edges.append((v, u, metres, seconds))
+                        continue
+                    edges.append((u, v, metres, seconds))
+                    if oneway not in ("yes", "true", "1"):
+                        edges.append((v, u, metres, seconds))
+
+        log.info("Road graph from %s: %d nodes, %d edges", path, len(coords), len(edges))
+        return cls.from_edges(coords, edges)
+
+    # -- persistence --------------------------------------------------------
+
+    def _arrays(self):
+        return (self.lat, self.lon, self.f_off, self.f_dst, self.f_time,
+                self.f_len, self.r_off, self.r_src, self.r_time)
+
+    def save(self, path=GRAPH_FILE):
+        arrays = self._arrays()
+        up_m = dn_m = 0
+        if self.ch is not None:
+            arrays += self.ch.arrays()
+            up_m, dn_m = len(self.ch.up_dst), len(self.ch.dn_src)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.node_count, self.edge_count, up_m, dn_m))
+            for arr in arrays:
+                if sys.byteorder == "big":
+                    arr = array(arr.typecode, arr)
+                    arr.byteswap()
+                arr.tofile(f)
+
+    @classmethod
+    def load(cls, path=GRAPH_FILE):
+        with open(path, "rb") as f:
+            magic, n, m, up_m, dn_m = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a road graph file")
+            graph = cls(*_read_arrays(f, (
+                ("d", n), ("d", n), ("i", n + 1), ("i", m), ("f", m),
+                ("f", m), ("i", n + 1), ("i", m), ("f", m))))
+            if up_m or dn_m:
+                graph.ch = ContractionHierarchy(*_read_arrays(f, (
+                    ("i", n + 1), ("i", up_m), ("f", up_m), ("f", up_m), ("i", up_m),
+                    ("i", n + 1), ("i", dn_m), ("f", dn_m), ("f", dn_m), ("i", dn_m))))
+        return graph
+
+    # -- contraction hierarchy ------------------------------------------------
+
+    def contract(self, settle_limit=WITNESS_SETTLE_LIMIT):
+        """Precompute a contraction hierarchy (sets and returns self.ch).
+
+        Nodes are contracted in lazily-updated edge-difference order; a
+        shortcut u -> w through v is added unless a bounded local search
+        finds a path at least as fast that avoids v.
+        """
+        n = self.node_count
+        inf = float("inf")
+        out = [{} for _ in range(n)]
+        inn = [{} for _ in range(n)]
+        for u in range(n):
+            for i in range(self.f_off[u], self.f_off[u + 1]):
+                v = self.f_dst[i]
+                cur = out[u].get(v)
+                if u != v and (cur is None or self.f_time[i] < cur[0]):
+                    out[u][v] = inn[v][u] = (self.f_time[i], self.f_len[i], -1)
+
+        def witness(src, skip, limit):
+            dist, heap, settled = {src: 0.0}, [(0.0, src)], 0
+            while heap and settled < settle_limit:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                for y, e in out[x].items():
+                    nd = d + e[0]
+                    if y != skip and nd < dist.get(y, inf):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+
+        def shortcuts(v, apply):
+            added = 0
+            if not out[v]:
+                return 0
+            max_out = max(e[0] for e in out[v].values())
+            for u, (tu, lu, _) in list(inn[v].items()):
+                dist = witness(u, v, tu + max_out)
+                for w, (tw, lw, _) in out[v].items():
+                    if w == u or dist.get(w, inf) <= tu + tw:
+                        continue
+                    added += 1
+                    if apply:
+                        cur = out[u].get(w)
+                        if cur is None or tu + tw < cur[0]:
+                            out[u][w] = inn[w][u] = (tu + tw, lu + lw, v)
+            return added
+
+        removed = [0] * n
+
+        def priority(v):
+            return shortcuts(v, False) - len(inn[v]) - len(out[v]) + removed[v]
+
+        up = [None] * n
+        dn = [None] * n
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        while heap:
+            _, v = heapq.heappop(heap)
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+            shortcuts(v, True)
+            up[v] = [(w,) + e for w, e in out[v].items()]
+            dn[v] = [(u,) + e for u, e in inn[v].items()]
+            for w in out[v]:
+                del inn[w][v]
+                removed[w] += 1
+            for u in inn[v]:
+                del out[u][v]
+                removed[u] += 1
+            out[v] = inn[v] = None
+
+        self.ch = ContractionHierarchy.from_lists(up, dn)
+        return self.ch
+
+    # -- queries ------------------------------------------------------------
+
+    def nearest_node(self, lat, lon, max_m=MAX_SNAP_M):
+        if self._cells is None:
+            cells = {}
+            for i, (a, b) in enumerate(zip(self.lat, self.lon)):
+                cells.setdefault((int(a // SNAP_CELL_DEG), int(b // SNAP_CELL_DEG)), []).append(i)
+            self._cells = cells
+
+        cy, cx = int(lat // SNAP_CELL_DEG), int(lon // SNAP_CELL_DEG)
+        kx = math.cos(math.radians(lat))
+        rings = int(max_m / (SNAP_CELL_DEG * M_PER_DEG * kx)) + 1
+        best, best_d2 = -1, float("inf")
+        for ring in range(rings + 1):
+            for dy in range(-ring, ring + 1):
+                for dx in range(-ring, ring + 1):
+                    if max(abs(dy), abs(dx)) != ring:
+                        continue
+                    for i in self._cells.get((cy + dy, cx + dx), ()):
+                        d2 = (self.lat[i] - lat) ** 2 + ((self.lon[i] - lon) * kx) ** 2
+                        if d2 < best_d2:
+                            best, best_d2 = i, d2
+            # Anything in the next ring is at least `ring` cells away.
+            if best >= 0 and math.sqrt(best_d2) <= ring * SNAP_CELL_DEG * kx:
+                break
+        if best < 0 or math.sqrt(best_d2) * M_PER_DEG > max_m:
+            return None
+        return best
+
+    def shortest_path(self, s, t):
+        """Fastest path s -> t as (node list, seconds), or (None, inf).
+
+        Bidirectional A* with the average potential
+        p(v) = (h_t(v) - h_s(v)) / 2, which is consistent for both
+        directions, so the plain bidirectional Dijkstra stopping rule holds.
+        """
+        if s == t:
+            return [s], 0.0
+        lat, lon = self.lat, self.lon
+        f_off, f_dst, f_time = self.f_off, self.f_dst, self.f_time
+        r_off, r_src, r_time = self.r_off, self.r_src, self.r_time
+        kx = math.cos(math.radians((lat[s] + lat[t]) / 2))
+        # 0.99 keeps the flat-earth estimate below the true distance.
+        scale = M_PER_DEG * self.min_sec_per_m * 0.99
+        s_lat, s_lon, t_lat, t_lon = lat[s], lon[s], lat[t], lon[t]
+        sqrt = math.sqrt
+        pot_cache = {}
+
+        def pot(v):
+            p = pot_cache.get(v)
+            if p is None:
+                a, b = lat[v], lon[v]
+                to_t = sqrt((a - t_lat) ** 2 + ((b - t_lon) * kx) ** 2)
+                to_s = sqrt((a - s_lat) ** 2 + ((b - s_lon) * kx) ** 2)
+                p = pot_cache[v] = (to_t - to_s) * scale * 0.5
+            return p
+
+        inf = float("inf")
+        dist_f, dist_r = {s: 0.0}, {t: 0.0}
+        prev_f, prev_r = {s: -1}, {t: -1}
+        done_f, done_r = set(), set()
+        heap_f, heap_r = [(pot(s), s)], [(-pot(t), t)]
+        push, pop = heapq.heappush, heapq.heappop
+        best, meet = inf, -1
+
+        while heap_f and heap_r:
+            if heap_f[0][0] + heap_r[0][0] >= best:
+                break
+            if len(heap_f) <= len(heap_r):
+                _, u = pop(heap_f)
+                if u in done_f:
+                    continue
+                done_f.add(u)
+                du = dist_f[u]
+                for i in range(f_off[u], f_off[u + 1]):
+                    v = f_dst[i]
+                    nd = du + f_time[i]
+                    if nd < dist_f.get(v, inf):
+                        dist_f[v] = nd
+                        prev_f[v] = u
+                        push(heap_f, (nd + pot(v), v))
+                        other = dist_r.get(v)
+                        if other is not None and nd + other < best:
+                            best, meet = nd + other, v
+            else:
+                _, u = pop(heap_r)
+                if u in done_r:
+                    continue
+                done_r.add(u)
+                du = dist_r[u]
+                for i in range(r_off[u], r_off[u + 1]):
+                    v = r_src[i]
+                    nd = du + r_time[i]
+                    if nd < dist_r.get(v, inf):
+                        dist_r[v] = nd
+                        prev_r[v] = u
+                        push(heap_r, (nd - pot(v), v))
+                        other = dist_f.get(v)
+                        if other is not None and nd + other < best:
+                            best, meet = nd + other, v
+
+        if meet < 0:
+            return None, inf
+        path = []
+        v = meet
+        while v != -1:
+            path.append(v)
+            v = prev_f[v]
+        path.reverse()
+        v = prev_r[meet]
+        while v != -1:
+            path.append(v)
+            v = prev_r[v]
+        return path, best
+
+    def path_length_m(self, path):
+        total = 0.0
+        f_off, f_dst, f_time, f_len = self.f_off, self.f_dst, self.f_time, self.f_len
+        for u, v in zip(path, path[1:]):
+            # Parallel edges: the search used the fastest one.
+            best = None
+            for i in range(f_off[u], f_off[u + 1]):
+                if f_dst[i] == v and (best is None or f_time[i] < f_time[best]):
+                    best = i
+            total += f_len[best]
+        return total
+
+
+class ContractionHierarchy:
+    """Upward edges per node in CSR form.
+
+    up_*: edges v -> w with w contracted after v (forward search).
+    dn_*: edges u -> v with u contracted after v, stored at v (backward
+    search). *_mid is the bypassed node of a shortcut, -1 for a road edge.
+    """
+
+    def __init__(self, up_off, up_dst, up_time, up_len, up_mid,
+                 dn_off, dn_src, dn_time, dn_len, dn_mid):
+        self.up_off, self.up_dst, self.up_time = up_off, up_dst, up_time
+        self.up_len, self.up_mid = up_len, up_mid
+        self.dn_off, self.dn_src, self.dn_time = dn_off, dn_src, dn_time
+        self.dn_len, self.dn_mid = dn_len, dn_mid
+
+    @classmethod
+    def from_lists(cls, up, dn):
+        def csr(lists):
+            off = array("i", [0])
+            other, time, length, mid = array("i"), array("f"), array("f"), array("i")
+            for edges in lists:
+                for x, t, l, m in edges:
+                    other.append(x)
+                    time.append(t)
+                    length.append(l)
+                    mid.append(m)
+                off.append(len(other))
+            return off, other, time, length, mid
+        return cls(*csr(up), *csr(dn))
+
+    def arrays(self):
+        return (self.up_off, self.up_dst, self.up_time, self.up_len, self.up_mid,
+                self.dn_off, self.dn_src, self.dn_time, self.dn_len, self.dn_mid)
+
+    def query(self, s, t):
+        """(node list, seconds, metres) for the fastest s -> t path, or None."""
+        if s == t:
+            return [s], 0.0, 0.0
+        inf = float("inf")
+        up_off, up_dst, up_time = self.up_off, self.up_dst, self.up_time
+        dn_off, dn_src, dn_time = self.dn_off, self.dn_src, self.dn_time
+        dist_f, dist_r = {s: 0.0}, {t: 0.0}
+        prev_f, prev_r = {s: -1}, {t: -1}     # edge index used to reach the node
+        heap_f, heap_r = [(0.0, s)], [(0.0, t)]
+        push, pop = heapq.heappush, heapq.heappop
+        best, meet = inf, -1
+
+        while True:
+            top_f = heap_f[0][0] if heap_f else inf
+            top_r = heap_r[0][0] if heap_r else inf
+            if min(top_f, top_r) >= best:
+                break
+            if top_f <= top_r:
+                d, u = pop(heap_f)
+                if d > dist_f[u]:
+                    continue
+                for i in range(up_off[u], up_off[u + 1]):
+                    v = up_dst[i]
+                    nd = d + up_time[i]
+                    if nd < dist_f.get(v, inf):
+                        dist_f[v] = nd
+                        prev_f[v] = i
+                        push(heap_f, (nd, v))
+                        other = dist_r.get(v)
+                        if other is not None and nd + other < best:
+                            best, meet = nd + other, v
+            else:
+                d, u = pop(heap_r)
+                if d > dist_r[u]:
+                    continue
+                for i in range(dn_off[u], dn_off[u + 1]):
+                    v = dn_src[i]
+                    nd = d + dn_time[i]
+                    if nd < dist_r.get(v, inf):
+                        dist_r[v] = nd
+                        prev_r[v] = i
+                        push(heap_r, (nd, v))
+                        other = dist_f.get(v)
+                        if other is not None and nd + other < best:
+                            best, meet = nd + other, v
+
+        if meet < 0:
+            return None
+
+        # CH edges along the path in travel order, as (from, to, mid, metres).
+        edges = []
+        v = meet
+        while prev_f[v] != -1:
+            i = prev_f[v]
+            u = _row_of(self.up_off, i)
+            edges.append((u, v, self.up_mid[i], self.up_len[i]))
+            v = u
+        edges.reverse()
+        v = meet
+        while prev_r[v] != -1:
+            i = prev_r[v]
+            w = _row_of(self.dn_off, i)
+            edges.append((v, w, self.dn_mid[i], self.dn_len[i]))
+            v = w
+
+        path = [s]
+        metres = 0.0
+        for a, b, m, length in edges:
+            metres += length
+            self._unpack(a, b, m, path)
+        return path, best, metres
+
+    def _unpack(self, a, b, mid, path):
+        """Append the road nodes after a up to b for CH edge a -> b."""
+        stack = [(a, b, mid)]
+        while stack:
+            x, y, m = stack.pop()
+            if m < 0:
+                path.append(y)
+                continue
+            # m was contracted first: x -> m is a down edge at m, m -> y an up edge.
+            stack.append((m, y, self._mid_of(self.up_off, self.up_dst, self.up_mid, m, y)))
+            stack.append((x, m, self._mid_of(self.dn_off, self.dn_src, self.dn_mid, m, x)))
+
+    @staticmethod
+    def _mid_of(off, other, mids, v, x):
+        for i in range(off[v], off[v + 1]):
+            if other[i] == x:
+                return mids[i]
+        raise KeyError((v, x))
+
+
+def _row_of(off, i):
+    """CSR row owning edge i (bisect on the offsets)."""
+    lo, hi = 0, len(off) - 1
+    while lo < hi - 1:
+        mid = (lo + hi) // 2
+        if off[mid] <= i:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _read_arrays(f, layout):
+    arrays = []
+    for typecode, count in layout:
+        arr = array(typecode)
+        arr.fromfile(f, count)
+        if sys.byteorder == "big":
+            arr.byteswap()
+        arrays.append(arr)
+    return arrays
+
+
+def _speed(props, speeds):
+    speed = speeds.get(props.get("highway"))
+    if speed is None:
+        return None
+    maxspeed = str(props.get("maxspeed", "")).split()[0:1]
+    if maxspeed and maxspeed[0].isdigit():
+        speed = min(speed, int(maxspeed[0]))
+    return speed
+
+
+class GraphBackend:
+    """routing backend answering from a RoadGraph (driving profile only)."""
+
+    def __init__(self, graph, max_snap_m=MAX_SNAP_M):
+        self.graph = graph
+        self.max_snap_m = max_snap_m
+
+    def fetch(self, start, end, profile=DEFAULT_PROFILE):
+        if profile != DEFAULT_PROFILE:
+            return None
+        g = self.graph
+        s = g.nearest_node(float(start[0]), float(start[1]), self.max_snap_m)
+        t = g.nearest_node(float(end[0]), float(end[1]), self.max_snap_m)
+        if s is None or t is None:
+            return None
+        if g.ch is not None:
+            found = g.ch.query(s, t)
+            if found is None:
+                return None
+            path, seconds, metres = found
+        else:
+            path, seconds = g.shortest_path(s, t)
+            if path is None:
+                return None
+            metres = g.path_length_m(path)
+        points = [(g.lat[v], g.lon[v]) for v in path]
+        return Route(points, metres / 1000.0, seconds / 60.0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an offline road graph file.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("geojson")
+    build.add_argument("output", nargs="?", default=GRAPH_FILE)
+    build.add_argument("--no-ch", action="store_true",
+                       help="skip the contraction hierarchy (A* queries only)")
+    args = parser.parse_args()
+
+    graph = RoadGraph.from_geojson(args.geojson)
+    if not args.no_ch:
+        graph.contract()
+    graph.save(args.output)
+    print(f"{args.output}: {graph.node_count} nodes, {graph.edge_count} edges")
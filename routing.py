@@ -0,0 +1,204 @@
+# routing.py
+"""Route lookups behind one client: keep-alive session, LRU cache and
+in-flight de-duplication.
+
+    route = routing.get_client().route((lat1, lon1), (lat2, lon2))
+    route.points        # [(lat, lon), ...] for map_widget.set_path
+    route.distance_km
+    route.duration_min
+
+The backend is pluggable: OSRMBackend talks to any OSRM-compatible HTTP
+server (the public demo server, or a local stub for tests);
+road_graph.GraphBackend answers from an offline graph file; anything with
+a fetch(start, end, profile) method returning a Route or None works. When
+road_graph.GRAPH_FILE exists the shared client routes on it first and
+only falls back to OSRM for points the graph does not cover.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+
+import requests
+
+from geocode_cache import quantize
+from app_logging import get_logger
+
+log = get_logger("routing")
+
+Route = namedtuple("Route", "points distance_km duration_min")
+
+OSRM_URL = "https://router.project-osrm.org"
+DEFAULT_PROFILE = "driving"
+CACHE_SIZE = 1024
+LATENCY_SAMPLES = 1000
+
+
+class OSRMBackend:
+    def __init__(self, base_url=OSRM_URL, timeout=10, retries=1):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        # One session per backend: connections to the server are reused.
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "taxi_booking_app_v1"
+
+    def fetch(self, start, end, profile=DEFAULT_PROFILE):
+        s_lat, s_lon = float(start[0]), float(start[1])
+        e_lat, e_lon = float(end[0]), float(end[1])
+        url = (
+            f"{self.base_url}/route/v1/{profile}/"
+            f"{s_lon:.6f},{s_lat:.6f};{e_lon:.6f},{e_lat:.6f}"
+        )
+        params = {"overview": "full", "geometries": "geojson",
+                  "alternatives": "false", "steps": "false"}
+
+        for attempt in range(self.retries + 1):
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                resp.raise_for_status()
+                data = resp.json()
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                log.warning("OSRM request error (attempt %d/%d): %s",
+                            attempt + 1, self.retries + 1, e)
+                if attempt < self.retries:
+                    time.sleep(0.5)
+                    continue
+                return None
+
+        if not data.get("routes"):
+            log.warning("OSRM: no routes in response (%s)", data.get("code"))
+            return None
+
+        route = data["routes"][0]
+        geometry = route.get("geometry", {})
+        if geometry.get("type") != "LineString" or "coordinates" not in geometry:
+            log.warning("OSRM: expected GeoJSON LineString, got %s", geometry.get("type"))
+            return None
+
+        points = [(float(pt[1]), float(pt[0])) for pt in geometry["coordinates"]]
+        return Route(points, route.get("distance", 0.0) / 1000.0,
+                     route.get("duration", 0.0) / 60.0)
+
+
+class FallbackBackend:
+    """Try each backend in turn; the first non-None route wins."""
+
+    def __init__(self, *backends):
+        self.backends = backends
+
+    def fetch(self, start, end, profile=DEFAULT_PROFILE):
+        for backend in self.backends:
+            route = backend.fetch(start, end, profile)
+            if route is not None:
+                return route
+        return None
+
+
+def default_backend():
+    import road_graph
+    if not os.path.exists(road_graph.GRAPH_FILE):
+        return OSRMBackend()
+    try:
+        graph = road_graph.RoadGraph.load(road_graph.GRAPH_FILE)
+    except (OSError, ValueError, EOFError) as e:
+        log.error("Could not load %s, using OSRM only: %s", road_graph.GRAPH_FILE, e)
+        return OSRMBackend()
+    log.info("Offline road graph: %d nodes, %d edges", graph.node_count, graph.edge_count)
+    return FallbackBackend(road_graph.GraphBackend(graph), OSRMBackend())
+
+
+class RoutingClient:
+    def __init__(self, backend=None, cache_size=CACHE_SIZE):
+        self.backend = backend or default_backend()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    def _key(self, start, end, profile):
+        return (quantize(*start), quantize(*end), profile)
+
+    def route(self, start, end, profile=DEFAULT_PROFILE):
+        """Return a Route or None. Safe to call from several threads."""
+        key = self._key(start, end, profile)
+        t0 = time.perf_counter()
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._cache[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self.backend.fetch(start, end, profile)
+        except Exception as e:
+            log.error("Routing backend error: %s", e)
+            result = None
+
+        with self._lock:
+            if result is not None:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self.stats["errors"] += 1
+            del self._inflight[key]
+            self._latencies.append(time.perf_counter() - t0)
+        future.set_result(result)
+        return result
+
+    def peek(self, start, end, profile=DEFAULT_PROFILE):
+        """The cached Route for this trip, or None; never fetches."""
+        with self._lock:
+            return self._cache.get(self._key(start, end, profile))
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return (self.stats["hits"] + self.stats["coalesced"]) / total if total else 0.0
+
+    def latency_percentiles(self):
+        """(p50, p95) backend latency in milliseconds, or (None, None)."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None, None
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+        return pct(0.50), pct(0.95)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RoutingClient()
+        return _client
+
+
+def set_backend(backend):
+    """Swap the backend of the shared client (drops cached routes)."""
+    global _client
+    with _client_lock:
+        _client = RoutingClient(backend)
+    return _client
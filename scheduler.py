@@ -0,0 +1,174 @@
+# scheduler.py
+"""Release scheduled rides to dispatch shortly before pickup.
+
+create_ride stores bookings further out than SCHEDULE_LEAD as
+'Scheduled'. The scheduler keeps every Scheduled ride due within the
+next HORIZON seconds in a min-heap of (scheduled_at, ride_id), read
+with a range scan on the indexed rides.scheduled_at, and sleeps until
+the earliest one is lead seconds from pickup. It then calls
+release_scheduled_ride, which flips the ride to 'Requested' and offers
+it to the nearest drivers.
+
+New bookings are picked up from rides past the last id seen, never by
+rescanning the schedule. Cancelled or already-released rides are
+skipped at release time, since the release only moves rides that are
+still Scheduled. Several schedulers can therefore run side by side:
+the login and admin processes each start one in a daemon thread, and
+one can also run on its own.
+
+    python scheduler.py [--lead 900] [--horizon 3600]
+"""
+import argparse
+import heapq
+import threading
+import time
+from collections import deque
+
+import database
+from db_connection import get_connection
+from app_logging import get_logger
+
+log = get_logger("scheduler")
+
+HORIZON = 60 * 60            # seconds of upcoming rides kept in memory
+POLL_INTERVAL = 5.0          # how often new bookings are looked for
+
+
+class RideScheduler:
+    def __init__(self, lead=database.SCHEDULE_LEAD, horizon=HORIZON, poll=POLL_INTERVAL):
+        self.lead = lead
+        self.horizon = horizon
+        self.poll = poll
+        self._heap = []          # (scheduled_at, ride_id)
+        self._loaded_until = None  # every Scheduled ride up to here is in the heap
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.released = 0
+        self.lateness = deque(maxlen=1000)   # seconds past due, per release
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _load(self, conn, now):
+        """Top the heap up to now + lead + horizon with one index range scan."""
+        until = now + self.lead + self.horizon
+        if self._loaded_until is None:
+            # Anything booked after this id is found by _poll_new.
+            self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM rides").fetchone()[0]
+            low = 0.0
+        elif until - self._loaded_until < self.horizon / 2:
+            return 0
+        else:
+            low = self._loaded_until
+        # Without INDEXED BY the planner prefers the status index, which
+        # walks every Scheduled ride instead of the window.
+        rows = conn.execute("""
+            SELECT scheduled_at, id FROM rides INDEXED BY idx_rides_pending_schedule
+            WHERE scheduled_at > ? AND scheduled_at <= ? AND status='Scheduled'
+        """, (low, until)).fetchall()
+        with self._lock:
+            if self._heap:
+                for row in rows:
+                    heapq.heappush(self._heap, row)
+            else:
+                self._heap = rows
+                heapq.heapify(self._heap)
+            self._loaded_until = until
+        return len(rows)
+
+    def _poll_new(self, conn):
+        """Queue Scheduled rides booked since the last poll."""
+        rows = conn.execute(
+            "SELECT id, status, scheduled_at FROM rides WHERE id > ? ORDER BY id",
+            (self._last_id,)).fetchall()
+        if not rows:
+            return 0
+        added = 0
+        with self._lock:
+            self._last_id = rows[-1][0]
+            for ride_id, status, scheduled_at in rows:
+                # Later ones are picked up when the horizon reaches them.
+                if status == "Scheduled" and scheduled_at is not None \
+                        and scheduled_at <= self._loaded_until:
+                    heapq.heappush(self._heap, (scheduled_at, ride_id))
+                    added += 1
+        return added
+
+    def schedule(self, ride_id, scheduled_at):
+        """Queue a ride from this process without waiting for the next poll."""
+        with self._lock:
+            heapq.heappush(self._heap, (scheduled_at, ride_id))
+        self._wake.set()
+
+    def next_due(self):
+        """Release time of the earliest queued ride, or None."""
+        with self._lock:
+            return self._heap[0][0] - self.lead if self._heap else None
+
+    def release_due(self, now=None):
+        """Release every ride whose release time has passed. Returns the count."""
+        now = time.time() if now is None else now
+        released = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] - self.lead > now:
+                    break
+                scheduled_at, ride_id = heapq.heappop(self._heap)
+            try:
+                if database.release_scheduled_ride(ride_id):
+                    released += 1
+                    self.lateness.append(time.time() - (scheduled_at - self.lead))
+                    log.info("Released scheduled ride %s", ride_id)
+            except Exception as e:
+                log.error("Releasing ride %s failed: %s", ride_id, e)
+        self.released += released
+        return released
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        conn = get_connection()
+        if self._loaded_until is not None:
+            self._poll_new(conn)
+        self._load(conn, now)
+        return self.release_due(now)
+
+    def run_forever(self):
+        next_poll = 0.0
+        while not self._stopped:
+            now = time.time()
+            if now >= next_poll:
+                try:
+                    self.tick(now)
+                except Exception as e:
+                    log.error("Scheduler tick failed: %s", e)
+                next_poll = now + self.poll
+            else:
+                self.release_due(now)
+            due = self.next_due()
+            wake_at = next_poll if due is None else min(next_poll, due)
+            self._wake.wait(max(0.0, wake_at - time.time()))
+            self._wake.clear()
+
+    def start(self):
+        """Run in a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self.run_forever, name="ride-scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Release scheduled rides to dispatch.")
+    parser.add_argument("--lead", type=float, default=database.SCHEDULE_LEAD,
+                        help="seconds before pickup a ride is opened to drivers")
+    parser.add_argument("--horizon", type=float, default=HORIZON)
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    database.create_tables()
+    RideScheduler(args.lead, args.horizon, args.poll).run_forever()
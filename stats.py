@@ -0,0 +1,123 @@
+# stats.py
+"""Running totals behind the admin dashboard cards.
+
+Triggers (migration 12) keep one row per counter in `stats` current,
+in the same transaction as the write that changes it:
+
+    passengers, drivers     accounts
+    rides                   all rides
+    status:<status>         rides per status
+    revenue                 SUM(fare) of Completed rides
+
+so the dashboard reads a few primary-key rows instead of counting the
+tables. check() recounts from the base tables and lists counters that
+drifted (e.g. after rows were edited with triggers disabled), and
+rebuild() replaces the counters with that recount.
+
+    python stats.py [--check | --rebuild]
+"""
+import argparse
+
+from db_connection import get_connection, transaction
+from app_logging import get_logger
+
+log = get_logger("stats")
+
+REVENUE_TOLERANCE = 0.005    # revenue is a running float sum
+
+
+def get(*keys):
+    """Values of the given counters, 0 for ones never written."""
+    rows = dict(get_connection().execute(
+        f"SELECT key, value FROM stats WHERE key IN ({','.join('?' * len(keys))})",
+        keys).fetchall())
+    return [rows.get(key, 0) for key in keys]
+
+
+def read():
+    """Every counter, as a dict."""
+    return dict(get_connection().execute("SELECT key, value FROM stats").fetchall())
+
+
+def _ride_counts(conn, where="1", params=()):
+    counts = {"rides": 0, "revenue": conn.execute(
+        f"SELECT COALESCE(SUM(fare), 0) FROM rides WHERE status = 'Completed' AND {where}",
+        params).fetchone()[0]}
+    for status, n in conn.execute(
+            f"SELECT status, COUNT(*) FROM rides WHERE {where} GROUP BY status", params):
+        counts[f"status:{status or ''}"] = n
+        counts["rides"] += n
+    return counts
+
+
+def recount(conn=None):
+    """The counters computed from the base tables (reads every row)."""
+    conn = conn or get_connection()
+    counts = {
+        "passengers": conn.execute("SELECT COUNT(*) FROM passenger").fetchone()[0],
+        "drivers": conn.execute("SELECT COUNT(*) FROM driver").fetchone()[0],
+    }
+    counts.update(_ride_counts(conn))
+    return counts
+
+
+def add_rides(conn, first_id, last_id):
+    """Add rides first_id..last_id to the ride counters. Call inside a write transaction."""
+    counts = _ride_counts(conn, "id BETWEEN ? AND ?", (first_id, last_id))
+    conn.executemany(
+        "INSERT INTO stats (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+        counts.items())
+
+
+def fill(conn):
+    """Replace the counters with a recount. Call inside a write transaction."""
+    counts = recount(conn)
+    conn.execute("DELETE FROM stats")
+    conn.executemany("INSERT INTO stats (key, value) VALUES (?, ?)", counts.items())
+    return counts
+
+
+def check():
+    """{key: (stored, recounted)} for every counter that is off."""
+    # One read transaction, so the recount and the counters see the same rows.
+    with transaction() as conn:
+        stored = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        actual = recount(conn)
+    drift = {}
+    for key in stored.keys() | actual.keys():
+        have, want = stored.get(key, 0), actual.get(key, 0)
+        tolerance = REVENUE_TOLERANCE if key == "revenue" else 0
+        if abs(have - want) > tolerance:
+            drift[key] = (have, want)
+    return drift
+
+
+def rebuild():
+    """Recount every counter. Writers wait for the recount to finish."""
+    with transaction(immediate=True) as conn:
+        counts = fill(conn)
+    log.info("Rebuilt %d counters", len(counts))
+    return counts
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the dashboard counters.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true", help="report counters that drifted (default)")
+    group.add_argument("--rebuild", action="store_true", help="recount every counter")
+    args = parser.parse_args()
+
+    database.create_tables()
+    if args.rebuild:
+        for key, value in sorted(rebuild().items()):
+            print(f"{key:24s} {value}")
+    else:
+        drift = check()
+        for key, (have, want) in sorted(drift.items()):
+            print(f"{key:24s} stored {have}, actual {want}")
+        print("Counters match the tables." if not drift else
+              f"{len(drift)} counter(s) drifted; run with --rebuild.")
+        raise SystemExit(1 if drift else 0)
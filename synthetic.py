@@ -0,0 +1,417 @@
+# synthetic.py
+"""Synthetic passengers, drivers and rides for load testing.
+
+Fills a database with realistic-looking data so that the benchmarks and
+the dashboards can be tried at scale:
+
+  * passengers and drivers with Nepali names, unique emails, licence
+    numbers, identity rows and bcrypt password hashes. Hashing one per
+    account would take hours, so a pool of HASH_POOL hashes of the same
+    password is computed in worker processes and shared out. Every
+    account logs in with --password. The default cost is a cheap 4; pass
+    --bcrypt-rounds 12 to make logins as slow as real ones;
+  * drivers' last known locations, mostly in the cities;
+  * rides over the last --days days. Volume grows over the period and
+    follows a daily profile with morning and evening peaks. Pickups are
+    spread around the cities by population and drops a few km away.
+    Fares use the fares.py formula. Pickups still ahead are Scheduled,
+    the last ACTIVE_WINDOW are Requested or Accepted, and older rides
+    are mostly Completed with some Cancelled or Rejected;
+  * ratings for most completed rides, and the admin-assignment
+    notifications of the rides an admin assigned.
+
+Rows are generated with numpy CHUNK rides at a time and loaded with
+executemany() inside one write transaction. The ride, passenger and
+driver triggers and the indexes on rides are dropped for the load and
+put back before it commits (building an index once is much cheaper than
+updating ten of them per row).
+The counters (stats.py), rollups (analytics.py) and heatmap (heatmap.py)
+they maintain are then recomputed in one pass each. The change log is
+not written: dashboards that are open do not see the load until they
+refresh. The same seed gives the same data. Ids continue from what the
+database already holds, so loads can be stacked.
+
+    python synthetic.py [--rides 1000000] [--passengers 50000] [--drivers 5000]
+                        [--days 365] [--seed 1] [--db load.db]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import bcrypt
+import numpy as np
+
+import db_connection
+from db_connection import transaction
+from database import SCHEDULE_LEAD
+from fares import FARE_CLASSES, DEFAULT_DETOUR, DEFAULT_SPEED_KMH
+from geo_batch import haversine_km
+from app_logging import get_logger
+import analytics
+import heatmap
+import stats
+
+log = get_logger("synthetic")
+
+CHUNK = 100000          # rides generated and inserted per executemany()
+HASH_POOL = 1000        # distinct password hashes shared by the accounts
+BCRYPT_ROUNDS = 4
+
+# name, lat, lon, share of pickups, spread (deg), areas
+CITIES = [
+    ("Kathmandu", 27.7172, 85.3240, 0.42, 0.035,
+     ["Thamel", "Baneshwor", "Koteshwor", "Kalanki", "Chabahil", "Maharajgunj",
+      "Baluwatar", "Boudha", "Swayambhu", "Naxal", "Putalisadak", "Gongabu"]),
+    ("Lalitpur", 27.6644, 85.3188, 0.12, 0.02,
+     ["Patan Durbar Square", "Jawalakhel", "Pulchowk", "Kupondole", "Satdobato", "Ekantakuna"]),
+    ("Bhaktapur", 27.6710, 85.4298, 0.05, 0.015,
+     ["Durbar Square", "Suryabinayak", "Thimi", "Kamalbinayak"]),
+    ("Pokhara", 28.2096, 83.9856, 0.13, 0.03,
+     ["Lakeside", "Mahendrapool", "Chipledhunga", "Prithvi Chowk", "Bagar", "Damside"]),
+    ("Biratnagar", 26.4525, 87.2718, 0.07, 0.025,
+     ["Traffic Chowk", "Bargachhi", "Rani", "Tinpaini"]),
+    ("Bharatpur", 27.6766, 84.4304, 0.07, 0.025,
+     ["Narayangarh", "Pulchowk", "Bharatpur Height", "Chaubiskoti"]),
+    ("Birgunj", 27.0104, 84.8770, 0.05, 0.02,
+     ["Ghantaghar", "Adarshanagar", "Murli Chowk"]),
+    ("Butwal", 27.7006, 83.4483, 0.05, 0.02,
+     ["Traffic Chowk", "Golpark", "Milanchowk"]),
+    ("Dharan", 26.8065, 87.2846, 0.04, 0.015,
+     ["Bhanu Chowk", "Putali Line", "Panmara"]),
+]
+
+FIRST_NAMES = [
+    "Aarav", "Aayush", "Anish", "Bibek", "Bikash", "Bishal", "Dipesh", "Ganesh",
+    "Hari", "Kiran", "Manish", "Nabin", "Prakash", "Rajesh", "Ramesh", "Roshan",
+    "Sagar", "Sandeep", "Sanjay", "Sujan", "Suman", "Sunil", "Ujjwal", "Yogesh",
+    "Aastha", "Anita", "Anjali", "Bina", "Deepa", "Gita", "Kabita", "Laxmi",
+    "Manisha", "Nisha", "Pooja", "Pratima", "Puja", "Rita", "Sabina", "Sarita",
+    "Shristi", "Sita", "Sunita", "Sushma", "Srijana", "Sujata", "Usha", "Yamuna",
+]
+LAST_NAMES = [
+    "Acharya", "Adhikari", "Bhandari", "Bhattarai", "Basnet", "Chaudhary", "Dahal",
+    "Ghimire", "Gurung", "Karki", "Khadka", "KC", "Lama", "Magar", "Maharjan",
+    "Neupane", "Pandey", "Poudel", "Rai", "Rana", "Regmi", "Sharma", "Shrestha",
+    "Subedi", "Tamang", "Thapa", "Tiwari", "Yadav",
+]
+
+# Share of rides per local hour, 00-23.
+HOURLY = np.array([4, 2, 1, 1, 2, 6, 18, 42, 70, 64, 46, 40,
+                   44, 42, 40, 44, 56, 74, 80, 62, 44, 30, 18, 9], dtype=np.float64)
+GROWTH = 2.0            # rides per day at the end of the range / at the start
+
+ADVANCE_SHARE = 0.12    # booked hours or days ahead rather than for now
+COMFORT_SHARE = 0.22
+ACTIVE_WINDOW = 45 * 60  # pickups this recent are still in progress
+ACCEPTED_SHARE = 0.6    # of the rides in progress
+ADMIN_SHARE = 0.03      # of rides with a driver, assigned by an admin
+PAST_STATUSES = {"Completed": 0.83, "Cancelled": 0.12, "Rejected": 0.05}
+CANCELLED_WITH_DRIVER = 0.5
+RATED_SHARE = 0.65      # of completed rides
+RATINGS = {5: 0.55, 4: 0.27, 3: 0.1, 2: 0.04, 1: 0.04}
+TRIP_KM_MEDIAN = 4.0
+
+RIDE_COLUMNS = (
+    "id", "passenger_id", "driver_id", "pickup", "destination", "status", "fare",
+    "scheduled_date", "scheduled_time", "scheduled_datetime", "scheduled_at",
+    "assigned_by_admin", "assigned_at", "rating", "pickup_lat", "pickup_lon",
+    "drop_lat", "drop_lon", "pickup_address", "drop_address", "vehicle", "created_at",
+)
+
+
+def _hash_batch(password, rounds, count):
+    return [bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+            for _ in range(count)]
+
+
+def password_hashes(password, rounds=BCRYPT_ROUNDS, count=HASH_POOL, workers=None):
+    """count bcrypt hashes of password, each with its own salt, hashed in a process pool."""
+    workers = workers or os.cpu_count() or 1
+    sizes = [count // workers + (i < count % workers) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batches = pool.map(_hash_batch, [password] * workers, [rounds] * workers, sizes)
+        return [h for batch in batches for h in batch]
+
+
+def _next_id(conn, table):
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def _names(rng, n):
+    first = rng.integers(0, len(FIRST_NAMES), n)
+    last = rng.integers(0, len(LAST_NAMES), n)
+    return [(FIRST_NAMES[f], LAST_NAMES[s]) for f, s in zip(first.tolist(), last.tolist())]
+
+
+def _accounts(rng, first_id, n, hashes, prefix):
+    """(id, name, email, password hash) per account."""
+    return [(i, f"{f} {s}", f"{f.lower()}.{s.lower()}.{prefix}{i}@example.com", hashes[i % len(hashes)])
+            for i, (f, s) in zip(range(first_id, first_id + n), _names(rng, n))]
+
+
+def _places(rng, n):
+    """City index, lat and lon of n points around the cities."""
+    shares = np.array([c[3] for c in CITIES])
+    city = rng.choice(len(CITIES), n, p=shares / shares.sum())
+    centre = np.array([(c[1], c[2]) for c in CITIES])[city]
+    spread = np.array([c[4] for c in CITIES])[city]
+    return city, centre[:, 0] + rng.normal(0, spread), centre[:, 1] + rng.normal(0, spread)
+
+
+class _Labels:
+    """"Area, City" names, picked per point by city."""
+
+    def __init__(self):
+        self.names = [f"{area}, {c[0]}" for c in CITIES for area in c[5]]
+        sizes = np.array([len(c[5]) for c in CITIES])
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.sizes = sizes
+
+    def pick(self, rng, city):
+        index = self.offsets[city] + (rng.random(len(city)) * self.sizes[city]).astype(np.int64)
+        return [self.names[i] for i in index.tolist()]
+
+
+def pickup_times(rng, n, now, days):
+    """n sorted epoch seconds over the last `days` days, growing and peaking by hour."""
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    midnight = (now + offset) // 86400 * 86400 - offset
+    # Daily volume rises linearly from 1 to GROWTH: invert its CDF.
+    u = rng.random(n)
+    a = GROWTH - 1.0
+    x = (np.sqrt(1 + a * (2 + a) * u) - 1) / a if a else u
+    day = np.minimum((x * days).astype(np.int64), days - 1)
+    hour = rng.choice(24, n, p=HOURLY / HOURLY.sum())
+    times = midnight - (days - 1 - day) * 86400.0 + hour * 3600.0 + rng.random(n) * 3600.0
+    # Today's later hours have not happened yet: move them a day back.
+    times = np.where(times > now, times - 86400.0, times)
+    times.sort()
+    return times
+
+
+def _local_minutes(epochs):
+    """Local "YYYY-MM-DD HH:MM" for each epoch (today's UTC offset)."""
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    text = np.datetime_as_string((epochs + offset).astype("datetime64[s]"), unit="m")
+    return [s.replace("T", " ") for s in text.tolist()]
+
+
+def _utc_seconds(epochs):
+    """UTC "YYYY-MM-DD HH:MM:SS", as SQLite's CURRENT_TIMESTAMP writes it."""
+    text = np.datetime_as_string(epochs.astype("datetime64[s]"), unit="s")
+    return [s.replace("T", " ") for s in text.tolist()]
+
+
+def _rides(rng, first_id, created, now, passengers, drivers, labels, live):
+    """Ride, rating and notification rows for rides booked at `created`.
+
+    live = {"passengers": set, "drivers": list} of accounts still free
+    for rides in progress; each gets at most one.
+    """
+    n = len(created)
+    ids = np.arange(first_id, first_id + n)
+
+    advance = rng.random(n) < ADVANCE_SHARE
+    lead = np.where(advance, rng.uniform(3600, 3 * 86400, n), rng.uniform(0, 600, n))
+    # Pickups are whole local minutes, like the booking form's.
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    scheduled = np.ceil((created + lead + offset) / 60) * 60 - offset
+
+    status = np.array(list(PAST_STATUSES), dtype=object)[
+        rng.choice(len(PAST_STATUSES), n, p=list(PAST_STATUSES.values()))]
+    ahead = scheduled - SCHEDULE_LEAD > now
+    active = ~ahead & (scheduled > now - ACTIVE_WINDOW)
+    status[ahead] = "Scheduled"
+    status[active] = np.where(rng.random(active.sum()) < ACCEPTED_SHARE, "Accepted", "Requested")
+
+    passenger = passengers[0] + np.minimum(
+        (rng.pareto(1.5, n) * (passengers[1] / 20)).astype(np.int64), passengers[1] - 1)
+    driver = drivers[0] + np.minimum(
+        (rng.pareto(2.0, n) * (drivers[1] / 5)).astype(np.int64), drivers[1] - 1)
+    has_driver = ((status == "Completed") | (status == "Accepted")
+                  | ((status == "Cancelled") & (rng.random(n) < CANCELLED_WITH_DRIVER)))
+
+    # One open ride per passenger and one accepted ride per driver.
+    for i in np.flatnonzero(ahead | active).tolist():
+        free = live["passengers"]
+        if free:
+            passenger[i] = free.pop()
+        if status[i] == "Accepted":
+            if live["drivers"]:
+                driver[i] = live["drivers"].pop()
+                live["busy"].append((int(ids[i]), int(driver[i])))
+            else:
+                status[i] = "Requested"
+                has_driver[i] = False
+
+    city, pickup_lat, pickup_lon = _places(rng, n)
+    km = rng.lognormal(np.log(TRIP_KM_MEDIAN), 0.6, n)
+    bearing = rng.uniform(0, 2 * np.pi, n)
+    drop_lat = pickup_lat + km * np.cos(bearing) / 111.0
+    drop_lon = pickup_lon + km * np.sin(bearing) / (111.0 * np.cos(np.radians(pickup_lat)))
+
+    comfort = rng.random(n) < COMFORT_SHARE
+    road_km = haversine_km(pickup_lat, pickup_lon, drop_lat, drop_lon) * DEFAULT_DETOUR
+    minutes = road_km / DEFAULT_SPEED_KMH * 60
+    fare = np.zeros(n)
+    for vehicle, fc in FARE_CLASSES.items():
+        mask = comfort if vehicle == "comfort" else ~comfort
+        fare[mask] = np.maximum(fc.base + road_km[mask] * fc.per_km
+                                + minutes[mask] * fc.per_min, fc.minimum)
+    fare = np.round(fare, 2)
+
+    rated = (status == "Completed") & (rng.random(n) < RATED_SHARE)
+    rating = np.where(rated, rng.choice(list(RATINGS), n, p=list(RATINGS.values())), 0)
+    admin = has_driver & (rng.random(n) < ADMIN_SHARE)
+    assigned = scheduled - rng.uniform(60, 600, n)
+
+    pickup = labels.pick(rng, city)
+    drop = labels.pick(rng, city)
+    when = _local_minutes(scheduled)
+    assigned_text = _utc_seconds(assigned)
+    ride_rows = list(zip(
+        ids.tolist(), passenger.tolist(),
+        [d if h else None for d, h in zip(driver.tolist(), has_driver.tolist())],
+        pickup, drop, status.tolist(), fare.tolist(),
+        [w[:10] for w in when], [w[11:] for w in when], when, scheduled.tolist(),
+        admin.astype(np.int64).tolist(),
+        [a if m else None for a, m in zip(assigned_text, admin.tolist())],
+        [r or None for r in rating.tolist()],
+        pickup_lat.tolist(), pickup_lon.tolist(), drop_lat.tolist(), drop_lon.tolist(),
+        pickup, drop, np.where(comfort, "comfort", "normal").tolist(), created.tolist(),
+    ))
+
+    rating_rows = [(int(ids[i]), int(driver[i]), int(rating[i]), "")
+                   for i in np.flatnonzero(rated).tolist()]
+    notify = np.flatnonzero(admin).tolist()
+    driver_notes = [(int(driver[i]), int(ids[i]),
+                     f"You have been assigned to ride #{ids[i]} by admin", assigned_text[i])
+                    for i in notify]
+    passenger_notes = [(int(passenger[i]), int(ids[i]),
+                        f"Your ride #{ids[i]} has been assigned a driver by admin", assigned_text[i])
+                       for i in notify]
+    return ride_rows, rating_rows, driver_notes, passenger_notes
+
+
+def _suspend(conn):
+    """Drop the triggers on rides, passenger and driver and the indexes on
+    rides; returns the SQL that puts them back."""
+    rows = conn.execute("""
+        SELECT name, type, sql FROM sqlite_master
+        WHERE (type = 'trigger' AND tbl_name IN ('rides', 'passenger', 'driver'))
+           OR (type = 'index' AND tbl_name = 'rides' AND sql IS NOT NULL)
+    """).fetchall()
+    for name, kind, _ in rows:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    # Indexes first: the triggers' own lookups and the fills use them.
+    return [sql for _, kind, sql in sorted(rows, key=lambda r: r[1] != "index")]
+
+
+def generate(rides, passengers, drivers, days=365, seed=1, password="password",
+             rounds=BCRYPT_ROUNDS, hashes=HASH_POOL, now=None):
+    """Add the accounts and rides to the current database; returns the row counts."""
+    rng = np.random.default_rng(seed)
+    now = time.time() if now is None else now
+    t0 = time.perf_counter()
+    pool = password_hashes(password, rounds, min(hashes, max(passengers + drivers, 1)))
+    log.info("Hashed %d passwords in %.1f s", len(pool), time.perf_counter() - t0)
+    labels = _Labels()
+    counts = {}
+
+    with transaction(immediate=True) as conn:
+        suspended = _suspend(conn)
+
+        first_passenger = _next_id(conn, "passenger")
+        rows = _accounts(rng, first_passenger, passengers, pool, "p")
+        conn.executemany("INSERT INTO passenger (id, name, email, password) VALUES (?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO identity (email, role, user_id) VALUES (?, 'passenger', ?)",
+                         ((email, i) for i, _, email, _ in rows))
+
+        first_driver = _next_id(conn, "driver")
+        rows = _accounts(rng, first_driver, drivers, pool, "d")
+        phones = rng.integers(9800000000, 9870000000, drivers).tolist()
+        conn.executemany("""
+            INSERT INTO driver (id, name, email, password, phone, license_number)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((i, name, email, hashed, str(phone), f"SYN-{i:07d}")
+              for (i, name, email, hashed), phone in zip(rows, phones)))
+        conn.executemany("INSERT INTO identity (email, role, user_id) VALUES (?, 'driver', ?)",
+                         ((email, i) for i, _, email, _ in rows))
+        _, lat, lon = _places(rng, drivers)
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM driver_location").fetchone()[0]
+        conn.executemany("""
+            INSERT OR REPLACE INTO driver_location (driver_id, lat, lon, updated_at, seq)
+            VALUES (?, ?, ?, ?, ?)
+        """, zip(range(first_driver, first_driver + drivers), lat.tolist(), lon.tolist(),
+                 (now - rng.random(drivers) * 3600).tolist(),
+                 range(seq + 1, seq + 1 + drivers)))
+        counts.update(passengers=passengers, drivers=drivers)
+
+        live = {"passengers": set(range(first_passenger, first_passenger + passengers)),
+                "drivers": list(range(first_driver, first_driver + drivers)), "busy": []}
+        rng.shuffle(live["drivers"])
+        created = pickup_times(rng, rides, now, days)
+        first_ride = _next_id(conn, "rides")
+        totals = [0, 0, 0]
+        columns = ", ".join(RIDE_COLUMNS)
+        for lo in range(0, rides, CHUNK):
+            ride_rows, rating_rows, driver_notes, passenger_notes = _rides(
+                rng, first_ride + lo, created[lo:lo + CHUNK], now,
+                (first_passenger, passengers), (first_driver, drivers), labels, live)
+            conn.executemany(
+                f"INSERT INTO rides ({columns}) VALUES ({', '.join('?' * len(RIDE_COLUMNS))})",
+                ride_rows)
+            conn.executemany(
+                "INSERT INTO driver_ratings (ride_id, driver_id, rating, comment) VALUES (?, ?, ?, ?)",
+                rating_rows)
+            conn.executemany("""
+                INSERT INTO driver_notifications (driver_id, ride_id, message, created_at)
+                VALUES (?, ?, ?, ?)
+            """, driver_notes)
+            conn.executemany("""
+                INSERT INTO passenger_notifications (passenger_id, ride_id, message, created_at)
+                VALUES (?, ?, ?, ?)
+            """, passenger_notes)
+            totals[0] += len(ride_rows)
+            totals[1] += len(rating_rows)
+            totals[2] += len(driver_notes) + len(passenger_notes)
+        conn.executemany("UPDATE driver SET is_busy = 1, current_ride_id = ? WHERE id = ?",
+                         live["busy"])
+        counts.update(rides=totals[0], ratings=totals[1], notifications=totals[2])
+
+        for sql in suspended:
+            conn.execute(sql)
+        stats.fill(conn)
+        analytics.fill(conn)
+        heatmap.fill(conn)
+    return counts
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic data.")
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--passengers", type=int, default=50000)
+    parser.add_argument("--drivers", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default="password", help="every account's password")
+    parser.add_argument("--bcrypt-rounds", type=int, default=BCRYPT_ROUNDS)
+    parser.add_argument("--hashes", type=int, default=HASH_POOL,
+                        help="distinct password hashes shared by the accounts")
+    parser.add_argument("--db", help=f"database file (default {db_connection.DB_NAME})")
+    args = parser.parse_args()
+    if args.passengers < 1 or args.drivers < 1:
+        parser.error("need at least one passenger and one driver")
+
+    if args.db:
+        db_connection.set_database(args.db)
+    database.create_tables()
+    t0 = time.perf_counter()
+    counts = generate(args.rides, args.passengers, args.drivers, args.days, args.seed,
+                      args.password, args.bcrypt_rounds, args.hashes)
+    print(", ".join(f"{n} {name}" for name, n in counts.items())
+          + f" in {time.perf_counter() - t0:.1f} s")
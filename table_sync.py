@@ -0,0 +1,216 @@
+# table_sync.py
+"""Keep a ttk.Treeview in step with query results by row-level diffs.
+
+    sync = TreeSync(tree)
+    sync.sync(items)                 # the full result: insert/update/delete
+    sync.apply(items, changed_iids)  # only re-queried rows; others untouched
+
+items are (iid, sort_key, values) and rows are kept ordered by
+sort_key. A row whose values and position are unchanged is not touched,
+so re-syncing an unchanged result makes no Tk calls at all; `touched`
+counts the calls that were made.
+
+PagedTable keeps only a window of a keyset-paged listing in the tree
+and slides it as the user scrolls.
+"""
+from bisect import bisect_left, insort
+
+
+class TreeSync:
+    def __init__(self, tree):
+        self.tree = tree
+        self._rows = {}      # iid -> (sort_key, values)
+        self._order = []     # sorted (sort_key, iid)
+        self.touched = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, iid):
+        return iid in self._rows
+
+    def iids(self):
+        """Row iids, top to bottom."""
+        return [iid for _, iid in self._order]
+
+    def first(self):
+        return self._order[0][1] if self._order else None
+
+    def last(self):
+        return self._order[-1][1] if self._order else None
+
+    def remove(self, iids):
+        self._apply([], [iid for iid in iids if iid in self._rows])
+
+    def sync(self, items):
+        """Make the tree show exactly items."""
+        items = list(items)
+        if not self._rows:
+            self._fill(items)
+            return
+        fresh = {iid for iid, _, _ in items}
+        self._apply(items, [iid for iid in self._rows if iid not in fresh])
+
+    def apply(self, items, iids):
+        """Re-synced rows for iids: listed ones are upserted, the rest deleted."""
+        items = list(items)
+        fresh = {iid for iid, _, _ in items}
+        self._apply(items, [iid for iid in iids if iid not in fresh and iid in self._rows])
+
+    def _fill(self, items):
+        items.sort(key=lambda item: (item[1], item[0]))
+        for iid, sort_key, values in items:
+            self.tree.insert("", "end", iid=iid, values=values)
+            self._rows[iid] = (sort_key, values)
+        self._order = [(sort_key, iid) for iid, sort_key, _ in items]
+        self.touched += len(items)
+
+    def _remove(self, iid):
+        sort_key, _ = self._rows.pop(iid)
+        del self._order[bisect_left(self._order, (sort_key, iid))]
+
+    def _apply(self, items, gone):
+        for iid in gone:
+            self._remove(iid)
+            self.tree.delete(iid)
+            self.touched += 1
+        for iid, sort_key, values in items:
+            old = self._rows.get(iid)
+            if old is not None:
+                if old == (sort_key, values):
+                    continue
+                if old[0] == sort_key:
+                    self._rows[iid] = (sort_key, values)
+                    self.tree.item(iid, values=values)
+                    self.touched += 1
+                    continue
+                self._remove(iid)
+                self.tree.delete(iid)
+                self.touched += 1
+            entry = (sort_key, iid)
+            insort(self._order, entry)
+            self._rows[iid] = entry[0], values
+            self.tree.insert("", bisect_left(self._order, entry), iid=iid, values=values)
+            self.touched += 1
+
+
+class PagedTable:
+    """A window of at most `keep` rows of a keyset-paged listing.
+
+    more() appends the next page and drops rows from the top, back()
+    prepends the previous page and drops rows from the bottom, so the
+    tree never holds more than keep (+ one page) rows however long the
+    listing is.
+
+    source provides
+        page(after, limit, forward) -> up to limit (key, values) pairs
+            after key `after` (None: from the top) in display order, or
+            before it, nearest first, when forward is False;
+        lookup(iids) -> (key, values) pairs for those rows still listed;
+        order(key) -> a value that sorts like the display order.
+    """
+
+    def __init__(self, tree, source, iid=None, page=100, keep=500):
+        self.tree = tree
+        self.source = source
+        self.iid = iid or (lambda key, values: str(values[0]))
+        self.page = page
+        self.keep = keep
+        self.sync = TreeSync(tree)
+        self.keys = {}              # iid -> key of the rows shown
+        self.at_start = self.at_end = True
+
+    def __len__(self):
+        return len(self.sync)
+
+    def _items(self, pairs):
+        items = []
+        for key, values in pairs:
+            iid = self.iid(key, values)
+            self.keys[iid] = key
+            items.append((iid, self.source.order(key), tuple(values)))
+        return items
+
+    def _forget(self, iids):
+        for iid in iids:
+            if iid not in self.sync:
+                self.keys.pop(iid, None)
+
+    def reset(self, source=None):
+        """Show the first page, of a new sort or filter if source is given."""
+        if source is not None:
+            # Sort keys of the old order do not compare with the new ones.
+            self.sync.remove(self.sync.iids())
+            self.keys = {}
+            self.source = source
+        pairs = self.source.page(None, self.page, True)
+        self.at_start, self.at_end = True, len(pairs) < self.page
+        self._replace(pairs)
+
+    def reload(self):
+        """Re-read the rows of the current window."""
+        n = max(len(self.sync), self.page)
+        first = self.sync.first()
+        if self.at_start or first is None:
+            pairs = self.source.page(None, n, True)
+            self.at_start, self.at_end = True, len(pairs) < n
+        else:
+            rest = self.source.page(self.keys[first], n - 1, True)
+            self.at_end = len(rest) < n - 1
+            pairs = self.source.lookup([first]) + rest
+        self._replace(pairs)
+
+    def _replace(self, pairs):
+        old = self.sync.iids()
+        self.sync.sync(self._items(pairs))
+        self._forget(old)
+
+    def more(self):
+        """Append the next page. Returns the number of rows dropped from the top."""
+        last = self.sync.last()
+        if self.at_end or last is None:
+            return 0
+        pairs = self.source.page(self.keys[last], self.page, True)
+        self.at_end = len(pairs) < self.page
+        self.sync.apply(self._items(pairs), [])
+        excess = len(self.sync) - self.keep
+        if excess <= 0:
+            return 0
+        self.at_start = False
+        dropped = self.sync.iids()[:excess]
+        self.sync.remove(dropped)
+        self._forget(dropped)
+        return excess
+
+    def back(self):
+        """Prepend the previous page. Returns the number of rows added at the top."""
+        first = self.sync.first()
+        if self.at_start or first is None:
+            return 0
+        pairs = self.source.page(self.keys[first], self.page, False)
+        self.at_start = len(pairs) < self.page
+        self.sync.apply(self._items(pairs), [])
+        excess = len(self.sync) - self.keep
+        if excess > 0:
+            self.at_end = False
+            dropped = self.sync.iids()[-excess:]
+            self.sync.remove(dropped)
+            self._forget(dropped)
+        return len(pairs)
+
+    def refresh(self, iids):
+        """Re-read rows iids (e.g. changed rides) without moving the window.
+
+        Rows that now sort outside the window, or no longer match the
+        listing, are removed; new rows inside it are inserted in place.
+        """
+        iids = list(iids)
+        if not len(self.sync):
+            self.reset()
+            return
+        low = None if self.at_start else self.source.order(self.keys[self.sync.first()])
+        high = None if self.at_end else self.source.order(self.keys[self.sync.last()])
+        items = [item for item in self._items(self.source.lookup(iids))
+                 if (low is None or item[1] >= low) and (high is None or item[1] <= high)]
+        self.sync.apply(items, iids)
+        self._forget(iids)
@@ -0,0 +1,78 @@
+# tests/test_scheduler.py
+"""Advance bookings are released by the scheduler thread the app starts."""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_connection
+import database
+from scheduler import RideScheduler
+
+
+class ScheduledReleaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        db_connection.set_database(os.path.join(self.tmp, "test.db"))
+        database.create_tables()
+        with db_connection.transaction() as conn:
+            conn.execute("INSERT INTO passenger (name, email, password) VALUES ('P', 'p@x.com', 'x')")
+            conn.execute("INSERT INTO driver (name, email, password, license_number) "
+                         "VALUES ('D', 'd@x.com', 'x', 'L1')")
+
+    def tearDown(self):
+        db_connection.close_all()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _book(self, minutes_ahead):
+        pickup = datetime.now() + timedelta(minutes=minutes_ahead)
+        return database.create_ride(1, "Thamel", "Patan", 300.0, "Requested",
+                                    pickup.strftime("%Y-%m-%d"), pickup.strftime("%H:%M"))
+
+    def _status(self, ride_id):
+        return db_connection.get_connection().execute(
+            "SELECT status FROM rides WHERE id=?", (ride_id,)).fetchone()[0]
+
+    def test_background_scheduler_releases_due_ride(self):
+        ride_id = self._book(minutes_ahead=30)
+        self.assertEqual(self._status(ride_id), "Scheduled")
+        self.assertEqual(database.get_pending_rides_for_driver(1), [])
+
+        # What main.py and admin_dashboard.py do, with a lead that makes
+        # the booking due now.
+        scheduler = RideScheduler(lead=60 * 60, poll=0.1)
+        thread = scheduler.start()
+        try:
+            deadline = time.time() + 5
+            while self._status(ride_id) == "Scheduled" and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            scheduler.stop()
+            thread.join(timeout=5)
+
+        self.assertEqual(self._status(ride_id), "Requested")
+        self.assertEqual([ride[0] for ride in database.get_pending_rides_for_driver(1)], [ride_id])
+
+    def test_booking_made_after_start_is_released(self):
+        scheduler = RideScheduler(lead=60 * 60, poll=0.1)
+        thread = scheduler.start()
+        try:
+            time.sleep(0.2)
+            ride_id = self._book(minutes_ahead=30)
+            deadline = time.time() + 5
+            while self._status(ride_id) == "Scheduled" and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            scheduler.stop()
+            thread.join(timeout=5)
+
+        self.assertEqual(self._status(ride_id), "Requested")
+
+
+if __name__ == "__main__":
+    unittest.main()
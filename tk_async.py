@@ -0,0 +1,45 @@
+# tk_async.py
+"""Run slow calls (bcrypt, database, network) off the Tk main thread.
+
+Tk widgets may only be touched from the thread running mainloop, so the
+worker never calls back directly: the main thread polls the future with
+after() and invokes the callback itself.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import get_logger
+
+log = get_logger("tk_async")
+
+# bcrypt and sqlite3 both release the GIL, so threads are enough here.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tk-worker")
+
+POLL_MS = 25
+
+
+def submit(fn, *args, **kwargs):
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def run_in_background(widget, fn, *args, on_done=None, on_error=None, **kwargs):
+    """Call fn(*args, **kwargs) in the pool and deliver the result on the Tk loop.
+
+    on_done(result) or on_error(exc) runs on the main thread via widget.after.
+    """
+    future = _executor.submit(fn, *args, **kwargs)
+
+    def poll():
+        if not future.done():
+            widget.after(POLL_MS, poll)
+            return
+        exc = future.exception()
+        if exc is not None:
+            if on_error:
+                on_error(exc)
+            else:
+                log.error("Background task error: %s", exc, exc_info=exc)
+        elif on_done:
+            on_done(future.result())
+
+    widget.after(POLL_MS, poll)
+    return future